@@ -1,95 +1,389 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Optional, List
-from app.models.schemas import PostResponse, SearchResponse, PostMetadata
-from app.services.clip_service import CLIPService
-from app.services.whisper_service import WhisperService
-from app.services.video_service import VideoService
-from app.vectors.faiss_client import FAISSClient
+import asyncio
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import JSONResponse
+from typing import Any, Dict, Optional, List
+from app.core.config import settings
+from app.core.executor import StageSaturatedError, stage_executor
+from app.core.metrics import metrics
+from app.models.schemas import (
+    PostResponse, SearchResponse, SearchFilters, BatchSearchRequest, JobStatus, TagRequest
+)
+from app.services.container import ServiceContainer
+from app.services.search_service import SEARCH_MODES
+from app.utils.helpers import EMBEDDING_FORMATS, UploadTooLargeError, save_upload_to_temp
 import logging
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 router = APIRouter()
-clip_service = CLIPService()
-whisper_service = WhisperService()
-video_service = VideoService()
-faiss_client = FAISSClient()
+# Models and the index are loaded by the app lifespan (or on first use), not on import
+services = ServiceContainer()
 
-@router.post("/classify", response_model=PostResponse)
+# Scraped state for /metrics; read only when Prometheus asks, and never loads a service
+metrics.gauge(
+    "faiss_index_vectors", "Vectors in the serving index",
+    lambda: services.loaded("faiss").index.ntotal if services.loaded("faiss") else 0
+)
+metrics.gauge(
+    "faiss_index_generation", "Index changes since startup",
+    lambda: services.loaded("faiss").generation if services.loaded("faiss") else 0
+)
+metrics.gauge(
+    "stage_in_flight", "Calls running or waiting per pipeline stage",
+    lambda: {stage: s["in_flight"] for stage, s in stage_executor.stats().items()}, labelname="stage"
+)
+metrics.gauge(
+    "inference_queue_depth", "Items waiting for a batched forward pass",
+    lambda: {kind: s["queue_depth"] for kind, s in _inference_stats().items()}, labelname="kind"
+)
+metrics.gauge(
+    "jobs", "Background jobs by status",
+    lambda: services.loaded("job_queue").counts() if services.loaded("job_queue") else {}, labelname="status"
+)
+metrics.gauge("services_ready", "1 once the role's models are loaded and warmed up", lambda: float(services.state == "ready"))
+for cache_stat in ("hits", "misses", "entries"):
+    metrics.gauge(
+        f"cache_{cache_stat}", f"Cache {cache_stat} by cache",
+        lambda stat=cache_stat: {name: stats[stat] for name, stats in _cache_stats().items()},
+        labelname="cache"
+    )
+
+def _require(group: str):
+    """Reject requests this node's role does not serve, or that arrive while models are still loading."""
+    if not services.serves(group):
+        raise HTTPException(status_code=503, detail=f"This node runs the '{services.role}' role and does not serve {group}")
+    if services.state in ("loading", "warming"):
+        raise HTTPException(status_code=503, detail="Models are still loading", headers={"Retry-After": "5"})
+    if services.state == "failed":
+        raise HTTPException(status_code=503, detail="Service startup failed")
+
+def _inference_stats() -> Dict[str, Any]:
+    clip = services.loaded("clip")
+    return clip.scheduler.stats() if clip and clip.scheduler else {}
+
+def _cache_stats() -> Dict[str, Dict[str, Any]]:
+    stats: Dict[str, Dict[str, Any]] = {}
+    if services.loaded("search"):
+        stats.update(services.search.stats())
+    if services.loaded("ingest"):
+        stats["content"] = services.ingest.content_cache.stats()
+    return stats
+
+@router.post("/classify", response_model=PostResponse, responses={202: {"model": JobStatus}})
 async def classify_post(
     images: Optional[List[UploadFile]] = File(None),
     videos: Optional[List[UploadFile]] = File(None),
-    text: Optional[str] = Form(None)
+    text: Optional[str] = Form(None),
+    background: bool = Form(False),
+    include_embedding: bool = Form(True),
+    embedding_format: str = Form("json")
 ):
     """
     Classify a social media post using image, video, and/or text.
-    Returns the post's embedding and metadata.
+    Returns the post's metadata and embedding, or with `background=true`
+    a 202 with a job id to poll at /jobs/{job_id}.
+    Set `include_embedding=false` to skip the embedding, or `embedding_format`
+    to float16 / npy for base64-encoded binary instead of a float list.
+    Workers that do not own the index hand the post to the one that does
+    through the job queue and wait for its result.
+    """
+    logger.info(f"Classify request received - images: {len(images) if images else 0}, videos: {len(videos) if videos else 0}, text: {bool(text)}, background: {background}")
+    return await _ingest_upload(images, videos, text, background, include_embedding, embedding_format)
+
+@router.put("/posts/{post_id}", response_model=PostResponse, responses={202: {"model": JobStatus}})
+async def update_post(
+    post_id: str,
+    images: Optional[List[UploadFile]] = File(None),
+    videos: Optional[List[UploadFile]] = File(None),
+    text: Optional[str] = Form(None),
+    background: bool = Form(False),
+    include_embedding: bool = Form(True),
+    embedding_format: str = Form("json")
+):
+    """
+    Re-embed an existing post from new content, keeping its ID and creation time.
+    Takes the same fields as /classify; searches see the new version at once.
+    """
+    logger.info(f"Update request received for post {post_id}")
+    _require("ingest")
+    if services.faiss.metadata.row_of(post_id) is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return await _ingest_upload(images, videos, text, background, include_embedding, embedding_format, post_id)
+
+@router.delete("/posts/{post_id}")
+async def delete_post(post_id: str) -> Dict[str, Any]:
+    """
+    Delete a post. It stops appearing in searches immediately; its vector is
+    dropped from the index by the next background compaction.
     """
-    logger.info(f"Classify request received - images: {len(images) if images else 0}, videos: {len(videos) if videos else 0}, text: {bool(text)}")
+    logger.info(f"Delete request received for post {post_id}")
+    _require("ingest")
+    try:
+        deleted = await services.faiss.delete_posts([post_id])
+    except StageSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return {"post_id": post_id, "deleted": True}
+
+async def _ingest_upload(
+    images: Optional[List[UploadFile]],
+    videos: Optional[List[UploadFile]],
+    text: Optional[str],
+    background: bool,
+    include_embedding: bool,
+    embedding_format: str,
+    post_id: Optional[str] = None
+):
+    """Save uploads and ingest them here, or hand them to the index owner as a job."""
     if not images and not videos and not text:
         raise HTTPException(status_code=400, detail="At least one of image, video, or text is required.")
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise HTTPException(status_code=400, detail=f"embedding_format must be one of {', '.join(EMBEDDING_FORMATS)}")
+    _require("ingest")
+    forward = background or not services.owns_index
+    job_id = uuid.uuid4().hex if forward else None
+    upload_dir = settings.JOB_DIR / job_id if forward else settings.TEMP_DIR
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    upload_paths: List[Path] = []
+    enqueued = False
     try:
-        # Process videos if provided
-        video_frames = []
-        audio_text = None
-        if videos:
-            for video in videos:
-                video_frames.extend(await video_service.extract_frames(video))
-                if not audio_text:
-                    audio_text = await whisper_service.transcribe(video)
-        
-        # Generate embeddings
-        embeddings = await clip_service.generate_embeddings(
-            images=images,
-            video_frames=video_frames,
-            text=text or audio_text
-        )
-        
-        # Store in FAISS
-        post_id = await faiss_client.add_post(embeddings, {
-            "text": text,
-            "audio_text": audio_text,
-            "has_image": bool(images),
-            "has_video": bool(videos)
-        })
-        
-        return PostResponse(
-            post_id=post_id,
-            embedding=embeddings.tolist(),
-            metadata=PostMetadata(
-                text=text,
-                audio_text=audio_text,
-                has_image=bool(images),
-                has_video=bool(videos)
-            )
-        )
+        # Stream each upload to disk once; frames and audio are both read from that file
+        async def save(upload: UploadFile) -> Path:
+            with metrics.span("upload_read"):
+                path = await save_upload_to_temp(upload, settings.MAX_UPLOAD_BYTES, settings.UPLOAD_CHUNK_SIZE, upload_dir)
+            upload_paths.append(path)
+            return path
+        image_paths = [await save(image) for image in images or []]
+        video_paths = [await save(video) for video in videos or []]
+
+        if forward:
+            await asyncio.to_thread(services.job_queue.enqueue, {
+                "images": [str(path) for path in image_paths],
+                "videos": [str(path) for path in video_paths],
+                "text": text,
+                "include_embedding": include_embedding,
+                "embedding_format": embedding_format,
+                "post_id": post_id,
+                "files_dir": str(upload_dir)
+            }, job_id=job_id)
+            enqueued = True  # The job owns the files from here on
+            if services.owns_index:
+                services.job_workers.notify()
+            if not background:
+                job = await _wait_for_job(job_id, settings.FORWARDED_CLASSIFY_TIMEOUT_SECONDS)
+                if job["status"] == "succeeded":
+                    return job["result"]
+                if job["status"] == "failed":
+                    raise RuntimeError(f"Forwarded job {job_id} failed: {job['error']}")
+            job = await asyncio.to_thread(services.job_queue.get, job_id)
+            return JSONResponse(status_code=202, content=_job_status(job).model_dump())
+
+        return await services.ingest.ingest(image_paths, video_paths, text, include_embedding, embedding_format, post_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Post not found")
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except StageSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error("Error during classification", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to classify post")
+    finally:
+        if forward and not enqueued:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        elif not forward:
+            for path in upload_paths:
+                path.unlink(missing_ok=True)
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Report the status of a background job (classify or re-tag) and, once done, its result."""
+    _require("ingest")
+    job = await asyncio.to_thread(services.job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(job)
+
+async def _wait_for_job(job_id: str, timeout: float) -> Dict[str, Any]:
+    """Poll a job until it finishes or `timeout` passes; returns its last state."""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await asyncio.to_thread(services.job_queue.get, job_id)
+        if job["status"] in ("succeeded", "failed") or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.05)
+
+def _job_status(job: Dict[str, Any]) -> JobStatus:
+    def iso(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+    return JobStatus(
+        job_id=job["job_id"],
+        status=job["status"],
+        attempts=job["attempts"],
+        error=job["error"],
+        result=job["result"],
+        created_at=iso(job["created_at"]),
+        updated_at=iso(job["updated_at"])
+    )
 
 @router.get("/search", response_model=List[SearchResponse])
-async def search_posts(query: str, limit: int = 10):
+async def search_posts(
+    query: str,
+    limit: int = 10,
+    has_image: Optional[bool] = None,
+    has_video: Optional[bool] = None,
+    tags: Optional[List[str]] = Query(None),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    mode: str = "vector"
+):
     """
     Search for posts using a text query.
+    Optional metadata filters are applied inside the index search.
+    `mode` is "vector" (CLIP similarity), "lexical" (BM25 over captions and
+    transcripts) or "hybrid" (both, fused by reciprocal rank).
     Returns the most similar posts with their metadata.
     """
-    logger.info(f"Search request received - query: '{query}', limit: {limit}")
+    logger.info(f"Search request received - query: '{query}', limit: {limit}, mode: {mode}")
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(SEARCH_MODES)}")
+    filters = SearchFilters(
+        has_image=has_image,
+        has_video=has_video,
+        tags=tags,
+        created_after=created_after,
+        created_before=created_before
+    )
+    _require("search")
     try:
-        # Generate query embedding
-        query_embedding = await clip_service.generate_text_embedding(query)
-        
-        # Search in FAISS
-        results = await faiss_client.search(query_embedding, limit)
+        # Embed the query and search FAISS, reusing cached work where possible
+        results = await services.search.search(query, limit, filters.model_dump(exclude_none=True), mode)
         
         return [
             SearchResponse(
-                post_id=result.id,
-                score=result.score,
-                metadata=result.metadata
+                post_id=result['id'],
+                score=result['score'],
+                metadata=result['metadata']
             )
             for result in results
         ]
+    except StageSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error("Error during search", exc_info=True)
-        raise HTTPException(status_code=500, detail="Failed to perform search")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to perform search")
+
+@router.post("/search/batch", response_model=List[List[SearchResponse]])
+async def search_posts_batch(request: BatchSearchRequest):
+    """
+    Run many text queries in one call.
+    Queries are encoded in a single CLIP pass and searched as one query matrix.
+    Returns one result list per query, in input order.
+    """
+    logger.info(f"Batch search request received - {len(request.queries)} queries")
+    if len(request.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries are allowed per batch."
+        )
+    _require("search")
+    try:
+        results = await services.search.search_batch([
+            (q.query, q.limit, q.filters.model_dump(exclude_none=True) if q.filters else None)
+            for q in request.queries
+        ])
+        return [
+            [
+                SearchResponse(
+                    post_id=result['id'],
+                    score=result['score'],
+                    metadata=result['metadata']
+                )
+                for result in query_results
+            ]
+            for query_results in results
+        ]
+    except StageSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error("Error during batch search", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to perform batch search")
+
+@router.get("/tags")
+async def get_tags() -> Dict[str, Any]:
+    """Report the zero-shot tag vocabulary size, thresholds and the last bulk re-tag."""
+    _require("ingest")
+    return {**services.tagging.status(), "vocabulary": services.tagging.labels}
+
+@router.post("/tags", responses={202: {"description": "Labels added and a re-tag job queued"}})
+async def update_tags(request: TagRequest):
+    """
+    Add labels to the zero-shot vocabulary (only new labels are encoded) and,
+    unless `retag` is false, queue a job that re-tags every indexed post with it.
+    Poll the returned job at /jobs/{job_id} for the re-tag summary.
+    Tags that were not predicted, such as imported ones, are kept.
+    """
+    _require("ingest")
+    try:
+        added = await stage_executor.run("clip", services.tagging.add_labels, request.labels) if request.labels else []
+        if not request.retag:
+            return {"added": added, "labels": len(services.tagging.labels), "job": None}
+        job_id = await asyncio.to_thread(services.job_queue.enqueue, {"kind": "retag"})
+        if services.owns_index:
+            services.job_workers.notify()
+    except StageSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except Exception:
+        logger.error("Error while updating tags", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to update tags")
+    return JSONResponse(status_code=202, content={
+        "added": added,
+        "labels": len(services.tagging.labels),
+        "job": _job_status(await asyncio.to_thread(services.job_queue.get, job_id)).model_dump()
+    })
+
+@router.get("/stats")
+async def get_stats() -> Dict[str, Any]:
+    """
+    Report runtime statistics for the serving pipeline.
+    Includes inference queue depth, batch-size distribution, stage load and cache hit rates.
+    """
+    return {
+        "services": services.status(),
+        "clip_backend": services.loaded("clip").backend_status() if services.loaded("clip") else None,
+        "inference": _inference_stats(),
+        "stages": stage_executor.stats(),
+        "caches": _cache_stats(),
+        "jobs": await asyncio.to_thread(services.loaded("job_queue").counts) if services.loaded("job_queue") else {}
+    }
+
+@router.get("/index")
+async def get_index_status() -> Dict[str, Any]:
+    """
+    Report the serving index type and size.
+    Includes progress and recall@k of any background rebuild.
+    """
+    return services.faiss.index_status()
+
+@router.get("/index/recall")
+async def get_index_recall(
+    k: int = Query(10, ge=1, le=100),
+    queries: int = Query(200, ge=1, le=1000)
+) -> Dict[str, Any]:
+    """
+    Measure recall@k of the serving index against exhaustive search.
+    Each query is an exact scan of the corpus, so both are bounded.
+    """
+    _require("search")
+    try:
+        recall = await stage_executor.run("search", services.faiss.measure_recall, k, queries)
+    except StageSaturatedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    return {"k": k, "queries": queries, "recall": recall}
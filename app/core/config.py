@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 import os
 from pathlib import Path
 
@@ -12,15 +12,93 @@ class Settings(BaseSettings):
     CLIP_MODEL_NAME: str = "ViT-B-32"
     CLIP_MODEL_PRETRAINED: str = "openai"
     WHISPER_MODEL_SIZE: str = "base"  # or "tiny" for faster processing
+    WHISPER_LANGUAGE: Optional[str] = None  # e.g. "en"; None auto-detects per file
+    WHISPER_WORKERS: int = 2  # Model replicas transcribing chunks in parallel
+    WHISPER_CHUNK_SECONDS: float = 30.0  # Whisper's native window
+    WHISPER_VAD_THRESHOLD_DB: float = -45.0  # Frames quieter than this (dBFS) are silence
+    WHISPER_VAD_MIN_SILENCE_MS: int = 500  # Shorter pauses stay inside a speech region
+    WHISPER_VAD_PADDING_MS: int = 200
+    CLIP_BATCH_SIZE: int = 32  # Max images/frames per encode_image forward pass
+    CLIP_PREPROCESS_WORKERS: int = 4  # Threads used for PIL preprocessing
+    CLIP_BACKEND: str = "eager"  # eager (fp32), int8 (dynamic quantization, CPU), torchscript or onnx (needs onnxruntime)
+    CLIP_BACKEND_MIN_COSINE: float = 0.99  # Below this agreement with fp32 on probe inputs, fall back to fp32
+    CLIP_EXPORT_DIR: Path = Path("data/clip_export")  # Cached ONNX exports of pretrained weights
+    CLIP_NUM_THREADS: Optional[int] = None  # Intra-op threads (process-wide for torch); None keeps the default
+    CLIP_INTEROP_THREADS: Optional[int] = None
+
+    # Inference Scheduling (coalesces concurrent CLIP requests)
+    INFERENCE_BATCHING: bool = True
+    INFERENCE_MAX_BATCH_SIZE: int = 32  # Items per coalesced forward pass
+    INFERENCE_MAX_WAIT_MS: float = 5.0  # How long to wait for more requests
+    INFERENCE_MAX_QUEUE_ITEMS: int = 1024  # Pending items before requests get 429
+
+    # Execution Stages (thread pool size and extra queued calls before 429)
+    STAGE_WORKERS: Dict[str, int] = {"clip": 1, "video": 2, "whisper": 1, "index": 1, "search": 4, "decode": 2}
+    STAGE_QUEUE_LIMITS: Dict[str, int] = {"clip": 64, "video": 8, "whisper": 4, "index": 64, "search": 256, "decode": 64}
     
     # Vector DB Settings
     VECTOR_DIMENSION: int = 512  # CLIP embedding dimension
     FAISS_INDEX_PATH: Path = Path("data/faiss_index")
+    FAISS_SNAPSHOT_EVERY: int = 1000  # Logged inserts between full index snapshots
+    FAISS_INDEX_TYPE: str = "flat"  # flat, hnsw, ivf_flat, ivf_pq, sq_fp16 or sq8 (all inner product)
+    FAISS_RERANK_FACTOR: int = 4  # Compressed types fetch limit x this candidates, re-scored with exact vectors; 1 disables
+    FAISS_PUBLISH_INTERVAL_SECONDS: float = 10.0  # Writer snapshots new inserts at most this often for read-only workers
+    FAISS_COMPACT_THRESHOLD: float = 0.2  # Rebuild without deleted vectors once they are this fraction of the index
+    FAISS_RELOAD_INTERVAL_SECONDS: float = 1.0  # Read-only workers check for a newer snapshot (or a dead writer) this often
+    FAISS_NLIST: int = 1024  # IVF cells
+    FAISS_NPROBE: int = 16  # IVF cells visited per query
+    FAISS_PQ_M: int = 64  # PQ sub-quantizers (must divide VECTOR_DIMENSION)
+    FAISS_HNSW_M: int = 32  # HNSW graph degree
+    FAISS_EF_CONSTRUCTION: int = 200
+    FAISS_EF_SEARCH: int = 64  # HNSW candidate list size per query
+    FAISS_TRAIN_SAMPLE: int = 100_000  # Vectors sampled for IVF/PQ training
+    FAISS_RECALL_K: int = 10  # Recall@k reported after a rebuild
+    FAISS_RECALL_QUERIES: int = 200
+    FAISS_MIN_RECALL: float = 0.9  # A rebuild into another type below this recall@k is rejected and the current index kept
     
+    # Search
+    SEARCH_BATCH_MAX_QUERIES: int = 256  # Queries accepted by /search/batch
+    TEXT_EMBEDDING_CACHE_SIZE: int = 10_000  # Cached query embeddings
+    TEXT_EMBEDDING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TEXT_EMBEDDING_CACHE_TTL: float = 3600.0  # Seconds
+    SEARCH_RESULT_CACHE_SIZE: int = 5_000  # Cached result lists, invalidated on index changes
+    SEARCH_RESULT_CACHE_TTL: float = 300.0  # Seconds
+    SEARCH_HYBRID_CANDIDATES: int = 5  # Hybrid mode fuses limit x this candidates from each of vector and BM25 search
+    SEARCH_RRF_K: int = 60  # Reciprocal rank fusion constant; larger values flatten the weight of top ranks
+
+    # Zero-shot Tagging
+    TAG_VOCABULARY_PATH: Path = Path("data/tag_labels.txt")  # One label per line; built-in labels until it exists
+    TAG_PROMPT_TEMPLATES: List[str] = ["a photo of {}.", "a social media post about {}."]  # Averaged per label
+    TAG_EMBEDDINGS_PATH: Path = Path("data/tag_embeddings.npz")  # Cached label embeddings; only new labels are encoded
+    TAG_THRESHOLD: float = 0.25  # Min cosine similarity between a post and a label
+    TAG_TOP_K: int = 5  # Most tags per post; 0 disables tagging
+
+    # Serving
+    SERVICE_ROLE: str = "all"  # all, search (CLIP + index only) or ingest (classify and jobs only)
+
+    # Observability
+    TIMING_HEADERS: bool = False  # Send per-stage Server-Timing on every response (else only with X-Timing: 1)
+
     # Media Processing
     MAX_VIDEO_DURATION: int = 300  # 5 minutes
     FRAME_SAMPLE_RATE: int = 1  # Extract 1 frame per second
+    FRAME_SAMPLING: str = "adaptive"  # adaptive (one frame per scene change) or fixed (every sampled frame)
+    FRAME_SCENE_THRESHOLD: float = 0.3  # Colour-histogram distance (0-1) from the last kept frame that starts a new scene
+    FRAME_BUDGET: int = 16  # Most frames kept per video in adaptive mode, spread across its scenes; 0 for no limit
     TEMP_DIR: Path = Path("data/temp")
+    MAX_UPLOAD_BYTES: int = 500 * 1024 * 1024  # Per uploaded video
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read per chunk when spooling uploads
+    CONTENT_CACHE_PATH: Path = Path("data/content_cache.db")  # Embeddings/transcripts by content hash
+    DUPLICATE_THRESHOLD: float = 0.98  # Similarity at which an upload is a repost; above 1.0 disables
+    
+    # Background Ingestion
+    JOB_QUEUE_PATH: Path = Path("data/jobs.db")
+    JOB_DIR: Path = Path("data/jobs")  # Uploaded files waiting for their job
+    JOB_WORKERS: int = 2
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 5.0  # Doubled after every failed attempt
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    FORWARDED_CLASSIFY_TIMEOUT_SECONDS: float = 300.0  # Read-only workers wait this long for the writer, then answer 202
     
     # Hardware Settings
     DEVICE: str = "mps" if os.getenv("USE_MPS", "true").lower() == "true" else "cpu"
@@ -30,7 +108,3 @@ class Settings(BaseSettings):
         env_file = ".env"
 
 settings = Settings()
-
-# Create necessary directories
-settings.FAISS_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
-settings.TEMP_DIR.mkdir(parents=True, exist_ok=True) 
\ No newline at end of file
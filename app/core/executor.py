@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+class StageSaturatedError(RuntimeError):
+    """Raised when a pipeline stage has no capacity left for new work."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Stage '{stage}' is saturated, retry later")
+        self.stage = stage
+
+class StageExecutor:
+    """
+    Runs blocking pipeline stages (model inference, decoding, index I/O) off the event loop.
+
+    Every stage gets its own bounded thread pool, so a slow Whisper job cannot starve
+    searches. Admission is bounded as well: once a stage has `workers + queue_limit`
+    calls in flight, new calls fail fast with StageSaturatedError instead of queueing.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[Dict[str, int]] = None,
+        queue_limits: Optional[Dict[str, int]] = None
+    ):
+        self.workers = dict(workers or settings.STAGE_WORKERS)
+        self.queue_limits = dict(queue_limits or settings.STAGE_QUEUE_LIMITS)
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the stage's pool and await the result."""
+        in_flight = self._in_flight.get(stage, 0)
+        if in_flight >= self.capacity(stage):
+            logger.warning(f"Rejecting work for saturated stage '{stage}' ({in_flight} in flight)")
+            raise StageSaturatedError(stage)
+
+        self._in_flight[stage] = in_flight + 1
+        try:
+            loop = asyncio.get_running_loop()
+            # Carry context over so spans inside `fn` are attributed to the calling request
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._pool(stage), context.run, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight[stage] -= 1
+
+    def capacity(self, stage: str) -> int:
+        """Maximum number of calls a stage accepts at once (running + waiting)."""
+        return self.workers.get(stage, 1) + self.queue_limits.get(stage, 0)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """In-flight work and capacity per stage."""
+        return {
+            stage: {
+                "workers": self.workers.get(stage, 1),
+                "in_flight": self._in_flight.get(stage, 0),
+                "capacity": self.capacity(stage)
+            }
+            for stage in sorted(set(self.workers) | set(self._in_flight))
+        }
+
+    def shutdown(self):
+        """Stop all stage pools, waiting for running work to finish."""
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        self._pools.clear()
+
+    def _pool(self, stage: str) -> ThreadPoolExecutor:
+        if stage not in self._pools:
+            self._pools[stage] = ThreadPoolExecutor(
+                max_workers=self.workers.get(stage, 1),
+                thread_name_prefix=f"stage-{stage}"
+            )
+        return self._pools[stage]
+
+stage_executor = StageExecutor()
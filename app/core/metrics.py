@@ -0,0 +1,179 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Seconds; spans range from sub-millisecond lookups to multi-minute transcriptions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# (stage, seconds) spans recorded while serving the current request, for Server-Timing
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in sorted(values.items())]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(values[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_number(values[-1])}")
+        return lines
+
+class Gauge:
+    """
+    A value read when metrics are scraped. The callback returns a number, or a dict
+    mapping the single label's values to numbers.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]], labelname: Optional[str] = None):
+        self.name, self.help, self.fn, self.labelname = name, help, fn, labelname
+
+    def render(self) -> List[str]:
+        value = self.fn()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if isinstance(value, dict):
+            lines += [
+                f"{self.name}{_labels((self.labelname,), (label,))} {_number(v)}" for label, v in sorted(value.items())
+            ]
+        else:
+            lines.append(f"{self.name} {_number(value)}")
+        return lines
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format.
+
+    `span()` times a pipeline stage into the stage histogram and, while a request
+    is being served, into that request's timings for the Server-Timing header.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram, Gauge]] = {}
+        self._lock = threading.Lock()
+        self.stage_seconds = self.histogram(
+            "pipeline_stage_duration_seconds", "Time spent in each pipeline stage", ("stage",)
+        )
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(name, lambda: Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]], labelname: Optional[str] = None) -> Gauge:
+        """Register (or replace) a gauge computed at scrape time."""
+        with self._lock:
+            self._metrics[name] = Gauge(name, help, fn, labelname)
+            return self._metrics[name]
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as `stage`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stage_seconds.observe(elapsed, stage=stage)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append((stage, elapsed))
+
+    @contextmanager
+    def collect_request_timings(self):
+        """Collect spans from the current context (and tasks/stage calls it starts) into a list."""
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        try:
+            yield timings
+        finally:
+            _request_timings.reset(token)
+
+    @staticmethod
+    def detach_request_timings():
+        """Stop attributing spans in the current context to a request, e.g. in shared batch workers."""
+        _request_timings.set(None)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, name: str, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value, summing spans of the same stage (parallel spans may exceed wall time)."""
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+metrics = MetricsRegistry()
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, field_serializer
+from typing import Any, Dict, List, Optional, Union
 
 class PostMetadata(BaseModel):
     text: Optional[str] = None
@@ -8,13 +9,55 @@ class PostMetadata(BaseModel):
     has_video: bool = False
     created_at: Optional[str] = None
     tags: List[str] = Field(default_factory=list)
+    tag_scores: Dict[str, float] = Field(default_factory=dict, description="Zero-shot tags and their label similarity")
 
 class PostResponse(BaseModel):
     post_id: str
-    embedding: List[float]
+    embedding: Optional[Union[List[float], str]] = Field(
+        None, description="Float list, or base64 text for binary formats; null when include_embedding is false"
+    )
+    embedding_format: Optional[str] = Field(None, description="json, float16 or npy; how `embedding` is encoded")
     metadata: PostMetadata  # Use structured metadata
+    duplicate: bool = Field(False, description="True if post_id is an existing near-identical post")
 
 class SearchResponse(BaseModel):
     post_id: str
     score: float = Field(..., description="Similarity score (higher is better)")
-    metadata: PostMetadata  # Also structured for consistency
\ No newline at end of file
+    metadata: PostMetadata  # Also structured for consistency
+
+class SearchFilters(BaseModel):
+    has_image: Optional[bool] = None
+    has_video: Optional[bool] = None
+    tags: Optional[List[str]] = Field(None, description="Posts must carry all of these tags")
+    created_after: Optional[datetime] = Field(None, description="ISO date or timestamp (UTC if no offset), inclusive")
+    created_before: Optional[datetime] = Field(None, description="ISO date or timestamp (UTC if no offset), exclusive")
+
+    @field_serializer("created_after", "created_before")
+    def _to_stored_format(self, value: Optional[datetime]) -> Optional[str]:
+        """UTC ISO text like stored created_at values, so the SQL string comparison orders correctly."""
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat()
+
+class SearchQuery(BaseModel):
+    query: str
+    limit: int = Field(10, ge=1)
+    filters: Optional[SearchFilters] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchQuery] = Field(..., min_length=1)
+
+class TagRequest(BaseModel):
+    labels: List[str] = Field(default_factory=list, description="Labels to add to the vocabulary")
+    retag: bool = Field(True, description="Re-tag every indexed post afterwards")
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[Union[PostResponse, Dict[str, Any]]] = Field(None, description="The post, or a re-tag summary")
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
@@ -0,0 +1,341 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.models.schemas import PostMetadata
+from app.services.clip_service import CLIPService
+from app.services.tagging_service import TaggingService
+from app.services.video_service import VideoService
+from app.services.whisper_service import WhisperService
+from app.utils.helpers import load_image_from_path
+from app.vectors.faiss_client import FAISSClient
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+VIDEO_SUFFIXES = {".mp4", ".mov", ".webm"}
+STAGES = ("discover", "decode", "transcribe", "embed", "index")
+
+class StageMeter:
+    """Items processed and time spent by one pipeline stage."""
+
+    def __init__(self):
+        self.items = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+class BulkIndexer:
+    """
+    Indexes a directory of posts (one sub-directory per post) through a staged pipeline:
+    discover -> decode -> transcribe -> embed -> index.
+
+    Each stage has its own worker pool and stages are joined by bounded queues, so
+    the slowest stage sets the pace instead of decoded frames piling up in memory.
+    Embedding and indexing work on batches of posts. Every indexed post records its
+    directory as `source`, which is what an interrupted run resumes from; the index
+    itself is saved once, when the run ends.
+    """
+
+    def __init__(
+        self,
+        clip_service: CLIPService,
+        whisper_service: Optional[WhisperService],
+        video_service: VideoService,
+        faiss_client: FAISSClient,
+        decode_workers: int = 4,
+        transcribe_workers: int = 1,
+        queue_size: int = 32,
+        embed_batch_size: Optional[int] = None,
+        index_batch_size: int = 256,
+        report_interval: float = 10.0,
+        tagging_service: Optional[TaggingService] = None
+    ):
+        self.clip_service = clip_service
+        self.whisper_service = whisper_service  # None skips transcription
+        self.video_service = video_service
+        self.faiss_client = faiss_client
+        self.tagging_service = tagging_service  # None keeps only the tags in metadata.json
+        self.decode_workers = decode_workers
+        self.transcribe_workers = transcribe_workers
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size or settings.CLIP_BATCH_SIZE
+        self.index_batch_size = index_batch_size
+        self.report_interval = report_interval
+        self.meters: Dict[str, StageMeter] = {}
+        self.failures: List[Tuple[str, str, str]] = []
+
+    async def run(self, data_dir: Path) -> Dict[str, Any]:
+        """Index every post under `data_dir` not indexed by a previous run. Returns a run summary."""
+        self.data_dir = Path(data_dir)
+        self.meters = {stage: StageMeter() for stage in STAGES}
+        self.failures = []
+        started = time.perf_counter()
+
+        pending, already_indexed = self.discover()
+        self.total = len(pending)
+        logger.info(f"Found {self.total + already_indexed} posts, {already_indexed} already indexed")
+
+        pools = {
+            "decode": ThreadPoolExecutor(self.decode_workers, thread_name_prefix="bulk-decode"),
+            "transcribe": ThreadPoolExecutor(self.transcribe_workers, thread_name_prefix="bulk-transcribe"),
+            "embed": ThreadPoolExecutor(1, thread_name_prefix="bulk-embed")
+        }
+        todo, decoded, transcribed, embedded = (asyncio.Queue(self.queue_size) for _ in range(4))
+        self._queues = {"decode": todo, "transcribe": decoded, "embed": transcribed, "index": embedded}
+
+        # Snapshots are deferred to the end; the write-ahead log keeps each batch durable meanwhile
+        snapshot_every = self.faiss_client.snapshot_every
+        self.faiss_client.snapshot_every = float("inf")
+        reporter = asyncio.create_task(self._report(started))
+        try:
+            await asyncio.gather(
+                self._feed(pending, todo),
+                self._stage(
+                    [self._worker("decode", pools["decode"], self._decode, todo, decoded)
+                     for _ in range(self.decode_workers)],
+                    decoded, self.transcribe_workers
+                ),
+                self._stage(
+                    [self._worker("transcribe", pools["transcribe"], self._transcribe, decoded, transcribed)
+                     for _ in range(self.transcribe_workers)],
+                    transcribed, 1
+                ),
+                self._stage([self._embed(pools["embed"], transcribed, embedded)], embedded, 1),
+                self._index(embedded)
+            )
+        finally:
+            reporter.cancel()
+            for pool in pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+            self.faiss_client.snapshot_every = snapshot_every
+            self.faiss_client.snapshot()
+
+        summary = self.summary(time.perf_counter() - started)
+        summary["already_indexed"] = already_indexed
+        logger.info(f"Bulk indexing finished: {json.dumps(summary)}")
+        return summary
+
+    def discover(self) -> Tuple[List[str], int]:
+        """List post directories, minus those a previous run already indexed."""
+        started = time.perf_counter()
+        with os.scandir(self.data_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_dir())
+        done = self.faiss_client.metadata.values("source")
+        pending = [name for name in names if name not in done]
+
+        meter = self.meters["discover"]
+        meter.items = len(names)
+        meter.busy_seconds = time.perf_counter() - started
+        return pending, len(names) - len(pending)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "indexed": self.meters["index"].items,
+            "failed": len(self.failures),
+            "seconds": round(elapsed, 3),
+            "stages": {
+                stage: {
+                    "items": meter.items,
+                    "failed": meter.failed,
+                    "busy_seconds": round(meter.busy_seconds, 3),
+                    "per_second": round(meter.items / elapsed, 3) if elapsed else 0.0
+                }
+                for stage, meter in self.meters.items()
+            }
+        }
+
+    # Stage functions (run on the stage's thread pool)
+
+    def _decode(self, name: str) -> Dict[str, Any]:
+        post_dir = self.data_dir / name
+        metadata_path = post_dir / "metadata.json"
+        raw = json.loads(metadata_path.read_text()) if metadata_path.exists() else {}
+        # Validated here, so a malformed metadata.json fails only its own post
+        metadata = PostMetadata(
+            text=raw.get("text"),
+            tags=raw.get("tags") or [],
+            created_at=raw.get("created_at") or datetime.now(timezone.utc).isoformat()
+        )
+
+        files = sorted(post_dir.iterdir())
+        image_paths = [path for path in files if path.suffix.lower() in IMAGE_SUFFIXES]
+        video_paths = [path for path in files if path.suffix.lower() in VIDEO_SUFFIXES]
+
+        # Preprocessed tensors are far smaller than decoded frames, so this is what gets queued
+        frames = []
+        for video_path in video_paths:
+            frames.extend(self.video_service.read_frames(video_path))
+        # One track per video; videos without audio give empty tracks
+        audio = [self.whisper_service.load_audio(path) for path in video_paths] if self.whisper_service else []
+
+        return {
+            "source": name,
+            "metadata": metadata,
+            "audio_text": None,
+            "has_video": bool(video_paths),
+            "image_tensors": self.clip_service.preprocess_images([load_image_from_path(path) for path in image_paths]),
+            "frame_tensors": self.clip_service.preprocess_images(frames),
+            "audio": audio
+        }
+
+    def _transcribe(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        tracks = post.pop("audio")
+        if tracks:
+            texts = [self.whisper_service.transcribe_audio(track) for track in tracks]
+            post["audio_text"] = " ".join(text for text in texts if text) or None
+        return post
+
+    def _embed_batch(self, posts: List[Dict[str, Any]]) -> List[np.ndarray]:
+        """One image-encoder pass over every image and frame in the batch, and one text pass."""
+        tensors = [t for post in posts for t in post["image_tensors"] + post["frame_tensors"]]
+        image_embeddings = self.clip_service.encode_image_tensors(tensors) if tensors else None
+        texts = [post["metadata"].text or post["audio_text"] for post in posts]
+        present = [text for text in texts if text]
+        text_embeddings = iter(self.clip_service.encode_texts(present)) if present else iter(())
+
+        embeddings, offset = [], 0
+        for post, text in zip(posts, texts):
+            parts = []
+            for key in ("image_tensors", "frame_tensors"):
+                count = len(post[key])
+                if count:
+                    parts.append(image_embeddings[offset:offset + count].mean(axis=0, keepdims=True))
+                offset += count
+            if text:
+                parts.append(next(text_embeddings)[None, :])
+            embeddings.append(CLIPService.combine_embeddings(parts) if parts else None)
+        return embeddings
+
+    # Pipeline plumbing
+
+    async def _feed(self, names: List[str], outbox: asyncio.Queue):
+        for name in names:
+            await outbox.put(name)
+        for _ in range(self.decode_workers):
+            await outbox.put(None)
+
+    async def _stage(self, workers: List, outbox: asyncio.Queue, downstream_workers: int):
+        """Run a stage's workers to completion, then tell each downstream worker to stop."""
+        await asyncio.gather(*workers)
+        for _ in range(downstream_workers):
+            await outbox.put(None)
+
+    async def _worker(self, stage: str, pool: ThreadPoolExecutor, fn, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        meter = self.meters[stage]
+        while (item := await inbox.get()) is not None:
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(pool, fn, item)
+            except Exception as e:
+                self._fail(stage, item if isinstance(item, str) else item["source"], e)
+                continue
+            finally:
+                meter.busy_seconds += time.perf_counter() - started
+            meter.items += 1
+            await outbox.put(result)
+
+    async def _embed(self, pool: ThreadPoolExecutor, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        meter = self.meters["embed"]
+        done = False
+        while not done:
+            posts, done = await self._next_batch(inbox, self.embed_batch_size)
+            if not posts:
+                continue
+            started = time.perf_counter()
+            try:
+                embeddings = await loop.run_in_executor(pool, self._embed_batch, posts)
+            except Exception as e:
+                for post in posts:
+                    self._fail("embed", post["source"], e)
+                continue
+            finally:
+                meter.busy_seconds += time.perf_counter() - started
+            for post, embedding in zip(posts, embeddings):
+                if embedding is None:
+                    self._fail("embed", post["source"], ValueError("Post has no image, video or text"))
+                    continue
+                meter.items += 1
+                await outbox.put((post, embedding))
+
+    async def _index(self, inbox: asyncio.Queue):
+        meter = self.meters["index"]
+        done = False
+        while not done:
+            batch, done = await self._next_batch(inbox, self.index_batch_size)
+            if not batch:
+                continue
+            started = time.perf_counter()
+            metadatas = [
+                {
+                    **post["metadata"].model_copy(update={
+                        "audio_text": post["audio_text"],
+                        "has_image": bool(post["image_tensors"]),
+                        "has_video": post["has_video"]
+                    }).model_dump(),
+                    "source": post["source"]
+                }
+                for post, _ in batch
+            ]
+            if self.tagging_service:
+                # One matrix product tags the whole batch
+                tagged = self.tagging_service.tag_many(np.vstack([embedding for _, embedding in batch]))
+                metadatas = [TaggingService.apply(metadata, tags) for metadata, tags in zip(metadatas, tagged)]
+            try:
+                await self.faiss_client.add_posts([embedding for _, embedding in batch], metadatas)
+            except Exception as e:
+                for post, _ in batch:
+                    self._fail("index", post["source"], e)
+                continue
+            finally:
+                meter.busy_seconds += time.perf_counter() - started
+            meter.items += len(batch)
+
+    @staticmethod
+    async def _next_batch(inbox: asyncio.Queue, max_size: int) -> Tuple[List[Any], bool]:
+        """Wait for one item, then take whatever else is queued, up to `max_size`."""
+        item = await inbox.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        while len(batch) < max_size and not inbox.empty():
+            item = inbox.get_nowait()
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _fail(self, stage: str, source: str, error: Exception):
+        self.meters[stage].failed += 1
+        self.failures.append((source, stage, str(error)))
+        logger.warning(f"Failed to index {source} at {stage}: {error}")
+
+    async def _report(self, started: float):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logger.info(self.progress(time.perf_counter() - started))
+
+    def progress(self, elapsed: float) -> str:
+        """One-line progress report: per-stage throughput, queue depths and ETA."""
+        indexed = self.meters["index"].items
+        finished = indexed + len(self.failures)
+        rates = ", ".join(
+            f"{stage} {self.meters[stage].items / elapsed:.1f}/s" for stage in STAGES[1:]
+        )
+        depths = "/".join(str(queue.qsize()) for queue in self._queues.values())
+        rate = finished / elapsed
+        eta = timedelta(seconds=int((self.total - finished) / rate)) if rate else "unknown"
+        return (
+            f"Indexed {indexed}/{self.total} ({len(self.failures)} failed) | {rates} | "
+            f"queues {depths} | ETA {eta}"
+        )
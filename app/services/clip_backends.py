@@ -0,0 +1,211 @@
+import copy
+import inspect
+import logging
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+BACKENDS = ("eager", "int8", "torchscript", "onnx")
+
+class EagerBackend:
+    """The fp32 open_clip model as loaded; the reference every other backend is checked against."""
+    name = "eager"
+
+    def __init__(self, model: torch.nn.Module, device: str):
+        self.model = model
+        self.device = device
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        with torch.inference_mode():
+            return self.model.encode_text(tokens.to(self.device)).float().cpu().numpy()
+
+    def encode_image(self, images: torch.Tensor) -> np.ndarray:
+        with torch.inference_mode():
+            return self.model.encode_image(images.to(self.device)).float().cpu().numpy()
+
+class Int8Backend(EagerBackend):
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations quantized per call). CPU only."""
+    name = "int8"
+
+    def __init__(self, model: torch.nn.Module, device: str):
+        if device != "cpu":
+            raise ValueError("The int8 CLIP backend runs on CPU only")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            quantized = torch.ao.quantization.quantize_dynamic(
+                copy.deepcopy(model).eval(), {torch.nn.Linear}, dtype=torch.qint8
+            )
+        # open_clip reads the cast dtype from a Linear weight, which is a method on quantized Linears
+        from open_clip.transformer import Transformer
+        for module in quantized.modules():
+            if isinstance(module, Transformer):
+                module.get_cast_dtype = lambda: torch.float32
+        super().__init__(quantized, device)
+
+class _TextEncoder(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens: torch.Tensor) -> torch.Tensor:
+        return self.model.encode_text(tokens)
+
+class _ImageEncoder(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, images: torch.Tensor) -> torch.Tensor:
+        return self.model.encode_image(images)
+
+class TorchScriptBackend:
+    """Traced, frozen graphs of both encoders with inference-only fusions applied."""
+    name = "torchscript"
+
+    def __init__(self, model: torch.nn.Module, device: str, example_tokens: torch.Tensor, example_images: torch.Tensor):
+        self.device = device
+        self.text = self._trace(_TextEncoder(model), example_tokens.to(device))
+        self.image = self._trace(_ImageEncoder(model), example_images.to(device))
+
+    @staticmethod
+    def _trace(module: torch.nn.Module, example: torch.Tensor):
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # Tracer warnings about shape-dependent Python control flow
+            traced = torch.jit.trace(module.eval(), example)
+            return torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.text(tokens.to(self.device)).float().cpu().numpy()
+
+    def encode_image(self, images: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.image(images.to(self.device)).float().cpu().numpy()
+
+class OnnxBackend:
+    """
+    Both encoders exported to ONNX and run by ONNX Runtime on CPU.
+    Exports of pretrained weights are cached in `export_dir`; random weights are exported per load.
+    """
+    name = "onnx"
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        example_tokens: torch.Tensor,
+        example_images: torch.Tensor,
+        export_dir: Optional[Path],
+        num_threads: Optional[int] = None,
+        interop_threads: Optional[int] = None
+    ):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("CLIP_BACKEND=onnx requires onnxruntime (pip install onnxruntime onnx)") from e
+        if export_dir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="clip-onnx-")
+            export_dir = Path(self._tmp.name)
+        export_dir.mkdir(parents=True, exist_ok=True)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or 0  # 0 lets ONNX Runtime pick
+        options.inter_op_num_threads = interop_threads or 0
+        self.text = self._session(
+            onnxruntime, options, export_dir / "text.onnx", _TextEncoder(model), example_tokens.cpu()
+        )
+        self.image = self._session(
+            onnxruntime, options, export_dir / "image.onnx", _ImageEncoder(model), example_images.cpu()
+        )
+
+    @staticmethod
+    def _session(onnxruntime, options, path: Path, module: torch.nn.Module, example: torch.Tensor):
+        if not path.exists():
+            logger.info(f"Exporting {path.name} to ONNX")
+            tmp_path = path.with_name(path.name + ".tmp")
+            kwargs: Dict[str, Any] = {}
+            if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+                kwargs["dynamo"] = False  # The TorchScript exporter handles dynamic_axes without onnxscript
+            with torch.no_grad(), warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                torch.onnx.export(
+                    module.eval().cpu(), (example,), str(tmp_path),
+                    input_names=["input"], output_names=["embedding"],
+                    dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}},
+                    opset_version=17, **kwargs
+                )
+            tmp_path.replace(path)
+        return onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        return self.text.run(None, {"input": tokens.cpu().numpy()})[0]
+
+    def encode_image(self, images: torch.Tensor) -> np.ndarray:
+        return self.image.run(None, {"input": images.cpu().numpy()})[0]
+
+def create_backend(
+    name: str,
+    model: torch.nn.Module,
+    device: str,
+    example_tokens: torch.Tensor,
+    example_images: torch.Tensor,
+    export_dir: Optional[Path] = None,
+    num_threads: Optional[int] = None,
+    interop_threads: Optional[int] = None
+):
+    """
+    Build the named encoder backend around an fp32 open_clip model (left unchanged).
+    Example inputs are used for tracing/export; any batch size works afterwards.
+    """
+    if name == "eager":
+        return EagerBackend(model, device)
+    if name == "int8":
+        return Int8Backend(model, device)
+    if name == "torchscript":
+        return TorchScriptBackend(model, device, example_tokens, example_images)
+    if name == "onnx":
+        return OnnxBackend(model, example_tokens, example_images, export_dir, num_threads, interop_threads)
+    raise ValueError(f"Unknown CLIP backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+def configure_threads(num_threads: Optional[int], interop_threads: Optional[int]):
+    """Set torch's process-wide intra-op and inter-op thread counts; None keeps the default."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work in the process
+            logger.warning("Inter-op threads already started; CLIP_INTEROP_THREADS ignored")
+
+def check_accuracy(reference, candidate, tokens: torch.Tensor, images: torch.Tensor, k: int = 5) -> Dict[str, float]:
+    """
+    Compare a backend with the fp32 reference on the same inputs.
+    Reports cosine similarity of matching embeddings and how well text-to-image
+    rankings agree: top-1 agreement and the overlap of the top-k lists.
+    """
+    def normalized(embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    ref_text, ref_image = normalized(reference.encode_text(tokens)), normalized(reference.encode_image(images))
+    text, image = normalized(candidate.encode_text(tokens)), normalized(candidate.encode_image(images))
+    cosines = np.concatenate([(ref_text * text).sum(axis=1), (ref_image * image).sum(axis=1)])
+
+    k = min(k, len(images))
+    ref_ranks = np.argsort(-(ref_text @ ref_image.T), axis=1)
+    ranks = np.argsort(-(text @ image.T), axis=1)
+    overlap = [len(set(a[:k]) & set(b[:k])) / k for a, b in zip(ref_ranks, ranks)]
+    return {
+        "min_cosine": round(float(cosines.min()), 6),
+        "mean_cosine": round(float(cosines.mean()), 6),
+        "top1_agreement": round(float((ref_ranks[:, 0] == ranks[:, 0]).mean()), 4),
+        "recall_at_k": round(float(np.mean(overlap)), 4),
+        "k": k
+    }
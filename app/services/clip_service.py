@@ -1,54 +1,117 @@
+import logging
 import torch
 import open_clip
 from PIL import Image
 import numpy as np
-from typing import List, Optional
-from fastapi import UploadFile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 from app.core.config import settings
-from app.utils.helpers import load_image_from_upload
+from app.core.executor import stage_executor
+from app.core.metrics import metrics
+from app.services.clip_backends import EagerBackend, check_accuracy, configure_threads, create_backend
+from app.services.inference_scheduler import InferenceScheduler
+from app.utils.cache import LRUCache
+from app.utils.helpers import preprocess_text
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Fixed inputs for checking a backend against fp32 at load time
+PROBE_TEXTS = [
+    "a photo of a dog", "a cat sleeping on a couch", "sunset over the ocean", "a city street at night",
+    "a plate of pizza", "friends at a party", "snowy mountain hike", "a red car",
+    "a birthday cake with candles", "people at a concert", "a forest trail", "a cup of coffee"
+]
+PROBE_IMAGES = 8
 
 class CLIPService:
     def __init__(self):
         self.device = settings.DEVICE
+        self.batch_size = settings.CLIP_BATCH_SIZE
+        configure_threads(settings.CLIP_NUM_THREADS, settings.CLIP_INTEROP_THREADS)
         self.model, _, self.preprocess = open_clip.create_model_and_transforms(
             settings.CLIP_MODEL_NAME,
             pretrained=settings.CLIP_MODEL_PRETRAINED,
             device=self.device
         )
+        self.model.eval()
         self.tokenizer = open_clip.get_tokenizer(settings.CLIP_MODEL_NAME)
+        self._preprocess_pool = ThreadPoolExecutor(
+            max_workers=settings.CLIP_PREPROCESS_WORKERS,
+            thread_name_prefix="clip-preprocess"
+        )
+        self.backend, self.backend_accuracy = self._load_backend(settings.CLIP_BACKEND)
+        # Coalesce concurrent encode requests into shared forward passes
+        self.scheduler = InferenceScheduler({
+            "text": self.encode_texts,
+            "image": self.encode_images
+        }) if settings.INFERENCE_BATCHING else None
+        # Query embeddings keyed by normalized text; the tokenizer lowercases anyway
+        self.text_cache = LRUCache(
+            max_items=settings.TEXT_EMBEDDING_CACHE_SIZE,
+            ttl=settings.TEXT_EMBEDDING_CACHE_TTL,
+            max_bytes=settings.TEXT_EMBEDDING_CACHE_MAX_BYTES,
+            size_of=lambda embedding: embedding.nbytes
+        )
+
+    def _load_backend(self, name: str):
+        """
+        Build the configured encoder backend and check it against the fp32 model on
+        fixed probe inputs. Falls back to fp32 if embeddings drift past CLIP_BACKEND_MIN_COSINE.
+        """
+        reference = EagerBackend(self.model, self.device)
+        if name == "eager":
+            return reference, None
+        tokens = self.tokenizer(PROBE_TEXTS)
+        images = torch.stack(self.preprocess_images(self.probe_images()))
+        export_dir = None
+        if settings.CLIP_MODEL_PRETRAINED:
+            export_dir = settings.CLIP_EXPORT_DIR / f"{settings.CLIP_MODEL_NAME}-{settings.CLIP_MODEL_PRETRAINED}"
+        backend = create_backend(
+            name, self.model, self.device, tokens, images[:2], export_dir,
+            settings.CLIP_NUM_THREADS, settings.CLIP_INTEROP_THREADS
+        )
+        accuracy = check_accuracy(reference, backend, tokens, images)
+        logger.info(f"CLIP backend '{name}' vs fp32: {accuracy}")
+        if accuracy["min_cosine"] < settings.CLIP_BACKEND_MIN_COSINE:
+            logger.warning(
+                f"CLIP backend '{name}' min cosine {accuracy['min_cosine']} is below "
+                f"{settings.CLIP_BACKEND_MIN_COSINE}; using fp32"
+            )
+            return reference, accuracy
+        return backend, accuracy
+
+    @staticmethod
+    def probe_images() -> List[Image.Image]:
+        """Deterministic blocky color images used as accuracy-check inputs."""
+        rng = np.random.default_rng(0)
+        return [
+            Image.fromarray(np.kron(rng.integers(0, 256, (8, 8, 3)), np.ones((32, 32, 1))).astype(np.uint8))
+            for _ in range(PROBE_IMAGES)
+        ]
+
+    def backend_status(self) -> Dict[str, Any]:
+        """The encoder backend in use and, for non-fp32 ones, its load-time accuracy check."""
+        return {"requested": settings.CLIP_BACKEND, "active": self.backend.name, "accuracy": self.backend_accuracy}
 
     async def generate_embeddings(
         self,
-        images: Optional[List[UploadFile]] = None,
+        images: Optional[List[Image.Image]] = None,
         video_frames: Optional[List[Image.Image]] = None,
         text: Optional[str] = None
     ) -> np.ndarray:
         """Generate a unified embedding from image, video frames, and/or text."""
         embeddings = []
-        
+
         # Process images if provided
         if images:
-            image_embeddings = []
-            for image in images:
-                img = await load_image_from_upload(image)
-                img = self.preprocess(img).unsqueeze(0).to(self.device)
-                with torch.no_grad():
-                    img_embedding = self.model.encode_image(img)
-                image_embeddings.append(img_embedding.cpu().numpy())
-            if image_embeddings:
-                embeddings.append(np.mean(image_embeddings, axis=0))
-
-        # Process video frames
+            image_embeddings = await self.encode_images_async(images)
+            embeddings.append(image_embeddings.mean(axis=0, keepdims=True))
+
+        # Process video frames, averaging the frame embeddings
         if video_frames:
-            frame_embeddings = []
-            for frame in video_frames:
-                frame = self.preprocess(frame).unsqueeze(0).to(self.device)
-                with torch.no_grad():
-                    frame_embedding = self.model.encode_image(frame)
-                frame_embeddings.append(frame_embedding.cpu().numpy())
-            # Average frame embeddings
-            if frame_embeddings:
-                embeddings.append(np.mean(frame_embeddings, axis=0))
+            frame_embeddings = await self.encode_images_async(video_frames)
+            embeddings.append(frame_embeddings.mean(axis=0, keepdims=True))
 
         # Process text
         if text:
@@ -56,9 +119,14 @@ class CLIPService:
             embeddings.append(text_embedding)
 
         # Combine all embeddings
+        return self.combine_embeddings(embeddings)
+
+    @staticmethod
+    def combine_embeddings(embeddings: List[np.ndarray]) -> np.ndarray:
+        """Average per-modality (1, dim) embeddings into one normalized (1, dim) post vector."""
         if not embeddings:
             raise ValueError("No valid input provided for embedding generation")
-        
+
         def normalize(vec: np.ndarray) -> np.ndarray:
             return vec / np.linalg.norm(vec)
 
@@ -66,7 +134,56 @@ class CLIPService:
 
     async def generate_text_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for text input."""
-        tokens = self.tokenizer(text).to(self.device)
-        with torch.no_grad():
-            text_embedding = self.model.encode_text(tokens)
-        return text_embedding.cpu().numpy()
\ No newline at end of file
+        return await self.generate_text_embeddings([text])
+
+    async def generate_text_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for many texts in a single tokenize/encode pass.
+        Cached texts are served without running the encoder.
+        """
+        keys = [preprocess_text(text) for text in texts]
+        cached = [self.text_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, hit in zip(keys, cached) if hit is None))
+
+        if missing:
+            if self.scheduler:
+                encoded = await self.scheduler.submit("text", missing)
+            else:
+                encoded = await stage_executor.run("clip", self.encode_texts, missing)
+            fresh = dict(zip(missing, encoded))
+            for key, embedding in fresh.items():
+                self.text_cache.put(key, embedding)
+            cached = [hit if hit is not None else fresh[key] for key, hit in zip(keys, cached)]
+
+        return np.vstack(cached)
+
+    async def encode_images_async(self, images: List[Image.Image]) -> np.ndarray:
+        """Encode images, sharing forward passes with concurrent requests when batching is on."""
+        if self.scheduler:
+            return await self.scheduler.submit("image", images)
+        return await stage_executor.run("clip", self.encode_images, images)
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Tokenize and encode texts in one forward pass; returns an (N, dim) array."""
+        with metrics.span("clip_encode_text"):
+            return self.backend.encode_text(self.tokenizer(texts))
+
+    def encode_images(self, images: List[Image.Image]) -> np.ndarray:
+        """
+        Encode images in bounded batches of CLIP_BATCH_SIZE.
+        Preprocessing runs in parallel; returns an (N, dim) array.
+        """
+        return self.encode_image_tensors(self.preprocess_images(images))
+
+    def preprocess_images(self, images: List[Image.Image]) -> List[torch.Tensor]:
+        """Resize, crop and normalize images for the image encoder, in parallel."""
+        with metrics.span("clip_preprocess"):
+            return list(self._preprocess_pool.map(self.preprocess, images))
+
+    def encode_image_tensors(self, tensors: List[torch.Tensor]) -> np.ndarray:
+        """Encode preprocessed image tensors in batches of CLIP_BATCH_SIZE; returns an (N, dim) array."""
+        with metrics.span("clip_encode_image"):
+            return np.concatenate([
+                self.backend.encode_image(torch.stack(tensors[start:start + self.batch_size]))
+                for start in range(0, len(tensors), self.batch_size)
+            ])
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Services each role loads at startup; anything else is created on first use, if ever
+ROLE_SERVICES = {
+    "search": ["faiss", "clip", "search"],
+    "ingest": ["faiss", "clip", "whisper", "video", "tagging", "ingest", "job_queue", "job_workers"],
+    "all": ["faiss", "clip", "whisper", "video", "tagging", "search", "ingest", "job_queue", "job_workers"],
+}
+# Route groups each role serves
+ROLE_ROUTES = {
+    "search": {"search"},
+    "ingest": {"ingest"},
+    "all": {"search", "ingest"},
+}
+
+class ServiceContainer:
+    """
+    Creates services lazily and loads a role's models in the background at startup.
+
+    Importing the API no longer loads CLIP, Whisper or the index. Nothing heavy
+    happens until `start()` runs from the app lifespan (or a service is first
+    used). Search-only nodes never import Whisper or OpenCV. Readiness is
+    reported only after every service the role needs is loaded and warmed up.
+
+    With several worker processes, the first ingest-capable one to take the
+    index's writer lock owns writes and runs the job workers; the others serve
+    searches from memory-mapped snapshots and forward classify requests to the
+    owner through the job queue. If the owner dies, another worker takes over.
+    """
+
+    def __init__(self, role: Optional[str] = None):
+        self.role = role or settings.SERVICE_ROLE
+        if self.role not in ROLE_SERVICES:
+            raise ValueError(f"Unknown service role: {self.role}")
+        self.state = "idle"  # idle -> loading -> warming -> ready, or failed
+        self.error: Optional[str] = None
+        self.load_seconds: Dict[str, float] = {}
+        self.warmup_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+        self._maintenance: Optional[asyncio.Task] = None
+        self._created = time.perf_counter()
+
+    # Services
+
+    @property
+    def faiss(self):
+        def create():
+            from app.vectors.faiss_client import FAISSClient
+            from app.vectors.writer_lock import IndexLockedError
+            if self.serves("ingest"):
+                try:
+                    return FAISSClient()
+                except IndexLockedError:
+                    logger.info("Another worker owns index writes; serving read-only snapshots")
+            return FAISSClient(read_only=True)
+        return self._get("faiss", create)
+
+    @property
+    def clip(self):
+        def create():
+            from app.services.clip_service import CLIPService
+            return CLIPService()
+        return self._get("clip", create)
+
+    @property
+    def whisper(self):
+        def create():
+            from app.services.whisper_service import WhisperService
+            return WhisperService()
+        return self._get("whisper", create)
+
+    @property
+    def video(self):
+        def create():
+            from app.services.video_service import VideoService
+            return VideoService()
+        return self._get("video", create)
+
+    @property
+    def tagging(self):
+        def create():
+            from app.services.tagging_service import TaggingService
+            return TaggingService(self.clip)
+        return self._get("tagging", create)
+
+    @property
+    def search(self):
+        def create():
+            from app.services.search_service import SearchService
+            return SearchService(self.clip, self.faiss)
+        return self._get("search", create)
+
+    @property
+    def ingest(self):
+        def create():
+            from app.services.ingest_service import IngestService
+            return IngestService(self.clip, self.whisper, self.video, self.faiss, tagging_service=self.tagging)
+        return self._get("ingest", create)
+
+    @property
+    def job_queue(self):
+        def create():
+            from app.services.job_queue import JobQueue
+            return JobQueue(settings.JOB_QUEUE_PATH)
+        return self._get("job_queue", create)
+
+    @property
+    def job_workers(self):
+        def create():
+            from app.services.job_queue import JobWorkerPool
+            return JobWorkerPool(self.job_queue, self.ingest.run_job)
+        return self._get("job_workers", create)
+
+    def loaded(self, name: str) -> Optional[Any]:
+        """The service if it has been created, without creating it."""
+        return self._instances.get(name)
+
+    def serves(self, group: str) -> bool:
+        return group in ROLE_ROUTES[self.role]
+
+    @property
+    def owns_index(self) -> bool:
+        """True in the one process that writes the index; others forward writes to it."""
+        return not self.faiss.read_only
+
+    # Lifecycle
+
+    async def start(self):
+        """Load and warm up the role's services in the background; the app answers liveness meanwhile."""
+        self._created = time.perf_counter()
+        self._task = asyncio.create_task(self._start())
+
+    async def wait_ready(self):
+        if self._task:
+            await self._task
+
+    async def stop(self):
+        for task in (self._task, self._maintenance):
+            if task and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self.loaded("job_workers"):
+            await self.job_workers.stop()
+        if self.loaded("faiss") and self.owns_index:
+            self.faiss.snapshot()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "role": self.role,
+            "state": self.state,
+            "index_writer": self.owns_index if self.loaded("faiss") else None,
+            "error": self.error,
+            "loaded": sorted(self._instances),
+            "load_seconds": {name: round(seconds, 3) for name, seconds in self.load_seconds.items()},
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "ready_seconds": round(self.ready_seconds, 3) if self.ready_seconds is not None else None
+        }
+
+    async def _start(self):
+        try:
+            self.state = "loading"
+            await asyncio.to_thread(self._load, ROLE_SERVICES[self.role])
+            self.state = "warming"
+            started = time.perf_counter()
+            await asyncio.to_thread(self._warm_up)
+            self.warmup_seconds = time.perf_counter() - started
+            if self.serves("ingest") and self.owns_index:
+                await self.job_workers.start()
+            self._maintenance = asyncio.create_task(self._maintain_index())
+        except Exception as e:
+            logger.error("Service startup failed", exc_info=True)
+            self.state, self.error = "failed", str(e)
+            return
+        self.ready_seconds = time.perf_counter() - self._created
+        self.state = "ready"
+        logger.info(
+            f"Ready as '{self.role}' in {self.ready_seconds:.2f}s "
+            f"(load {self.load_seconds}, warm-up {self.warmup_seconds:.2f}s)"
+        )
+
+    async def _maintain_index(self):
+        """The writer publishes snapshots of new inserts; read-only workers pick them up or take over writes."""
+        from app.core.executor import stage_executor
+        while True:
+            await asyncio.sleep(settings.FAISS_RELOAD_INTERVAL_SECONDS)
+            try:
+                faiss = self.faiss
+                if not faiss.read_only:
+                    await stage_executor.run("index", faiss.publish, settings.FAISS_PUBLISH_INTERVAL_SECONDS)
+                elif self.serves("ingest") and await asyncio.to_thread(faiss.promote):
+                    await self.job_workers.start()
+                else:
+                    await asyncio.to_thread(faiss.reload)
+            except Exception:
+                logger.error("Index maintenance failed", exc_info=True)
+
+    def _load(self, names: List[str]):
+        for name in names:
+            getattr(self, name)
+
+    def _warm_up(self):
+        """Run each loaded model once so first requests do not pay for lazy kernel and allocator setup."""
+        if self.loaded("clip"):
+            self.clip.encode_texts(["warm up"])
+            if self.serves("ingest"):
+                from PIL import Image
+                self.clip.encode_images([Image.new("RGB", (224, 224))])
+        if self.loaded("whisper"):
+            self.whisper.warm_up()
+        if self.loaded("faiss"):
+            import numpy as np
+            self.faiss._search_batch(np.ones((1, self.faiss.dimension), dtype=np.float32), [1], [None])
+
+    def _get(self, name: str, create: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = create()
+                self.load_seconds[name] = time.perf_counter() - started
+                logger.info(f"Loaded {name} in {self.load_seconds[name]:.2f}s")
+            return self._instances[name]
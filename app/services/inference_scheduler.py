@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.executor import StageSaturatedError, stage_executor
+from app.core.metrics import SIZE_BUCKETS, metrics
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+batch_size_histogram = metrics.histogram(
+    "inference_batch_size", "Items per coalesced forward pass", ("kind",), buckets=SIZE_BUCKETS
+)
+queue_wait_histogram = metrics.histogram(
+    "inference_queue_wait_seconds", "Mean time requests in a batch waited to be encoded", ("kind",)
+)
+
+@dataclass
+class _Request:
+    items: List[Any]
+    future: asyncio.Future
+    enqueued_at: float
+
+@dataclass
+class _KindStats:
+    queue_depth: int = 0
+    batches: int = 0
+    items: int = 0
+    max_batch_size: int = 0
+    total_wait: float = 0.0
+    histogram: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, batch_size: int, wait: float):
+        self.batches += 1
+        self.items += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.total_wait += wait
+        bucket = next((f"<={b}" for b in BATCH_SIZE_BUCKETS if batch_size <= b), f">{BATCH_SIZE_BUCKETS[-1]}")
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "mean_queue_wait_ms": 1000 * self.total_wait / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(self.histogram),
+        }
+
+class InferenceScheduler:
+    """
+    Coalesces encode requests from concurrent callers into batched forward passes.
+
+    Each kind ("text", "image", ...) has its own queue. A worker waits for the
+    first pending request, then keeps collecting until `max_batch_size` items are
+    queued or `max_wait_ms` has elapsed, runs one encoder call over all of them and
+    resolves every caller's future with its own rows.
+    """
+
+    def __init__(
+        self,
+        encoders: Dict[str, Callable[[List[Any]], np.ndarray]],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_queue_items: Optional[int] = None
+    ):
+        self.encoders = encoders
+        self.max_batch_size = max_batch_size or settings.INFERENCE_MAX_BATCH_SIZE
+        self.max_wait = (settings.INFERENCE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.max_queue_items = max_queue_items or settings.INFERENCE_MAX_QUEUE_ITEMS
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._stats = {kind: _KindStats() for kind in encoders}
+
+    async def submit(self, kind: str, items: List[Any]) -> np.ndarray:
+        """Queue items for encoding and wait for their (len(items), dim) embeddings."""
+        if kind not in self.encoders:
+            raise ValueError(f"Unknown inference kind: {kind}")
+        if self._stats[kind].queue_depth >= self.max_queue_items:
+            raise StageSaturatedError("clip")
+        loop = asyncio.get_running_loop()
+        queue = self._ensure_worker(kind, loop)
+        request = _Request(items=list(items), future=loop.create_future(), enqueued_at=time.perf_counter())
+        self._stats[kind].queue_depth += len(request.items)
+        queue.put_nowait(request)
+        # Queue wait plus the shared forward pass, as seen by this caller
+        with metrics.span(f"inference_{kind}"):
+            return await request.future
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size statistics per request kind."""
+        return {kind: stats.as_dict() for kind, stats in self._stats.items()}
+
+    def _ensure_worker(self, kind: str, loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+        worker = self._workers.get(kind)
+        if worker is None or worker.done() or worker.get_loop() is not loop:
+            self._queues[kind] = asyncio.Queue()
+            self._stats[kind].queue_depth = 0
+            self._workers[kind] = loop.create_task(self._run(kind))
+        return self._queues[kind]
+
+    async def _collect(self, kind: str) -> List[_Request]:
+        queue = self._queues[kind]
+        batch = [await queue.get()]
+        size = len(batch[0].items)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(queue.get(), remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    async def _run(self, kind: str):
+        encoder = self.encoders[kind]
+        stats = self._stats[kind]
+        # Batches serve many requests, so their spans belong to none of them
+        metrics.detach_request_timings()
+        while True:
+            batch = await self._collect(kind)
+            items = [item for request in batch for item in request.items]
+            stats.queue_depth -= len(items)
+            started = time.perf_counter()
+            wait = sum(started - r.enqueued_at for r in batch) / len(batch)
+            stats.record(len(items), wait)
+            batch_size_histogram.observe(len(items), kind=kind)
+            queue_wait_histogram.observe(wait, kind=kind)
+            try:
+                # Forward passes run on the "clip" stage, off the event loop
+                embeddings = await stage_executor.run("clip", encoder, items)
+            except Exception as e:
+                logger.error(f"Batched {kind} inference failed for {len(items)} items", exc_info=True)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                rows = embeddings[offset:offset + len(request.items)]
+                offset += len(request.items)
+                if not request.future.done():
+                    request.future.set_result(rows)
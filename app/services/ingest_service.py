@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.executor import stage_executor
+from app.core.metrics import metrics
+from app.models.schemas import PostMetadata, PostResponse
+from app.services.clip_service import CLIPService
+from app.services.tagging_service import TaggingService
+from app.services.video_service import VideoService
+from app.services.whisper_service import WhisperService
+from app.utils.helpers import encode_embedding, file_digest, load_image_from_path, preprocess_text, text_digest
+from app.vectors.content_cache import ContentCache
+from app.vectors.faiss_client import FAISSClient
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+class IngestService:
+    """Runs the classify pipeline (frames, transcription, CLIP, index) over files on disk."""
+
+    def __init__(
+        self,
+        clip_service: CLIPService,
+        whisper_service: WhisperService,
+        video_service: VideoService,
+        faiss_client: FAISSClient,
+        content_cache: Optional[ContentCache] = None,
+        tagging_service: Optional[TaggingService] = None
+    ):
+        self.clip_service = clip_service
+        self.whisper_service = whisper_service
+        self.video_service = video_service
+        self.faiss_client = faiss_client
+        self.tagging_service = tagging_service  # None leaves tags as given
+        # Reposts of the same bytes reuse earlier embeddings and transcripts
+        self.content_cache = content_cache if content_cache is not None else ContentCache(
+            settings.CONTENT_CACHE_PATH, self.content_signatures()
+        )
+        self.duplicate_threshold = settings.DUPLICATE_THRESHOLD
+        # Check-then-add must not interleave, or concurrent reposts would both be added
+        self._add_lock = asyncio.Lock()
+
+    @staticmethod
+    def content_signatures() -> Dict[str, str]:
+        """Per-kind signature of the settings that cached embeddings and transcripts depend on."""
+        clip = f"{settings.CLIP_MODEL_NAME}|{settings.CLIP_MODEL_PRETRAINED}|{settings.CLIP_BACKEND}"
+        frames = (
+            f"{settings.FRAME_SAMPLING}|{settings.FRAME_SAMPLE_RATE}|{settings.FRAME_SCENE_THRESHOLD}|"
+            f"{settings.FRAME_BUDGET}|{settings.MAX_VIDEO_DURATION}"
+        )
+        return {
+            "image": clip,
+            "text": clip,
+            "video": f"{clip}|{frames}|{settings.WHISPER_MODEL_SIZE}|{settings.WHISPER_LANGUAGE}"
+        }
+
+    async def ingest(
+        self,
+        image_paths: List[Path],
+        video_paths: List[Path],
+        text: Optional[str] = None,
+        include_embedding: bool = True,
+        embedding_format: str = "json",
+        post_id: Optional[str] = None
+    ) -> PostResponse:
+        """
+        Embed and index one post. Returns the post's metadata and, if asked, its
+        embedding encoded as `embedding_format`.
+        If a near-identical post is already indexed, returns that post instead.
+        With `post_id`, re-embeds that existing post in place (KeyError if it is gone).
+        """
+        created_at = datetime.now(timezone.utc).isoformat()
+        if post_id is not None:
+            # Re-embedding keeps the post's original creation time
+            created_at = self.faiss_client.metadata[post_id].get("created_at") or created_at
+        embeddings = []
+
+        # Images: one embedding per file, averaged
+        if image_paths:
+            image_embeddings = await self._image_embeddings(image_paths)
+            embeddings.append(image_embeddings.mean(axis=0, keepdims=True))
+
+        # Videos: mean over every sampled frame, plus the first non-empty transcript
+        frame_sum, frame_count = None, 0
+        audio_text = None
+        for video_path in video_paths:
+            video_embedding, frames, transcript = await self._video(video_path, transcribe=not audio_text)
+            if frames:
+                weighted = video_embedding * frames
+                frame_sum = weighted if frame_sum is None else frame_sum + weighted
+                frame_count += frames
+            audio_text = audio_text or transcript
+        if frame_count:
+            embeddings.append(frame_sum / frame_count)
+
+        # Text, falling back to the transcript
+        if text or audio_text:
+            embeddings.append(await self._text_embedding(text or audio_text))
+
+        embedding = CLIPService.combine_embeddings(embeddings)
+
+        metadata = PostMetadata(
+            text=text,
+            audio_text=audio_text,
+            has_image=bool(image_paths),
+            has_video=bool(video_paths),
+            created_at=created_at
+        )
+        if self.tagging_service:
+            # On the "clip" stage: a changed vocabulary re-encodes its new labels before tagging
+            tag_scores = await stage_executor.run("clip", self.tagging_service.tag, embedding)
+            metadata = PostMetadata(**TaggingService.apply(metadata.model_dump(), tag_scores))
+        if post_id is not None:
+            await self.faiss_client.update_post(post_id, embedding, metadata.model_dump())
+            return PostResponse(
+                post_id=post_id,
+                metadata=metadata,
+                **self._embedding_fields(embedding, include_embedding, embedding_format)
+            )
+
+        async with self._add_lock:
+            with metrics.span("duplicate_check"):
+                duplicate = await self._find_duplicate(embedding)
+            if duplicate:
+                logger.info(f"Upload duplicates post {duplicate['id']} (score {duplicate['score']:.4f})")
+                return PostResponse(
+                    post_id=duplicate["id"],
+                    metadata=duplicate["metadata"],
+                    duplicate=True,
+                    **self._embedding_fields(embedding, include_embedding, embedding_format)
+                )
+
+            # Store in FAISS
+            post_id = await self.faiss_client.add_post(embedding, metadata.model_dump())
+
+        return PostResponse(
+            post_id=post_id,
+            metadata=metadata,
+            **self._embedding_fields(embedding, include_embedding, embedding_format)
+        )
+
+    @staticmethod
+    def _embedding_fields(embedding: np.ndarray, include: bool, embedding_format: str) -> Dict[str, Any]:
+        if not include:
+            return {}
+        with metrics.span("embedding_encode"):
+            return {"embedding": encode_embedding(embedding, embedding_format), "embedding_format": embedding_format}
+
+    async def run_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Job queue handler: ingest the files saved with a background classify request,
+        or re-tag the corpus for a {"kind": "retag"} job.
+        """
+        if payload.get("kind") == "retag":
+            # One pass over the corpus in a worker thread; the job queue runs at most JOB_WORKERS at a time
+            return await asyncio.to_thread(self.tagging_service.retag, self.faiss_client)
+        response = await self.ingest(
+            [Path(path) for path in payload.get("images", [])],
+            [Path(path) for path in payload.get("videos", [])],
+            payload.get("text"),
+            payload.get("include_embedding", True),
+            payload.get("embedding_format", "json"),
+            payload.get("post_id")
+        )
+        return response.model_dump()
+
+    async def _image_embeddings(self, image_paths: List[Path]) -> np.ndarray:
+        """Per-image embeddings; only images not seen before go through CLIP."""
+        # Hashing and decoding block, so they run on the "decode" stage pool
+        with metrics.span("content_hash"):
+            digests = await stage_executor.run("decode", lambda: [file_digest(path) for path in image_paths])
+        cached = [self.content_cache.get("image", digest) for digest in digests]
+        missing = [i for i, hit in enumerate(cached) if hit is None]
+
+        embeddings = [hit["embedding"] if hit else None for hit in cached]
+        if missing:
+            images = await stage_executor.run("decode", lambda: [load_image_from_path(image_paths[i]) for i in missing])
+            encoded = await self.clip_service.encode_images_async(images)
+            for i, vector in zip(missing, encoded):
+                embeddings[i] = vector[None, :]
+                self.content_cache.put("image", digests[i], vector)
+        return np.vstack(embeddings)
+
+    async def _video(self, video_path: Path, transcribe: bool) -> Tuple[Optional[np.ndarray], int, Optional[str]]:
+        """Mean frame embedding, sampled frame count and transcript of one video file."""
+        # Hash on the "video" stage; a 500 MB file takes a moment to read back
+        with metrics.span("content_hash"):
+            digest = await stage_executor.run("video", file_digest, video_path)
+        cached = self.content_cache.get("video", digest)
+        if cached and (cached["transcript"] is not None or not transcribe):
+            return cached["embedding"], cached["frames"], cached["transcript"]
+
+        if cached:
+            # Frames are known, only the transcript was never computed
+            embedding, frames = cached["embedding"], cached["frames"]
+            transcript = await self.whisper_service.transcribe(video_path)
+        else:
+            # Decode frames and transcribe audio concurrently
+            if transcribe:
+                frame_images, transcript = await asyncio.gather(
+                    self.video_service.extract_frames(video_path),
+                    self.whisper_service.transcribe(video_path)
+                )
+            else:
+                frame_images, transcript = await self.video_service.extract_frames(video_path), None
+            frames = len(frame_images)
+            embedding = None
+            if frame_images:
+                embedding = (await self.clip_service.encode_images_async(frame_images)).mean(axis=0, keepdims=True)
+
+        self.content_cache.put("video", digest, embedding, frames, transcript)
+        return embedding, frames, transcript
+
+    async def _text_embedding(self, text: str) -> np.ndarray:
+        digest = text_digest(preprocess_text(text))
+        cached = self.content_cache.get("text", digest)
+        if cached:
+            return cached["embedding"]
+        embedding = await self.clip_service.generate_text_embedding(text)
+        self.content_cache.put("text", digest, embedding)
+        return embedding
+
+    async def _find_duplicate(self, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """The closest indexed post if it is at least `duplicate_threshold` similar."""
+        if self.duplicate_threshold > 1.0 or self.faiss_client.index.ntotal == 0:
+            return None
+        results = await self.faiss_client.search(embedding, limit=1)
+        if results and results[0]["score"] >= self.duplicate_threshold:
+            return results[0]
+        return None
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, available_at);
+"""
+
+class JobQueue:
+    """
+    Durable local job queue backed by SQLite.
+
+    Jobs move queued -> running -> succeeded, or back to queued with a delay
+    until they run out of attempts and are marked failed. Jobs left running by
+    a crashed process are put back in the queue by `recover()`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def enqueue(self, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, payload, available_at, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), now, now, now)
+            )
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest job that is ready to run."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                    "ORDER BY available_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (now, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        self._update(job_id, status="succeeded", result=json.dumps(result), error=None)
+
+    def fail(self, job_id: str, error: str, retry_in: Optional[float] = None):
+        """Mark a job failed, or requeue it after `retry_in` seconds."""
+        if retry_in is None:
+            self._update(job_id, status="failed", error=error)
+        else:
+            self._update(job_id, status="queued", error=error, available_at=time.time() + retry_in)
+
+    def recover(self) -> int:
+        """Requeue jobs that were running when the process died."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (time.time(),)
+            )
+        return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, payload, result, error, attempts, created_at, updated_at "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, payload, result, error, attempts, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "payload": json.loads(payload),
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+class JobWorkerPool:
+    """Asyncio workers that pull jobs from a JobQueue and run them with retries."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        workers: Optional[int] = None
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers or settings.JOB_WORKERS
+        self.max_attempts = settings.JOB_MAX_ATTEMPTS
+        self.retry_backoff = settings.JOB_RETRY_BACKOFF_SECONDS
+        self.poll_interval = settings.JOB_POLL_INTERVAL_SECONDS
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        recovered = await asyncio.to_thread(self.queue.recover)
+        if recovered:
+            logger.info(f"Requeued {recovered} jobs interrupted by a previous shutdown")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a new job was enqueued."""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self, worker: int):
+        while True:
+            try:
+                # SQLite calls may wait on another process's write lock, so they stay off the event loop
+                job = await asyncio.to_thread(self.queue.claim)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(worker, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. "database is locked"; the worker must outlive it
+                logger.error(f"Worker {worker} hit a job queue error; retrying", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, worker: int, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        logger.info(f"Worker {worker} running job {job_id} (attempt {job['attempts']})")
+        try:
+            result = await self.handler(job["payload"])
+        except asyncio.CancelledError:
+            # Left as running; recover() requeues it on the next start
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed on attempt {job['attempts']}", exc_info=True)
+            if job["attempts"] < self.max_attempts:
+                await asyncio.to_thread(
+                    self.queue.fail, job_id, str(e), self.retry_backoff * 2 ** (job["attempts"] - 1)
+                )
+            else:
+                await asyncio.to_thread(self.queue.fail, job_id, str(e))
+                await asyncio.to_thread(self._cleanup, job)
+            return
+
+        await asyncio.to_thread(self.queue.complete, job_id, result)
+        await asyncio.to_thread(self._cleanup, job)
+
+    @staticmethod
+    def _cleanup(job: Dict[str, Any]):
+        files_dir = job["payload"].get("files_dir")
+        if files_dir:
+            shutil.rmtree(files_dir, ignore_errors=True)
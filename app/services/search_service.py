@@ -0,0 +1,113 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.clip_service import CLIPService
+from app.utils.cache import LRUCache
+from app.utils.helpers import preprocess_text
+from app.vectors.faiss_client import FAISSClient
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+SearchRequest = Tuple[str, int, Optional[Dict[str, Any]]]
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int) -> List[Dict]:
+    """
+    Merge ranked result lists by summing 1 / (k + rank) per post.
+    Ranks rather than raw scores are fused, since cosine and BM25 scores are not comparable.
+    """
+    fused: Dict[str, Dict] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result['id'], {**result, 'score': 0.0})
+            entry['score'] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result['score'], reverse=True)
+
+class SearchService:
+    """
+    Text-to-post search with a top-k result cache.
+
+    Cache keys include the index generation, which FAISSClient bumps on every
+    change, so results cached before an insert are never served after it.
+
+    Besides CLIP vector search, queries can run as BM25 keyword search over
+    captions and transcripts ("lexical"), or both fused by reciprocal rank
+    ("hybrid"), which finds exact hashtags, handles and rare words that the
+    embedding blurs.
+    """
+
+    def __init__(self, clip_service: CLIPService, faiss_client: FAISSClient):
+        self.clip_service = clip_service
+        self.faiss_client = faiss_client
+        self.result_cache = LRUCache(
+            max_items=settings.SEARCH_RESULT_CACHE_SIZE,
+            ttl=settings.SEARCH_RESULT_CACHE_TTL
+        )
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = "vector"
+    ) -> List[Dict]:
+        """Search posts for one text query in one of SEARCH_MODES."""
+        if mode == "vector":
+            return (await self.search_batch([(query, limit, filters)]))[0]
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'; expected one of {', '.join(SEARCH_MODES)}")
+
+        key = self._cache_key(self.faiss_client.generation, query, limit, filters) + (mode,)
+        results = self.result_cache.get(key)
+        if results is None:
+            if mode == "lexical":
+                results = await self.faiss_client.lexical_search(query, limit, filters)
+            else:
+                results = await self._hybrid_search(query, limit, filters)
+            self.result_cache.put(key, results)
+        return results
+
+    async def search_batch(self, requests: List[SearchRequest]) -> List[List[Dict]]:
+        """Search many (query, limit, filters) requests; cache misses share one encode and index pass."""
+        generation = self.faiss_client.generation
+        keys = [self._cache_key(generation, *request) for request in requests]
+        results: List[Optional[List[Dict]]] = [self.result_cache.get(key) for key in keys]
+
+        misses = [i for i, cached in enumerate(results) if cached is None]
+        if misses:
+            query_embeddings = await self.clip_service.generate_text_embeddings(
+                [requests[i][0] for i in misses]
+            )
+            found = await self.faiss_client.search_batch(
+                query_embeddings,
+                [requests[i][1] for i in misses],
+                [requests[i][2] for i in misses]
+            )
+            for i, query_results in zip(misses, found):
+                results[i] = query_results
+                self.result_cache.put(keys[i], query_results)
+
+        return results
+
+    async def _hybrid_search(self, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> List[Dict]:
+        candidates = limit * settings.SEARCH_HYBRID_CANDIDATES
+        query_embedding = await self.clip_service.generate_text_embedding(query)
+        vector_results, lexical_results = await asyncio.gather(
+            self.faiss_client.search(query_embedding, candidates, filters),
+            self.faiss_client.lexical_search(query, candidates, filters)
+        )
+        return reciprocal_rank_fusion([vector_results, lexical_results], settings.SEARCH_RRF_K)[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the query-embedding and result caches."""
+        return {
+            "text_embeddings": self.clip_service.text_cache.stats(),
+            "search_results": self.result_cache.stats()
+        }
+
+    @staticmethod
+    def _cache_key(generation: int, query: str, limit: int, filters: Optional[Dict[str, Any]]) -> Tuple:
+        return (generation, preprocess_text(query), limit, json.dumps(filters or {}, sort_keys=True))
@@ -0,0 +1,217 @@
+import io
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# Used until a vocabulary file is written; one label per line in TAG_VOCABULARY_PATH replaces it
+DEFAULT_LABELS = [
+    "animals", "architecture", "art", "baby", "beach", "beauty", "birthday", "books", "cars", "cats",
+    "celebration", "city", "coffee", "comedy", "concert", "cooking", "dance", "dogs", "drinks", "education",
+    "fashion", "fitness", "flowers", "food", "football", "friends", "gaming", "gardening", "hiking", "holiday",
+    "home decor", "landscape", "makeup", "meme", "mountains", "music", "nature", "news", "night", "ocean",
+    "party", "pets", "photography", "politics", "restaurant", "science", "selfie", "shopping", "snow", "sports",
+    "sunset", "technology", "travel", "tutorial", "vlog", "wedding", "wildlife", "winter", "workout", "yoga"
+]
+LABEL_ENCODE_BATCH = 256  # Prompts per text-encoder pass when embedding new labels
+
+class TaggingService:
+    """
+    Zero-shot post tagging against a vocabulary of text labels.
+
+    Each label is embedded once, as the normalized mean of its prompt-template
+    embeddings, and kept as rows of one (labels, dim) matrix. Tagging a post (or
+    a batch of posts) is then a single matrix product plus a top-k. Label
+    embeddings are cached on disk keyed by model and templates, so restarts and
+    vocabulary additions only encode labels not seen before.
+    """
+
+    def __init__(self, clip_service, vocabulary_path: Optional[Path] = None, cache_path: Optional[Path] = None):
+        self.clip_service = clip_service
+        self.vocabulary_path = Path(vocabulary_path or settings.TAG_VOCABULARY_PATH)
+        self.cache_path = Path(cache_path or settings.TAG_EMBEDDINGS_PATH)
+        self.templates = list(settings.TAG_PROMPT_TEMPLATES)
+        self.threshold = settings.TAG_THRESHOLD
+        self.top_k = settings.TAG_TOP_K
+        # Cache entries from another model or template set are never reused
+        self.signature = f"{settings.CLIP_MODEL_NAME}|{settings.CLIP_MODEL_PRETRAINED}|{'|'.join(self.templates)}"
+        self._lock = threading.Lock()
+        self._retag_lock = threading.Lock()
+        self._vocabulary_id: Optional[Tuple[int, int]] = None
+        self.last_retag: Optional[Dict[str, Any]] = None
+        # Swapped as one tuple so taggers never see labels and rows out of step
+        self._vocabulary: Tuple[List[str], np.ndarray] = ([], np.zeros((0, settings.VECTOR_DIMENSION), dtype=np.float32))
+        self._refresh()
+
+    @property
+    def labels(self) -> List[str]:
+        return self._vocabulary[0]
+
+    def tag(self, embedding: np.ndarray) -> Dict[str, float]:
+        """Top labels of one post embedding scoring at least TAG_THRESHOLD, best first."""
+        return self.tag_many(embedding.reshape(1, -1))[0]
+
+    def tag_many(self, embeddings: np.ndarray) -> List[Dict[str, float]]:
+        """Tag (N, dim) post embeddings with one matrix product; one {label: score} dict per row."""
+        self._refresh()
+        labels, matrix = self._vocabulary
+        if not labels or self.top_k <= 0:
+            return [{} for _ in range(len(embeddings))]
+        with metrics.span("tagging"):
+            scores = np.asarray(embeddings, dtype=np.float32) @ matrix.T
+            k = min(self.top_k, len(labels))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            tagged = []
+            for row, candidates in zip(scores, top):
+                candidates = candidates[np.argsort(-row[candidates])]
+                tagged.append({
+                    labels[i]: round(float(row[i]), 4) for i in candidates if row[i] >= self.threshold
+                })
+            return tagged
+
+    @staticmethod
+    def apply(metadata: Dict[str, Any], tag_scores: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Metadata with its predicted tags replaced by `tag_scores`. Tags that were
+        not predicted (from the uploader or a data import) are kept.
+        """
+        previous = set(metadata.get("tag_scores") or {})
+        own = [tag for tag in metadata.get("tags") or [] if tag not in previous]
+        return {
+            **metadata,
+            "tags": own + [tag for tag in tag_scores if tag not in own],
+            "tag_scores": tag_scores
+        }
+
+    def add_labels(self, labels: List[str]) -> List[str]:
+        """Add labels to the vocabulary file, encoding only the new ones; returns those added."""
+        with self._lock:
+            current = self._read_vocabulary()
+            known = set(current)
+            added = list(dict.fromkeys(label.strip() for label in labels if label.strip() and label.strip() not in known))
+            if added:
+                self._load(current + added)
+                self.vocabulary_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.vocabulary_path.with_name(self.vocabulary_path.name + ".tmp")
+                tmp.write_text("\n".join(current + added) + "\n")
+                os.replace(tmp, self.vocabulary_path)
+                self._vocabulary_id = self._file_id(self.vocabulary_path)
+                logger.info(f"Added {len(added)} tag labels ({len(current) + len(added)} total)")
+            return added
+
+    def retag(self, faiss_client, batch_size: int = 4096) -> Dict[str, Any]:
+        """Re-tag every indexed post with the current vocabulary, reading exact vectors in batches."""
+        with self._retag_lock:
+            started = time.perf_counter()
+            total, changed = len(faiss_client.vectors), 0
+            for start in range(0, total, batch_size):
+                count = min(batch_size, total - start)
+                found = faiss_client.metadata.get_by_rows(range(start, start + count))
+                if not found:
+                    continue
+                tagged = self.tag_many(faiss_client.vectors.read_range(start, count))
+                updates = {}
+                for row, (post_id, metadata) in found.items():
+                    updated = self.apply(metadata, tagged[row - start])
+                    if updated != metadata:
+                        updates[row] = (post_id, updated)
+                faiss_client.update_metadata(updates)
+                changed += len(updates)
+            self.last_retag = {
+                "posts": len(faiss_client.metadata),
+                "changed": changed,
+                "labels": len(self.labels),
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+            logger.info(f"Re-tagged posts: {self.last_retag}")
+            return self.last_retag
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "labels": len(self.labels),
+            "templates": self.templates,
+            "threshold": self.threshold,
+            "top_k": self.top_k,
+            "vocabulary_path": str(self.vocabulary_path),
+            "last_retag": self.last_retag
+        }
+
+    def _refresh(self):
+        """(Re)build the label matrix when the vocabulary file changed, e.g. from another worker."""
+        file_id = self._file_id(self.vocabulary_path)
+        if file_id == self._vocabulary_id and self.labels:
+            return
+        with self._lock:
+            if file_id != self._vocabulary_id or not self.labels:
+                self._load(self._read_vocabulary())
+                self._vocabulary_id = file_id
+
+    def _load(self, labels: List[str]):
+        cached = self._read_cache()
+        missing = [label for label in labels if label not in cached]
+        if missing:
+            started = time.perf_counter()
+            cached.update(zip(missing, self._encode_labels(missing)))
+            self._write_cache(cached)
+            logger.info(f"Encoded {len(missing)} tag labels in {time.perf_counter() - started:.2f}s")
+        matrix = np.vstack([cached[label] for label in labels]) if labels else self._vocabulary[1][:0]
+        self._vocabulary = (list(labels), matrix.astype(np.float32))
+
+    def _encode_labels(self, labels: List[str]) -> np.ndarray:
+        """Normalized mean of each label's normalized prompt embeddings."""
+        prompts = [template.format(label) for label in labels for template in self.templates]
+        encoded = np.vstack([
+            self.clip_service.encode_texts(prompts[start:start + LABEL_ENCODE_BATCH])
+            for start in range(0, len(prompts), LABEL_ENCODE_BATCH)
+        ]).astype(np.float32)
+        encoded /= np.linalg.norm(encoded, axis=1, keepdims=True)
+        means = encoded.reshape(len(labels), len(self.templates), -1).mean(axis=1)
+        return means / np.linalg.norm(means, axis=1, keepdims=True)
+
+    def _read_vocabulary(self) -> List[str]:
+        if not self.vocabulary_path.exists():
+            return list(DEFAULT_LABELS)
+        lines = (line.strip() for line in self.vocabulary_path.read_text().splitlines())
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+    def _read_cache(self) -> Dict[str, np.ndarray]:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with np.load(self.cache_path) as data:
+                if str(data["signature"]) != self.signature:
+                    logger.info("Tag label cache is for another model or templates; re-encoding labels")
+                    return {}
+                return dict(zip(data["labels"].tolist(), data["embeddings"]))
+        except Exception:
+            logger.warning(f"Ignoring unreadable tag label cache {self.cache_path}", exc_info=True)
+            return {}
+
+    def _write_cache(self, cached: Dict[str, np.ndarray]):
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            signature=np.array(self.signature),
+            labels=np.array(list(cached), dtype=str),
+            embeddings=np.vstack(list(cached.values())).astype(np.float32)
+        )
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        tmp.write_bytes(buffer.getvalue())
+        os.replace(tmp, self.cache_path)
+
+    @staticmethod
+    def _file_id(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
@@ -1,59 +1,96 @@
 import cv2
 import numpy as np
 from PIL import Image
-import tempfile
 from pathlib import Path
 from typing import List
-from fastapi import UploadFile
 from app.core.config import settings
+from app.core.executor import stage_executor
+from app.core.metrics import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+frames_histogram = metrics.histogram(
+    "video_frames_per_video", "Sampled frames kept per video", buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+
+FRAME_SAMPLING_MODES = ("adaptive", "fixed")
+SIGNATURE_SIZE = 64  # Frames are shrunk to this square before their colour histogram is taken
+HISTOGRAM_BINS = [8, 4, 4]  # Hue, saturation, value
+
 class VideoService:
+    """
+    Samples frames from videos for CLIP.
+
+    In adaptive mode a sampled frame is kept only when its colour histogram
+    differs from the last kept frame by at least FRAME_SCENE_THRESHOLD, so
+    each kept frame starts a new scene and static shots cost one frame.
+    When a video has more scenes than FRAME_BUDGET, frames are chosen evenly
+    across them.
+    """
+
     def __init__(self):
         self.frame_rate = settings.FRAME_SAMPLE_RATE
         self.max_duration = settings.MAX_VIDEO_DURATION
+        self.sampling = settings.FRAME_SAMPLING
+        if self.sampling not in FRAME_SAMPLING_MODES:
+            raise ValueError(f"Unknown FRAME_SAMPLING '{self.sampling}'; expected one of {', '.join(FRAME_SAMPLING_MODES)}")
+        self.scene_threshold = settings.FRAME_SCENE_THRESHOLD
+        self.frame_budget = settings.FRAME_BUDGET
 
-    async def extract_frames(self, video_file: UploadFile) -> List[Image.Image]:
+    async def extract_frames(self, video_path: Path) -> List[Image.Image]:
         """
         Extract frames from video at specified intervals.
         Returns a list of PIL Images.
         """
-        logger.info(f"Starting frame extraction from video: {video_file.filename}")
-        # Save video to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_video:
-            content = await video_file.read()
-            temp_video.write(content)
-            temp_video_path = temp_video.name
+        logger.info(f"Starting frame extraction from video: {video_path.name}")
+        # Decoding blocks, so it runs on the "video" stage pool
+        return await stage_executor.run("video", self.read_frames, video_path)
 
-        try:
-            # Open video file
-            cap = cv2.VideoCapture(temp_video_path)
-            if not cap.isOpened():
-                raise ValueError("Could not open video file")
+    def read_frames(self, video_path: Path) -> List[Image.Image]:
+        """
+        Decode sampled frames in a single sequential pass.
+        Every frame is grabbed, but only sampled ones are retrieved and converted,
+        which avoids a keyframe seek per sample.
+        """
+        with metrics.span("frame_decode"):
+            frames = self._read_frames(video_path)
+        frames_histogram.observe(len(frames))
+        return frames
+
+    def _read_frames(self, video_path: Path) -> List[Image.Image]:
+        # Open video file
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            raise ValueError("Could not open video file")
 
+        try:
             # Get video properties
             fps = cap.get(cv2.CAP_PROP_FPS)
             if fps == 0:
                 raise ValueError("Invalid video: FPS is zero")
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = total_frames / fps
 
             # Limit duration
-            if duration > self.max_duration:
-                total_frames = int(self.max_duration * fps)
+            max_frames = int(self.max_duration * fps)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if total_frames > 0:
+                max_frames = min(max_frames, total_frames)
 
             # Calculate frame interval
-            frame_interval = int(fps / self.frame_rate)
+            frame_interval = max(1, int(fps / self.frame_rate))
+            adaptive = self.sampling == "adaptive"
             frames = []
-            skipped = 0
+            skipped = repeated = 0
+            last_signature = None
 
             # Extract frames
-            for frame_idx in range(0, total_frames, frame_interval):
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
+            for frame_idx in range(max_frames):
+                if not cap.grab():
+                    break
+                if frame_idx % frame_interval:
+                    continue
+                ret, frame = cap.retrieve()
                 if not ret:
                     break
 
@@ -62,13 +99,48 @@ class VideoService:
                 if np.std(frame_rgb) < 5:
                     skipped += 1
                     continue
+                if adaptive:
+                    signature = self.frame_signature(frame)
+                    if last_signature is not None and \
+                            self.signature_distance(signature, last_signature) < self.scene_threshold:
+                        repeated += 1
+                        continue
+                    last_signature = signature
                 pil_image = Image.fromarray(frame_rgb)
                 frames.append(pil_image)
 
-            cap.release()
-            logger.info(f"Extracted {len(frames)} frames, skipped {skipped} low-variation frames.")
+            if adaptive:
+                scenes = len(frames)
+                frames = self.spread(frames, self.frame_budget)
+                logger.info(
+                    f"Extracted {len(frames)} frames from {scenes} scenes, skipped {skipped} low-variation "
+                    f"and {repeated} repeated frames."
+                )
+            else:
+                logger.info(f"Extracted {len(frames)} frames, skipped {skipped} low-variation frames.")
             return frames
 
         finally:
-            # Clean up temporary file
-            Path(temp_video_path).unlink(missing_ok=True)
\ No newline at end of file
+            cap.release()
+
+    @staticmethod
+    def frame_signature(frame: np.ndarray) -> np.ndarray:
+        """Normalized HSV colour histogram of a downscaled BGR frame; cheap and insensitive to small motion."""
+        small = cv2.resize(frame, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1, 2], None, HISTOGRAM_BINS, [0, 180, 0, 256, 0, 256]).ravel()
+        return histogram / histogram.sum()
+
+    @staticmethod
+    def signature_distance(a: np.ndarray, b: np.ndarray) -> float:
+        """Share of pixels whose colour bin changed between two signatures, from 0 to 1."""
+        return 0.5 * float(np.abs(a - b).sum())
+
+    @staticmethod
+    def spread(frames: List[Image.Image], budget: int) -> List[Image.Image]:
+        """At most `budget` frames, evenly spaced across the input and always including the first and last."""
+        if budget <= 0 or len(frames) <= budget:
+            return frames
+        if budget == 1:
+            return frames[:1]
+        return [frames[i] for i in np.linspace(0, len(frames) - 1, budget).round().astype(int)]
@@ -1,39 +1,148 @@
+import copy
 import logging
+import queue
+import subprocess
+import numpy as np
 import whisper
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from fastapi import UploadFile
+from typing import Optional
 from app.core.config import settings
+from app.core.executor import stage_executor
+from app.core.metrics import metrics
+from app.utils.audio import SAMPLE_RATE, chunk_segments, join_spans, speech_segments
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+audio_seconds = metrics.counter(
+    "whisper_audio_seconds_total", "Seconds of audio received and of detected speech transcribed", ("kind",)
+)
+
 class WhisperService:
     def __init__(self):
         self.model = whisper.load_model(settings.WHISPER_MODEL_SIZE)
         self.device = settings.DEVICE
+        self.language = settings.WHISPER_LANGUAGE
+        self.max_samples = settings.MAX_VIDEO_DURATION * SAMPLE_RATE
+        self.chunk_samples = int(settings.WHISPER_CHUNK_SECONDS * SAMPLE_RATE)
+
+        # Whisper installs decoding hooks on the model per call, so each
+        # parallel worker gets its own replica instead of sharing one
+        self._replicas: "queue.Queue[whisper.Whisper]" = queue.Queue()
+        self._replicas.put(self.model)
+        for _ in range(settings.WHISPER_WORKERS - 1):
+            self._replicas.put(copy.deepcopy(self.model))
+        self._chunk_pool = ThreadPoolExecutor(
+            max_workers=settings.WHISPER_WORKERS,
+            thread_name_prefix="whisper-chunk"
+        )
+
+    def warm_up(self):
+        """Run the encoder once on a second of silence so the first real file skips kernel setup."""
+        model = self._replicas.get()
+        try:
+            mel = whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(np.zeros(SAMPLE_RATE, dtype=np.float32)), n_mels=model.dims.n_mels
+            ).to(model.device)
+            model.embed_audio(mel.unsqueeze(0))
+        finally:
+            self._replicas.put(model)
 
-    async def transcribe(self, video_file: UploadFile) -> str:
+    async def transcribe(self, video_path: Path) -> str:
         """
         Extract audio from video and transcribe it using Whisper.
         Returns the transcribed text.
         """
-        logger.info(f"Received video file for transcription: {video_file.filename}")
-        # Save video to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_video:
-            content = await video_file.read()
-            temp_video.write(content)
-            temp_video_path = temp_video.name
+        logger.info(f"Received video file for transcription: {video_path.name}")
+        # Demux once with ffmpeg on the "video" stage, so the Whisper worker only does inference
+        audio = await stage_executor.run("video", self.load_audio, video_path)
+        return await stage_executor.run("whisper", self.transcribe_audio, audio)
+
+    def load_audio(self, video_path: Path) -> np.ndarray:
+        """
+        Demux and resample the audio track to 16 kHz mono float32 PCM.
+        Like `whisper.load_audio`, but ffmpeg stops reading at MAX_VIDEO_DURATION,
+        so long files cost no more decode time or memory than the part transcribed.
+        A video without an audio track gives an empty array, which transcribes to "".
+        """
+        command = [
+            "ffmpeg", "-nostdin", "-threads", "0",
+            "-t", str(self.max_samples / SAMPLE_RATE), "-i", str(video_path), "-map", "0:a:0?",
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"
+        ]
+        with metrics.span("audio_demux"):
+            try:
+                out = subprocess.run(command, capture_output=True, check=True).stdout
+            except subprocess.CalledProcessError as e:
+                stderr = e.stderr.decode(errors="replace")
+                if "does not contain any stream" in stderr:
+                    return np.zeros(0, dtype=np.float32)
+                raise RuntimeError(f"Failed to load audio: {stderr}") from e
+            return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
 
+    def transcribe_audio(self, audio: np.ndarray) -> str:
+        """
+        Transcribe a 16 kHz mono PCM array.
+        Audio past MAX_VIDEO_DURATION and silent regions are dropped; the remaining
+        speech is cut into chunks that are transcribed in parallel and joined in order.
+        """
+        with metrics.span("transcription"):
+            return self._transcribe_audio(audio)
+
+    def _transcribe_audio(self, audio: np.ndarray) -> str:
+        audio = audio[:self.max_samples]
+        segments = speech_segments(
+            audio,
+            threshold_db=settings.WHISPER_VAD_THRESHOLD_DB,
+            min_silence_ms=settings.WHISPER_VAD_MIN_SILENCE_MS,
+            padding_ms=settings.WHISPER_VAD_PADDING_MS
+        )
+        chunks = chunk_segments(segments, self.chunk_samples)
+        speech = sum(end - start for start, end in segments)
+        audio_seconds.inc(len(audio) / SAMPLE_RATE, kind="audio")
+        audio_seconds.inc(speech / SAMPLE_RATE, kind="speech")
+        logger.info(
+            f"Transcribing {speech / SAMPLE_RATE:.1f}s of speech out of {len(audio) / SAMPLE_RATE:.1f}s "
+            f"in {len(chunks)} chunks"
+        )
+        if not chunks:
+            return ""
+
+        language = self.language or self._detect_language(join_spans(audio, chunks[0]))
+        texts = self._chunk_pool.map(
+            lambda spans: self._transcribe_chunk(join_spans(audio, spans), language),
+            chunks
+        )
+        text = " ".join(t for t in texts if t)
+        logger.info(f"Transcription result (preview): {text[:100]}...")
+        return text
+
+    def _transcribe_chunk(self, audio: np.ndarray, language: Optional[str]) -> str:
+        model = self._replicas.get()
         try:
-            # Transcribe audio
-            result = self.model.transcribe(
-                temp_video_path,
-                language="en",  # Can be made configurable
-                fp16=False if self.device == "cpu" else True
+            result = model.transcribe(
+                audio,
+                language=language,
+                fp16=False if self.device == "cpu" else True,
+                condition_on_previous_text=False
             )
-            logger.info(f"Transcription result (preview): {result['text'][:100]}...")
-            return result["text"].strip()
         finally:
-            # Clean up temporary file
-            Path(temp_video_path).unlink(missing_ok=True) 
\ No newline at end of file
+            self._replicas.put(model)
+        return result["text"].strip()
+
+    def _detect_language(self, audio: np.ndarray) -> str:
+        """Detect the spoken language once per file, from its first speech chunk."""
+        if not self.model.is_multilingual:
+            return "en"
+        model = self._replicas.get()
+        try:
+            mel = whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(audio), n_mels=model.dims.n_mels
+            ).to(model.device)
+            _, probs = model.detect_language(mel)
+        finally:
+            self._replicas.put(model)
+        language = max(probs, key=probs.get)
+        logger.info(f"Detected language: {language}")
+        return language
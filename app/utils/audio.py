@@ -0,0 +1,76 @@
+import numpy as np
+from typing import List, Tuple
+
+SAMPLE_RATE = 16000  # Whisper's expected input rate
+
+Span = Tuple[int, int]
+
+def speech_segments(
+    audio: np.ndarray,
+    threshold_db: float,
+    frame_ms: int = 30,
+    min_silence_ms: int = 500,
+    padding_ms: int = 200,
+    sample_rate: int = SAMPLE_RATE
+) -> List[Span]:
+    """
+    Find regions of a mono PCM signal whose frame energy is above `threshold_db` (dBFS).
+    Gaps shorter than `min_silence_ms` are bridged and every region is padded.
+    Returns (start, end) sample offsets.
+    """
+    frame = max(1, sample_rate * frame_ms // 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    voiced = 20 * np.log10(rms + 1e-10) > threshold_db
+
+    # Rising/falling edges of the voiced mask give frame-level runs
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2], edges[1::2]))
+
+    max_gap = min_silence_ms // frame_ms
+    merged: List[List[int]] = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    # Pad in samples, then coalesce regions the padding made overlap
+    padding = sample_rate * padding_ms // 1000
+    spans: List[Span] = []
+    for start, end in merged:
+        start, end = max(0, start * frame - padding), min(len(audio), end * frame + padding)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+def chunk_segments(segments: List[Span], max_samples: int) -> List[List[Span]]:
+    """
+    Pack speech segments into chunks of at most `max_samples` speech samples.
+    A chunk lists the spans to concatenate, so the silence between them is never transcribed.
+    Segments share a chunk while they fit; long segments are split.
+    """
+    chunks: List[List[Span]] = []
+    used = max_samples  # Samples in the last chunk; full until there is one
+    for start, end in segments:
+        while end - start > max_samples:
+            chunks.append([(start, start + max_samples)])
+            start += max_samples
+            used = max_samples
+        if used + end - start <= max_samples:
+            chunks[-1].append((start, end))
+            used += end - start
+        else:
+            chunks.append([(start, end)])
+            used = end - start
+    return chunks
+
+def join_spans(audio: np.ndarray, spans: List[Span]) -> np.ndarray:
+    """Concatenate the given (start, end) regions of a signal."""
+    return np.concatenate([audio[start:end] for start, end in spans])
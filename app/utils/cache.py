@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional TTL and memory bound.
+
+    Entries expire `ttl` seconds after insertion. When either `max_items` or
+    `max_bytes` (as measured by `size_of`) is exceeded, the least recently used
+    entries are evicted. Hit and miss counters are kept for reporting.
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        size_of: Callable[[Any], int] = lambda value: 0
+    ):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_items <= 0:
+            return
+        size = self.size_of(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_items
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
@@ -1,14 +1,93 @@
 from PIL import Image
+import base64
+import hashlib
 import io
+import tempfile
+from pathlib import Path
 from fastapi import UploadFile
 import numpy as np
-from typing import List
+from typing import List, Optional, Union
+
+# How PostResponse.embedding is encoded: a JSON float list, base64 of little-endian
+# float16 bytes (1/8 the size, ~3 significant digits), or base64 of a float32 .npy file
+EMBEDDING_FORMATS = ("json", "float16", "npy")
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size cap."""
 
 async def load_image_from_upload(file: UploadFile) -> Image.Image:
     """Load an image from an uploaded file."""
     content = await file.read()
     return Image.open(io.BytesIO(content))
 
+def load_image_from_path(path: Path) -> Image.Image:
+    """Load an image from disk fully, so the file can be removed afterwards."""
+    with Image.open(path) as img:
+        img.load()
+        return img
+
+async def save_upload_to_temp(
+    file: UploadFile,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024,
+    directory: Optional[Path] = None
+) -> Path:
+    """
+    Stream an upload to a temporary file in fixed-size chunks.
+    The caller owns the returned path and must delete it.
+    """
+    suffix = Path(file.filename or "").suffix or ".bin"
+    written = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=directory, delete=False) as temp_file:
+        temp_path = Path(temp_file.name)
+        try:
+            while chunk := await file.read(chunk_size):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLargeError(f"Upload {file.filename} exceeds {max_bytes} bytes")
+                temp_file.write(chunk)
+        except BaseException:
+            temp_file.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+    return temp_path
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def text_digest(text: str) -> str:
+    """SHA-256 of a string's UTF-8 bytes."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode_embedding(embedding: np.ndarray, embedding_format: str = "json") -> Union[List[float], str]:
+    """Encode a (dim,) or (1, dim) embedding for a response in one of EMBEDDING_FORMATS."""
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    if embedding_format == "json":
+        return vector.tolist()
+    if embedding_format == "float16":
+        return base64.b64encode(vector.astype("<f2").tobytes()).decode("ascii")
+    if embedding_format == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, vector.astype("<f4"))
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+    raise ValueError(f"Unknown embedding format '{embedding_format}', expected one of {EMBEDDING_FORMATS}")
+
+def decode_embedding(value: Union[List[float], str], embedding_format: str = "json") -> np.ndarray:
+    """Inverse of encode_embedding; returns a float32 (dim,) array."""
+    if embedding_format == "json":
+        return np.asarray(value, dtype=np.float32)
+    data = base64.b64decode(value)
+    if embedding_format == "float16":
+        return np.frombuffer(data, dtype="<f2").astype(np.float32)
+    if embedding_format == "npy":
+        return np.load(io.BytesIO(data)).astype(np.float32)
+    raise ValueError(f"Unknown embedding format '{embedding_format}', expected one of {EMBEDDING_FORMATS}")
+
 def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
     """Normalize embeddings to unit length."""
     return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
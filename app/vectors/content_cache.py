@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    kind TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    embedding BLOB,
+    frames INTEGER NOT NULL DEFAULT 0,
+    transcript TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (kind, signature, digest)
+) WITHOUT ROWID;
+"""
+
+class ContentCache:
+    """
+    On-disk cache of inference results keyed by content hash.
+
+    Entries are per uploaded image, per video (mean frame embedding, frame count
+    and transcript) and per text, so a re-upload of the same bytes skips CLIP
+    and Whisper. A transcript of None means it was never computed, not that the
+    video is silent.
+
+    Each kind has a signature of the models and settings that produced its
+    entries, and it is part of the key, so results from another CLIP model or
+    frame-sampling setup are never served.
+    """
+
+    def __init__(self, path: Path, signatures: Optional[Dict[str, str]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.signatures = dict(signatures or {})
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._write_lock:
+            conn = self._conn()
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(content)")]
+            if columns and "signature" not in columns:
+                # Entries from before signatures can't be attributed to a model; it is only a cache
+                logger.info(f"Dropping unsigned content cache entries in {self.path}")
+                conn.execute("DROP TABLE content")
+            conn.executescript(SCHEMA)
+
+    def get(self, kind: str, digest: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT embedding, frames, transcript FROM content WHERE kind = ? AND signature = ? AND digest = ?",
+            (kind, self.signatures.get(kind, ""), digest)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        embedding, frames, transcript = row
+        return {
+            "embedding": np.frombuffer(embedding, dtype=np.float32)[None, :] if embedding is not None else None,
+            "frames": frames,
+            "transcript": transcript
+        }
+
+    def put(
+        self,
+        kind: str,
+        digest: str,
+        embedding: Optional[np.ndarray],
+        frames: int = 0,
+        transcript: Optional[str] = None
+    ):
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO content (kind, signature, digest, embedding, frames, transcript, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (kind, self.signatures.get(kind, ""), digest, blob, frames, transcript, time.time())
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self)
+        }
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM content").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL mode lets readers run alongside the writer
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -1,64 +1,738 @@
 import faiss
-import numpy as np
-from typing import Dict, List, Any
 import json
+import numpy as np
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 from pathlib import Path
 from app.core.config import settings
+from app.core.executor import stage_executor
+from app.core.metrics import metrics
+from app.vectors.index_factory import (
+    COMPRESSED_INDEX_TYPES, create_index, index_ids, index_type_of, min_training_size, search_parameters,
+    train_index, with_ids
+)
+from app.vectors.metadata_store import MetadataStore
+from app.vectors.vector_store import VectorStore
+from app.vectors.wal import WriteAheadLog
+from app.vectors.writer_lock import IndexLockedError, acquire_writer_lock, readers_present, register_reader
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+MIGRATION_CHUNK_SIZE = 65536  # Vectors copied per step when rebuilding an index
+
+class _ReadWriteLock:
+    """Many concurrent searches, or one writer mutating the index."""
 
-class FAISSClient:
     def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+def _mmap_flags() -> int:
+    # IO_FLAG_MMAP_IFC maps flat/SQ/HNSW codes (faiss >= 1.8); older versions only map IVF lists
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+class FAISSClient:
+    """
+    Vector index with SQLite metadata, a write-ahead log and atomic snapshots.
+
+    One process per index is the writer: it holds an exclusive file lock, keeps
+    the index in memory and logs every insert. Any number of read-only clients
+    (other uvicorn workers) memory-map the latest snapshot, so its pages are
+    shared through the OS page cache, and swap to each new snapshot the writer
+    publishes.
+
+    Vectors are stored under 64-bit row IDs (an ID-mapped index), not positions.
+    A post keeps its ID for life; re-embedding it adds a new row and tombstones
+    the old one, and deleting it tombstones its row. Tombstoned rows are
+    excluded from searches at once and dropped by a background rebuild once
+    they make up FAISS_COMPACT_THRESHOLD of the index.
+    """
+
+    def __init__(self, index_path: Optional[Path] = None, read_only: bool = False):
         self.dimension = settings.VECTOR_DIMENSION
-        self.index_path = settings.FAISS_INDEX_PATH
-        self.metadata_path = self.index_path.with_suffix('.json')
-        
-        # Initialize or load index
-        if self.index_path.exists():
-            self.index = faiss.read_index(str(self.index_path))
-            with open(self.metadata_path, 'r') as f:
-                self.metadata = json.load(f)
-        else:
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.metadata = {}
+        self.index_path = Path(index_path or settings.FAISS_INDEX_PATH)
+        self.lock_path = self.index_path.with_suffix('.lock')
+        self.readers_path = self.index_path.with_suffix('.readers')
+        self.read_only = read_only
+        if not read_only and not acquire_writer_lock(self.lock_path):
+            raise IndexLockedError(f"Another process owns writes to {self.index_path}")
+        # Read-only clients register, so the writer only publishes snapshots when someone reads them
+        self._reader_fd: Optional[int] = register_reader(self.readers_path) if read_only else None
+        self.snapshot_every = settings.FAISS_SNAPSHOT_EVERY
+        self.index_type = settings.FAISS_INDEX_TYPE
+        self.rerank_factor = settings.FAISS_RERANK_FACTOR
+        self.compact_threshold = settings.FAISS_COMPACT_THRESHOLD
+        # Readers/writers of self.index, plus a mutex serializing log appends and snapshots
+        self._lock = _ReadWriteLock()
+        self._write_mutex = threading.RLock()
+        self._migration: Optional[threading.Thread] = None
+        # Bumped whenever search results may change, to invalidate result caches
+        self.generation = 0
+        self.migration_status: Dict[str, Any] = {"state": "idle"}
+        self._snapshot_id: Optional[Tuple[int, int]] = None  # (inode, mtime) of the loaded snapshot
+        self._last_snapshot = time.monotonic()
+        self._next_row = 0
+        # Tombstoned rows still in the index, and the selector that hides them from searches
+        self._deleted = np.empty(0, dtype=np.int64)
+        self._deleted_filter: Optional[Tuple[faiss.IDSelector, ...]] = None
+        self._tombstone_version: Optional[int] = None
+        self._metadata_version: Optional[int] = None
+
+        self.metadata = MetadataStore(self.index_path.with_suffix('.db'))
+        self.vectors = VectorStore(self.index_path.with_suffix('.vectors'), self.dimension)
+        if read_only:
+            self.index = with_ids(self._load_snapshot(mmap=True))
+            self._refresh_deleted()
+            return
+        self._open_writer()
+
+    def _open_writer(self):
+        # Migrate the legacy JSON metadata file on first start
+        legacy_metadata_path = self.index_path.with_suffix('.json')
+        if legacy_metadata_path.exists() and len(self.metadata) == 0:
+            self.metadata.import_json(legacy_metadata_path)
+
+        # Load the last snapshot into memory, where it can be updated
+        index = self._load_snapshot(mmap=False)
+        if not isinstance(index, faiss.IndexIDMap):
+            # Saved before row IDs: positions become the IDs, and exact vectors may be missing
+            self._backfill_vectors(index)
+        self.index = with_ids(index)
+        ids = index_ids(self.index)
+        self._next_row = max(
+            int(ids[-1]) if len(ids) else -1, self.metadata.max_row(), len(self.vectors) - 1
+        ) + 1
+
+        # Re-apply inserts logged since that snapshot
+        self.wal = WriteAheadLog(self.index_path.with_suffix('.wal'))
+        self._unsnapshotted = self._replay_wal()
+        self._refresh_deleted()
+        self._maybe_migrate()
+
+    def _load_snapshot(self, mmap: bool) -> faiss.Index:
+        if not self.index_path.exists():
+            # Trained types start out flat until there is enough data to train on
+            needs_training = min_training_size(self.index_type) > 0
+            return create_index("flat" if needs_training else self.index_type, self.dimension)
+        stat = os.stat(self.index_path)
+        self._snapshot_id = (stat.st_ino, stat.st_mtime_ns)
+        return faiss.read_index(str(self.index_path), _mmap_flags() if mmap else 0)
+
+    def reload(self) -> bool:
+        """
+        Read-only clients: swap to the writer's newest snapshot if it changed.
+        Snapshots are replaced by rename, so searches still running on the old
+        mapping keep a valid file until they finish.
+        """
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return False
+        changed = (stat.st_ino, stat.st_mtime_ns) != self._snapshot_id
+        if changed:
+            index = with_ids(self._load_snapshot(mmap=True))
+            with self._lock.write():
+                self.index = index
+                self.generation += 1
+            logger.info(f"Loaded index snapshot with {index.ntotal} vectors")
+        # Tombstones written by other workers, or dropped by the writer's compaction
+        self._refresh_deleted()
+        # Metadata rewritten in place (re-tags) invalidates cached results too
+        version = self.metadata.metadata_version()
+        if version != self._metadata_version:
+            if self._metadata_version is not None:
+                self.generation += 1
+            self._metadata_version = version
+        return changed
+
+    def promote(self) -> bool:
+        """
+        Read-only clients: become the writer if the previous one is gone.
+        Loads the index into memory and replays the log it left behind.
+        """
+        if not self.read_only:
+            return True
+        if not acquire_writer_lock(self.lock_path):
+            return False
+        with self._write_mutex, self._lock.write():
+            self.read_only = False
+            self._open_writer()
+            self.generation += 1
+        os.close(self._reader_fd)
+        self._reader_fd = None
+        logger.info(f"Promoted to index writer with {self.index.ntotal} vectors")
+        return True
+
+    def publish(self, max_age: float) -> bool:
+        """
+        Writer: snapshot inserts older than `max_age` seconds so read-only clients see them.
+        With no read-only clients registered, snapshots are left to FAISS_SNAPSHOT_EVERY.
+        Also picks up deletes made by other workers and starts a compaction when due.
+        """
+        if self.read_only:
+            return False
+        self._refresh_deleted()
+        self._maybe_compact()
+        if self._unsnapshotted == 0 or time.monotonic() - self._last_snapshot < max_age:
+            return False
+        if not readers_present(self.readers_path):
+            return False
+        self.snapshot()
+        return True
 
     async def add_post(self, embedding: np.ndarray, metadata: Dict[str, Any]) -> str:
         """Add a post embedding and its metadata to the index."""
-        # Generate unique ID
-        post_id = str(len(self.metadata))
-        
-        # Add to FAISS index
-        self.index.add(embedding.reshape(1, -1))
-        
-        # Store metadata
-        self.metadata[post_id] = metadata
-        
-        # Save to disk
-        self._save()
-        
-        return post_id
-
-    async def search(self, query_embedding: np.ndarray, limit: int = 10) -> List[Dict]:
-        """Search for similar posts using a query embedding."""
-        # Search in FAISS
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1),
-            min(limit, self.index.ntotal)
+        # Index writes and disk I/O run on the single-worker "index" stage
+        return await stage_executor.run("index", self._add_post, embedding, metadata)
+
+    async def add_posts(self, embeddings: List[np.ndarray], metadatas: List[Dict[str, Any]]) -> List[str]:
+        """Add many posts with a single log append and fsync."""
+        return await stage_executor.run("index", self._add_posts, embeddings, metadatas)
+
+    async def update_post(self, post_id: str, embedding: np.ndarray, metadata: Dict[str, Any]) -> str:
+        """
+        Replace a post's embedding and metadata, keeping its ID.
+        Raises KeyError if the post does not exist.
+        """
+        return await stage_executor.run("index", self._update_post, post_id, embedding, metadata)
+
+    async def delete_posts(self, post_ids: List[str]) -> List[str]:
+        """
+        Delete posts, returning the IDs that existed. Their vectors are tombstoned
+        and skipped by searches from now on; compaction removes them later.
+        """
+        return await stage_executor.run("index", self._delete_posts, post_ids)
+
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        limit: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict]:
+        """
+        Search for similar posts using a query embedding.
+        Metadata filters restrict which rows FAISS visits, so `limit` results
+        are returned whenever that many posts match.
+        """
+        return await stage_executor.run("search", self._search, query_embedding, limit, filters)
+
+    async def lexical_search(self, query: str, limit: int = 10, filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """BM25 search over captions and transcripts, with the same filters and result shape as `search`."""
+        return await stage_executor.run("search", self._lexical_search, query, limit, filters)
+
+    async def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        limits: List[int],
+        filters: List[Optional[Dict[str, Any]]]
+    ) -> List[List[Dict]]:
+        """
+        Search many queries at once, returning results in input order.
+        Queries sharing the same filters go through a single multi-query index.search.
+        """
+        return await stage_executor.run("search", self._search_batch, query_embeddings, limits, filters)
+
+    def update_metadata(self, updates: Dict[int, Tuple[str, Dict[str, Any]]]):
+        """
+        Replace the metadata of existing rows, given as {row: (post_id, metadata)}.
+        Metadata lives in SQLite, which every worker may write, so read-only clients can too.
+        Posts deleted or re-embedded in the meantime are skipped.
+        """
+        if not updates:
+            return
+        self.metadata.update_many((post_id, row, metadata) for row, (post_id, metadata) in updates.items())
+        self.generation += 1
+
+    def snapshot(self):
+        """
+        Atomically persist the index, then truncate the log.
+        The index is written to a temp path, fsynced and renamed into place.
+        """
+        self._check_writable()
+        with self._write_mutex, metrics.span("index_save"):
+            with self._lock.read():
+                index_bytes = faiss.serialize_index(self.index)
+
+            # Exact vectors must be durable before the log that could rebuild them is dropped
+            self.vectors.sync()
+            self._atomic_write(self.index_path, index_bytes.tobytes())
+            self.wal.reset()
+            self._unsnapshotted = 0
+            self._last_snapshot = time.monotonic()
+        logger.info(f"Snapshot written with {self.index.ntotal} vectors")
+
+    def index_status(self) -> Dict[str, Any]:
+        """Serving index type, size and the state of any background rebuild."""
+        index = self.index
+        try:
+            code_bytes: Optional[int] = index.sa_code_size()
+        except RuntimeError:
+            code_bytes = None  # Not reported by graph indexes
+        return {
+            "type": index_type_of(index),
+            "metric": "inner_product" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2",
+            "ntotal": index.ntotal,
+            "deleted": len(self._deleted),
+            "compact_threshold": self.compact_threshold,
+            "writer": not self.read_only,
+            "bytes_per_vector": code_bytes,
+            "rerank_factor": self.rerank_factor if self._reranks(index) else None,
+            "configured_type": self.index_type,
+            "migration": dict(self.migration_status)
+        }
+
+    def measure_recall(self, k: int = 10, n_queries: Optional[int] = None) -> float:
+        """Recall@k of the serving index against exhaustive search over the same vectors."""
+        return self._measure_recall(self.index, k, n_queries or settings.FAISS_RECALL_QUERIES)
+
+    def migrate_index(self, index_type: str) -> bool:
+        """
+        Rebuild the index into another type in a background thread.
+        Searches keep using the current index until the new one is swapped in.
+        Returns False if a rebuild is already running.
+        """
+        self._check_writable()
+        if self._migration and self._migration.is_alive():
+            return False
+        self.migration_status = {"state": "starting", "target": index_type}
+        self._migration = threading.Thread(
+            target=self._migrate, args=(index_type,), name="faiss-migration", daemon=True
         )
-        
-        # Format results
+        self._migration.start()
+        return True
+
+    def _add_post(self, embedding: np.ndarray, metadata: Dict[str, Any]) -> str:
+        return self._add_posts([embedding], [metadata])[0]
+
+    def _update_post(self, post_id: str, embedding: np.ndarray, metadata: Dict[str, Any]) -> str:
+        self._check_writable()
+        if self.metadata.row_of(post_id) is None:
+            raise KeyError(post_id)
+        return self._add_posts([embedding], [metadata], post_ids=[post_id])[0]
+
+    def _delete_posts(self, post_ids: List[str]) -> List[str]:
+        # Tombstones live in SQLite, so any worker may delete; the writer compacts
+        found = self.metadata.delete(post_ids)
+        if found:
+            self._set_deleted(np.union1d(self._deleted, np.fromiter(found.values(), dtype=np.int64)))
+            logger.info(f"Deleted {len(found)} posts")
+            if not self.read_only:
+                self._maybe_compact()
+        return list(found)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise IndexLockedError("This index client is read-only; writes go through the index writer")
+
+    def _add_posts(
+        self,
+        embeddings: List[np.ndarray],
+        metadatas: List[Dict[str, Any]],
+        post_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Append rows for new posts or, given `post_ids`, move existing posts to new rows."""
+        self._check_writable()
+        vectors = np.vstack([e.reshape(1, -1) for e in embeddings]).astype(np.float32)
+        with self._write_mutex:
+            # Row IDs are never reused; a new post's ID is its first row
+            first_row = self._next_row
+            rows = np.arange(first_row, first_row + len(metadatas), dtype=np.int64)
+            moved = post_ids is not None
+            post_ids = post_ids if moved else [str(row) for row in rows]
+
+            with metrics.span("index_add"):
+                # Log first so an acknowledged insert survives a crash
+                self.wal.append([
+                    ({'row': int(row), 'post_id': post_id, 'metadata': metadata, **({'moved': True} if moved else {})}, vector)
+                    for row, post_id, metadata, vector in zip(rows, post_ids, metadatas, vectors)
+                ])
+
+                self.vectors.write(first_row, vectors)
+                self._next_row += len(rows)
+
+                # Store metadata before the rows become searchable
+                if moved:
+                    self._move_posts(zip(post_ids, rows, metadatas))
+                else:
+                    self.metadata.put_many(zip(post_ids, rows.tolist(), metadatas))
+                with self._lock.write():
+                    self.index.add_with_ids(vectors, rows)
+                    self.generation += 1
+            self._unsnapshotted += len(post_ids)
+
+            if self._unsnapshotted >= self.snapshot_every:
+                self.snapshot()
+
+        self._maybe_migrate()
+        return post_ids
+
+    def _move_posts(self, items: Iterable[Tuple[str, int, Dict[str, Any]]]):
+        """Point posts at their new rows and tombstone the old ones (or the new one, if the post is gone)."""
+        dead = []
+        for post_id, row, metadata in items:
+            try:
+                dead.append(self.metadata.move(post_id, int(row), metadata))
+            except KeyError:
+                logger.warning(f"Post {post_id} was deleted while being re-embedded")
+                self.metadata.tombstone([row])
+                dead.append(int(row))
+        self._set_deleted(np.union1d(self._deleted, np.array(dead, dtype=np.int64)))
+
+    def _refresh_deleted(self):
+        """Re-read tombstones if any worker changed them since the last read."""
+        version = self.metadata.tombstone_version()
+        if version != self._tombstone_version:
+            self._tombstone_version = version
+            self._set_deleted(self.metadata.deleted_rows())
+
+    def _set_deleted(self, rows: np.ndarray):
+        selector = None
+        if len(rows):
+            mask = np.zeros(int(rows[-1]) + 1, dtype=bool)
+            mask[rows] = True
+            bitmap = np.packbits(mask, bitorder='little')
+            dead = faiss.IDSelectorBitmap(bitmap)
+            # Held together: the selectors only point at the bitmap and each other
+            selector = (faiss.IDSelectorNot(dead), dead, bitmap)
+        self._deleted, self._deleted_filter = rows, selector
+        self.generation += 1
+
+    def _maybe_compact(self):
+        """Start a rebuild without tombstoned vectors once they pass FAISS_COMPACT_THRESHOLD of the index."""
+        dead, total = len(self._deleted), self.index.ntotal
+        if not dead or dead < self.compact_threshold * total:
+            return
+        if (self._migration and self._migration.is_alive()) or self.migration_status.get("state") == "failed":
+            return
+        logger.info(f"Compacting index: {dead} of {total} vectors are deleted")
+        # Too few vectors left to train the current type: fall back to flat until there are again
+        index_type = index_type_of(self.index)
+        if total - dead < min_training_size(index_type):
+            index_type = "flat"
+        self.migrate_index(index_type)
+
+    def _search(self, query_embedding: np.ndarray, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        return self._search_batch(np.asarray(query_embedding).reshape(1, -1), [limit], [filters])[0]
+
+    def _search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        limits: List[int],
+        filters: List[Optional[Dict[str, Any]]]
+    ) -> List[List[Dict]]:
+        queries = np.array(query_embeddings, dtype=np.float32).reshape(len(limits), -1)
+        faiss.normalize_L2(queries)
+
+        # Group queries by filter so each group is one matrix search
+        groups: Dict[str, List[int]] = {}
+        for i, query_filters in enumerate(filters):
+            groups.setdefault(json.dumps(query_filters or {}, sort_keys=True), []).append(i)
+
+        hits: List[List[Tuple[int, float]]] = [[] for _ in limits]
+        for positions in groups.values():
+            group_limit = max(limits[p] for p in positions)
+            group_hits = self._search_group(queries[positions], group_limit, filters[positions[0]])
+            for position, found in zip(positions, group_hits):
+                hits[position] = found[:limits[position]]
+
+        # Read metadata only for the rows we return
+        with metrics.span("metadata_lookup"):
+            found_metadata = self.metadata.get_by_rows({row for query_hits in hits for row, _ in query_hits})
         results = []
-        for distance, idx in zip(distances[0], indices[0]):
-            if idx != -1:  # Valid result
-                post_id = str(idx)
-                results.append({
-                    'id': post_id,
-                    'score': float(1 / (1 + distance)),  # Convert distance to similarity score
-                    'metadata': self.metadata[post_id]
-                })
-        
+        for query_hits in hits:
+            query_results = []
+            for row, score in query_hits:
+                if row in found_metadata:
+                    post_id, metadata = found_metadata[row]
+                    query_results.append({'id': post_id, 'score': score, 'metadata': metadata})
+            results.append(query_results)
         return results
 
-    def _save(self):
-        """Save the index and metadata to disk."""
-        faiss.write_index(self.index, str(self.index_path))
-        with open(self.metadata_path, 'w') as f:
-            json.dump(self.metadata, f) 
\ No newline at end of file
+    def _lexical_search(self, query: str, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        with metrics.span("lexical_search"):
+            hits = self.metadata.match_text(query, limit, filters)
+        with metrics.span("metadata_lookup"):
+            found_metadata = self.metadata.get_by_rows(row for row, _ in hits)
+        return [
+            {'id': found_metadata[row][0], 'score': score, 'metadata': found_metadata[row][1]}
+            for row, score in hits if row in found_metadata
+        ]
+
+    def _search_group(
+        self,
+        queries: np.ndarray,
+        limit: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[List[Tuple[int, float]]]:
+        """Run one index.search for queries sharing the same filters; returns (row, score) per query."""
+        # Resolve metadata filters into an allow-list bitmap over FAISS rows; without
+        # filters, only tombstoned rows are excluded
+        deleted_filter = self._deleted_filter
+        selector = deleted_filter[0] if deleted_filter else None
+        candidates = self.index.ntotal - len(self._deleted)
+        if filters:
+            with metrics.span("metadata_filter"):
+                rows = self.metadata.rows_matching(filters)
+            if len(rows) == 0:
+                return [[] for _ in queries]
+            mask = np.zeros(int(rows[-1]) + 1, dtype=bool)
+            mask[rows] = True
+            bitmap = np.packbits(mask, bitorder='little')
+            selector, candidates = faiss.IDSelectorBitmap(bitmap), len(rows)
+
+        # Search in FAISS; compressed indexes over-fetch candidates for exact re-ranking
+        with self._lock.read():
+            index = self.index
+            if index.ntotal == 0 or candidates <= 0 or limit <= 0:
+                return [[] for _ in queries]
+            rerank = self._reranks(index)
+            fetch = limit * self.rerank_factor if rerank else limit
+            with metrics.span("search"):
+                distances, indices = index.search(
+                    queries,
+                    min(fetch, index.ntotal, candidates),
+                    params=search_parameters(index, selector)
+                )
+
+        hits = [
+            [
+                (int(idx), self._to_score(index, distance))
+                for distance, idx in zip(row_distances, row_indices)
+                if idx != -1  # Valid result
+            ]
+            for row_distances, row_indices in zip(distances, indices)
+        ]
+        if rerank:
+            with metrics.span("rerank"):
+                hits = [self._rerank(query, query_hits, limit) for query, query_hits in zip(queries, hits)]
+        return hits
+
+    def _reranks(self, index: faiss.Index) -> bool:
+        return self.rerank_factor > 1 and index_type_of(index) in COMPRESSED_INDEX_TYPES
+
+    def _rerank(self, query: np.ndarray, hits: List[Tuple[int, float]], limit: int) -> List[Tuple[int, float]]:
+        """Re-score candidates with their exact float32 vectors and keep the best `limit`."""
+        if not hits:
+            return hits
+        rows = [row for row, _ in hits]
+        scores = self.vectors.read(rows) @ query
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [(rows[i], float(scores[i])) for i in order]
+
+    @staticmethod
+    def _to_score(index: faiss.Index, distance: float) -> float:
+        """Similarity score where higher is better."""
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return float(distance)  # Cosine similarity of normalized vectors
+        return float(1 / (1 + distance))  # Legacy L2 indexes
+
+    def _maybe_migrate(self):
+        """Start a background rebuild if the index does not match FAISS_INDEX_TYPE yet."""
+        index = self.index
+        if index_type_of(index) == self.index_type and index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            return
+        if self._migration and self._migration.is_alive():
+            return
+        if self.migration_status.get("state") in ("failed", "rejected") or index.ntotal < min_training_size(self.index_type):
+            return
+        logger.info(f"Rebuilding {index_type_of(index)} index with {index.ntotal} vectors as {self.index_type}")
+        self.migrate_index(self.index_type)
+
+    def _live_rows(self, index: faiss.Index) -> np.ndarray:
+        """Row IDs in the index that are not tombstoned, ascending."""
+        with self._lock.read():
+            ids = index_ids(index).copy()
+            deleted = self._deleted
+        return ids[~np.isin(ids, deleted, assume_unique=True)]
+
+    def _read_rows(self, rows: np.ndarray):
+        """Yield (row IDs, exact vectors) in chunks; mostly-contiguous chunks are read in one go."""
+        for start in range(0, len(rows), MIGRATION_CHUNK_SIZE):
+            chunk = rows[start:start + MIGRATION_CHUNK_SIZE]
+            first, span = int(chunk[0]), int(chunk[-1] - chunk[0]) + 1
+            if span <= 2 * len(chunk):
+                yield chunk, self.vectors.read_range(first, span)[chunk - first]
+            else:
+                yield chunk, self.vectors.read(chunk)
+
+    def _backfill_vectors(self, index: faiss.Index):
+        """Copy exact vectors out of a position-addressed index saved before the vector file existed."""
+        stored, total = len(self.vectors), index.ntotal
+        if stored >= total:
+            return
+        logger.info(f"Copying {total - stored} vectors from the index into {self.vectors.path}")
+        for start in range(stored, total, MIGRATION_CHUNK_SIZE):
+            count = min(MIGRATION_CHUNK_SIZE, total - start)
+            self.vectors.write(start, index.reconstruct_n(start, count))
+        self.vectors.sync()
+
+    def _migrate(self, index_type: str):
+        started = time.perf_counter()
+        try:
+            # Rows tombstoned now are left out; later deletes stay hidden by the selector.
+            # Read under the lock: a concurrent add may reallocate the ID map being copied
+            with self._lock.read():
+                dropped = self._deleted.copy()
+                ids = index_ids(self.index).copy()
+            last_row = int(ids[-1]) if len(ids) else -1
+            live = ids[~np.isin(ids, dropped, assume_unique=True)]
+            new_index = with_ids(create_index(index_type, self.dimension))
+            self.migration_status.update(dropped=len(dropped))
+
+            if not new_index.is_trained:
+                self.migration_status.update(state="training")
+                sample_rows = np.random.default_rng(0).choice(
+                    live, min(len(live), settings.FAISS_TRAIN_SAMPLE), replace=False
+                )
+                sample = self.vectors.read(np.sort(sample_rows))
+                train_index(new_index, sample)
+
+            # Copy vectors while the old index keeps serving
+            self.migration_status.update(state="building")
+            for rows, vectors in self._read_rows(live):
+                new_index.add_with_ids(vectors, rows)
+                self.migration_status.update(progress=min(1.0, new_index.ntotal / max(len(live), 1)))
+
+            k = settings.FAISS_RECALL_K
+            recall = self._measure_recall(new_index, k, settings.FAISS_RECALL_QUERIES)
+            # Compaction keeps the type, so only a change of type can lose recall
+            if index_type != index_type_of(self.index) and recall < settings.FAISS_MIN_RECALL:
+                self.migration_status.update(
+                    state="rejected", recall_at_k=recall, k=k,
+                    seconds=round(time.perf_counter() - started, 3)
+                )
+                logger.warning(
+                    f"Keeping {index_type_of(self.index)} index: {index_type} rebuild reached "
+                    f"recall@{k}={recall:.3f}, below FAISS_MIN_RECALL={settings.FAISS_MIN_RECALL}"
+                )
+                return
+
+            # Catch up on inserts made during the build, then swap
+            with self._write_mutex:
+                with self._lock.write():
+                    ids = index_ids(self.index)
+                    added = ids[ids > last_row]
+                    if len(added):
+                        new_index.add_with_ids(self.vectors.read(added), added)
+                    self.index = new_index
+                    self.generation += 1
+                self.snapshot()
+                # Only once the snapshot without them is durable
+                self.metadata.mark_compacted(dropped)
+                self._refresh_deleted()
+
+            self.migration_status.update(
+                state="done", progress=1.0, recall_at_k=recall, k=k,
+                seconds=round(time.perf_counter() - started, 3)
+            )
+            logger.info(f"Index rebuilt as {index_type} in {time.perf_counter() - started:.1f}s, recall@{k}={recall:.3f}")
+        except Exception as e:
+            logger.error(f"Index rebuild to {index_type} failed", exc_info=True)
+            self.migration_status.update(state="failed", error=str(e))
+
+    def _measure_recall(self, candidate: faiss.Index, k: int, n_queries: int) -> float:
+        """Compare candidate results with exhaustive inner-product search over its live vectors."""
+        live = self._live_rows(candidate)
+        total = len(live)
+        if total == 0:
+            return 1.0
+        k = min(k, total)
+        rows = np.sort(np.random.default_rng(1).choice(live, min(n_queries, total), replace=False))
+        queries = self.vectors.read(rows)
+        faiss.normalize_L2(queries)
+
+        exact = faiss.ResultHeap(len(queries), k, keep_max=True)
+        for block_rows, block in self._read_rows(live):
+            scores = queries @ block.T
+            top = np.argsort(-scores, axis=1)[:, :k]
+            exact.add_result(
+                D=np.ascontiguousarray(np.take_along_axis(scores, top, axis=1), dtype=np.float32),
+                I=np.ascontiguousarray(block_rows[top], dtype=np.int64)
+            )
+        exact.finalize()
+
+        # Measured as served: tombstones are skipped, compressed indexes include their exact re-ranking
+        deleted_filter = self._deleted_filter
+        selector = deleted_filter[0] if deleted_filter else None
+        rerank = self._reranks(candidate)
+        fetch = min(k * self.rerank_factor, total) if rerank else k
+        with self._lock.read():
+            _, found = candidate.search(queries, fetch, params=search_parameters(candidate, selector))
+        found = [[int(row) for row in rows if row >= 0] for rows in found]
+        if rerank:
+            found = [
+                [row for row, _ in self._rerank(query, [(row, 0.0) for row in rows], k)]
+                for query, rows in zip(queries, found)
+            ]
+        hits = sum(len(set(f) & set(e)) for f, e in zip(found, exact.I))
+        return hits / (len(queries) * k)
+
+    def _replay_wal(self) -> int:
+        """Apply logged records not yet covered by the loaded snapshot."""
+        replayed = 0
+        ids = index_ids(self.index)
+        for record, vector in self.wal.replay():
+            row = record['row']
+            self._next_row = max(self._next_row, row + 1)
+            position = np.searchsorted(ids, row)
+            if position < len(ids) and ids[position] == row:
+                continue  # Already in the snapshot
+            self.vectors.write(row, vector)
+            # Rows deleted since are still added, as tombstones, until the next compaction
+            if not self.metadata.is_deleted(row):
+                if record.get('moved') and self.metadata.row_of(record['post_id']) != row:
+                    self._move_posts([(record['post_id'], row, record['metadata'])])
+                else:
+                    self.metadata.put_many([(record['post_id'], row, record['metadata'])], replace=False)
+            self.index.add_with_ids(vector.reshape(1, -1), np.array([row], dtype=np.int64))
+            replayed += 1
+
+        if replayed:
+            logger.info(f"Replayed {replayed} records from {self.wal.path}")
+        return replayed
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
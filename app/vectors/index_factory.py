@@ -0,0 +1,104 @@
+import faiss
+import numpy as np
+from typing import Optional
+from app.core.config import settings
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq_fp16", "sq8")
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq", "sq8")
+# Types storing approximate vectors; their candidates are re-scored against exact ones
+COMPRESSED_INDEX_TYPES = ("ivf_pq", "sq_fp16", "sq8")
+
+def create_index(index_type: str, dimension: int) -> faiss.Index:
+    """
+    Build an empty inner-product index of the given type.
+    Embeddings are L2-normalized, so inner product equals cosine similarity.
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimension)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, settings.FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = settings.FAISS_EF_CONSTRUCTION
+        return index
+    if index_type == "sq_fp16":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "sq8":
+        # Per-dimension 8-bit ranges are learned from a training sample
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivf_flat":
+        index = faiss.index_factory(dimension, f"IVF{settings.FAISS_NLIST},Flat", faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "ivf_pq":
+        index = faiss.index_factory(
+            dimension, f"IVF{settings.FAISS_NLIST},PQ{settings.FAISS_PQ_M}", faiss.METRIC_INNER_PRODUCT
+        )
+    else:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    return index
+
+def with_ids(index: faiss.Index) -> faiss.IndexIDMap:
+    """
+    Wrap an index so it is searched and filtered by 64-bit row IDs instead of positions.
+    Legacy indexes that already hold vectors keep their positions as IDs.
+    IndexIDMap rather than IndexIDMap2: exact vectors are kept on disk, so the
+    reverse hash map IndexIDMap2 needs for reconstruct() would only cost RAM.
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        return index
+    if index.ntotal == 0:
+        return faiss.IndexIDMap(index)
+    wrapped = faiss.IndexIDMap(faiss.IndexFlatIP(index.d))
+    wrapped.index = index
+    wrapped.referenced_objects = [index]  # Keep the inner index alive with the wrapper
+    faiss.copy_array_to_vector(np.arange(index.ntotal, dtype=np.int64), wrapped.id_map)
+    wrapped.ntotal = index.ntotal
+    wrapped.metric_type = index.metric_type  # The placeholder above is IP; legacy indexes may be L2
+    return wrapped
+
+def index_ids(index: faiss.Index) -> np.ndarray:
+    """Row IDs held by an ID-mapped index, in ascending order (IDs are only ever appended in order)."""
+    return faiss.vector_to_array(index.id_map) if isinstance(index, faiss.IndexIDMap) else np.arange(index.ntotal)
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of the index type, as used by FAISS_INDEX_TYPE."""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq_fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+def min_training_size(index_type: str) -> int:
+    """Vectors needed before an index of this type can be trained well."""
+    if index_type == "sq8":
+        return 1000  # Enough to estimate per-dimension value ranges
+    if index_type in TRAINED_INDEX_TYPES:
+        # FAISS k-means wants ~39 points per centroid
+        return 39 * settings.FAISS_NLIST
+    return 0
+
+def train_index(index: faiss.Index, vectors: np.ndarray):
+    """Train the index on a random sample of at most FAISS_TRAIN_SAMPLE vectors."""
+    if index.is_trained:
+        return
+    if len(vectors) > settings.FAISS_TRAIN_SAMPLE:
+        rows = np.random.default_rng(0).choice(len(vectors), settings.FAISS_TRAIN_SAMPLE, replace=False)
+        vectors = vectors[np.sort(rows)]
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+
+def search_parameters(
+    index: faiss.Index,
+    selector: Optional[faiss.IDSelector] = None
+) -> Optional[faiss.SearchParameters]:
+    """Per-query tuning knobs (nprobe / efSearch) and an optional ID filter for the index type."""
+    index_type = index_type_of(index)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=settings.FAISS_EF_SEARCH, sel=selector)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(nprobe=settings.FAISS_NPROBE, sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
@@ -0,0 +1,334 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id TEXT PRIMARY KEY,
+    row INTEGER NOT NULL UNIQUE,
+    has_image INTEGER NOT NULL DEFAULT 0,
+    has_video INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_has_image ON posts (has_image);
+CREATE INDEX IF NOT EXISTS posts_has_video ON posts (has_video);
+CREATE INDEX IF NOT EXISTS posts_created_at ON posts (created_at);
+CREATE TABLE IF NOT EXISTS post_tags (
+    tag TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (tag, row)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS deleted_rows (
+    row INTEGER PRIMARY KEY,
+    compacted INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_text USING fts5(
+    text, audio_text, tokenize = "unicode61 tokenchars '#@_'"
+);
+"""
+# Query terms as the full-text tokenizer splits them: hashtags and handles stay whole
+TEXT_TERM = re.compile(r"[\w#@]+")
+
+class MetadataStore:
+    """
+    SQLite-backed post metadata keyed by post ID and FAISS row.
+
+    Nothing is held in memory: search results read only the rows they return,
+    and filter columns are indexed so they can be resolved into the set of
+    FAISS rows a search is allowed to visit.
+
+    A post's ID never changes, but re-embedding it moves it to a new row. Rows
+    of deleted and replaced vectors are kept as tombstones; `compacted` marks
+    those already dropped from the index. Tombstones are never removed, so a
+    replayed log can tell a dead row from a new one.
+
+    Captions and transcripts of live posts are also kept in an FTS5 full-text
+    index (rowid = FAISS row), updated in the same transactions, for BM25 search.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            self._conn().executescript(SCHEMA)
+            self._backfill_text()
+
+    def put_many(self, items: Iterable[Tuple[str, int, Dict[str, Any]]], replace: bool = True):
+        """Store (post_id, row, metadata) entries in one transaction."""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        items = list(items)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                if replace:
+                    conn.executemany("DELETE FROM post_tags WHERE row = ?", [(row,) for _, row, _ in items])
+                conn.executemany(
+                    f"{verb} INTO posts (post_id, row, has_image, has_video, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (post_id, row, bool(meta.get("has_image")), bool(meta.get("has_video")),
+                         meta.get("created_at"), json.dumps(meta))
+                        for post_id, row, meta in items
+                    ]
+                )
+                conn.executemany(
+                    f"{verb} INTO post_tags (tag, row) VALUES (?, ?)",
+                    [(tag, row) for _, row, meta in items for tag in meta.get("tags") or []]
+                )
+                self._index_text(conn, [row for _, row, _ in items])
+
+    def update_many(self, items: Iterable[Tuple[str, int, Dict[str, Any]]]) -> int:
+        """
+        Replace the metadata of existing (post_id, row) entries; returns how many still existed.
+        Posts deleted or moved since they were read are left alone.
+        """
+        updated = 0
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                for post_id, row, meta in items:
+                    cursor = conn.execute(
+                        "UPDATE posts SET has_image = ?, has_video = ?, created_at = ?, data = ? WHERE post_id = ? AND row = ?",
+                        (bool(meta.get("has_image")), bool(meta.get("has_video")), meta.get("created_at"),
+                         json.dumps(meta), post_id, row)
+                    )
+                    if cursor.rowcount:
+                        updated += 1
+                        self._put_tags(conn, row, meta)
+                        self._index_text(conn, [row])
+                if updated:
+                    self._bump(conn, "metadata")
+        return updated
+
+    def move(self, post_id: str, row: int, meta: Dict[str, Any]) -> int:
+        """Point an existing post at a new row with new metadata, tombstoning its old row; returns the old row."""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                found = conn.execute("SELECT row FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+                if found is None:
+                    raise KeyError(post_id)
+                old_row = found[0]
+                self._tombstone(conn, [old_row])
+                conn.execute(
+                    "UPDATE posts SET row = ?, has_image = ?, has_video = ?, created_at = ?, data = ? WHERE post_id = ?",
+                    (row, bool(meta.get("has_image")), bool(meta.get("has_video")), meta.get("created_at"),
+                     json.dumps(meta), post_id)
+                )
+                self._put_tags(conn, row, meta)
+                self._index_text(conn, [row])
+        return old_row
+
+    def delete(self, post_ids: Iterable[str]) -> Dict[str, int]:
+        """Remove posts and tombstone their rows in one transaction; returns {post_id: row} of those found."""
+        post_ids = list(post_ids)
+        if not post_ids:
+            return {}
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                placeholders = ",".join("?" * len(post_ids))
+                found = dict(conn.execute(f"SELECT post_id, row FROM posts WHERE post_id IN ({placeholders})", post_ids))
+                if found:
+                    self._tombstone(conn, list(found.values()))
+                    conn.executemany("DELETE FROM posts WHERE post_id = ?", [(post_id,) for post_id in found])
+        return found
+
+    def tombstone(self, rows: Iterable[int]):
+        """Mark rows dead without touching posts, e.g. a vector whose post vanished mid-update."""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                self._tombstone(conn, [int(row) for row in rows])
+
+    def deleted_rows(self) -> np.ndarray:
+        """Tombstoned rows still present in the index, as a sorted int64 array."""
+        cursor = self._conn().execute("SELECT row FROM deleted_rows WHERE compacted = 0 ORDER BY row")
+        return np.fromiter((row for (row,) in cursor), dtype=np.int64)
+
+    def is_deleted(self, row: int) -> bool:
+        return self._conn().execute("SELECT 1 FROM deleted_rows WHERE row = ?", (int(row),)).fetchone() is not None
+
+    def mark_compacted(self, rows: Iterable[int]):
+        """Record that tombstoned rows are no longer in the index."""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany("UPDATE deleted_rows SET compacted = 1 WHERE row = ?", [(int(row),) for row in rows])
+                self._bump(conn, "tombstones")
+
+    def tombstone_version(self) -> int:
+        """Changes whenever tombstones are added or compacted, so other workers know to re-read them."""
+        found = self._conn().execute("SELECT value FROM counters WHERE name = 'tombstones'").fetchone()
+        return found[0] if found else 0
+
+    def metadata_version(self) -> int:
+        """Changes whenever existing posts' metadata is rewritten in place, e.g. by a re-tag."""
+        found = self._conn().execute("SELECT value FROM counters WHERE name = 'metadata'").fetchone()
+        return found[0] if found else 0
+
+    def max_row(self) -> int:
+        """Highest row ever used by a live or deleted post, or -1."""
+        conn = self._conn()
+        return max(
+            conn.execute("SELECT COALESCE(MAX(row), -1) FROM posts").fetchone()[0],
+            conn.execute("SELECT COALESCE(MAX(row), -1) FROM deleted_rows").fetchone()[0]
+        )
+
+    def row_of(self, post_id: str) -> Optional[int]:
+        found = self._conn().execute("SELECT row FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+        return found[0] if found else None
+
+    def get_by_rows(self, rows: Iterable[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """Look up (post_id, metadata) for the given FAISS rows."""
+        rows = [int(row) for row in rows]
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        cursor = self._conn().execute(
+            f"SELECT row, post_id, data FROM posts WHERE row IN ({placeholders})", rows
+        )
+        return {row: (post_id, json.loads(data)) for row, post_id, data in cursor}
+
+    def rows_matching(self, filters: Dict[str, Any]) -> np.ndarray:
+        """FAISS rows of posts matching every given filter, as a sorted int64 array."""
+        clauses, params = self._filter_clauses(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        cursor = self._conn().execute(f"SELECT row FROM posts {where} ORDER BY row", params)
+        return np.fromiter((row for (row,) in cursor), dtype=np.int64)
+
+    def match_text(self, query: str, limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """
+        BM25 search of captions and transcripts; returns (row, score) best first, higher is better.
+        Any query term may match; posts matching more and rarer terms rank higher.
+        """
+        terms = list(dict.fromkeys(TEXT_TERM.findall(query)))
+        if not terms or limit <= 0:
+            return []
+        # Quoted, so query words are never read as FTS5 operators
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        clauses, params = self._filter_clauses(filters or {})
+        join = "JOIN posts ON posts.row = posts_text.rowid" if clauses else ""
+        where = "".join(f" AND {clause}" for clause in clauses)
+        cursor = self._conn().execute(
+            f"SELECT posts_text.rowid, bm25(posts_text) AS rank FROM posts_text {join} "
+            f"WHERE posts_text MATCH ?{where} ORDER BY rank LIMIT ?",
+            [match, *params, limit]
+        )
+        return [(row, -rank) for row, rank in cursor]
+
+    @staticmethod
+    def _filter_clauses(filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        """SQL conditions on the posts table for search filters."""
+        clauses, params = [], []
+        for column in ("has_image", "has_video"):
+            if filters.get(column) is not None:
+                clauses.append(f"{column} = ?")
+                params.append(int(filters[column]))
+        if filters.get("created_after"):
+            clauses.append("created_at >= ?")
+            params.append(filters["created_after"])
+        if filters.get("created_before"):
+            clauses.append("created_at < ?")
+            params.append(filters["created_before"])
+        tags = sorted(set(filters.get("tags") or []))
+        if tags:
+            clauses.append(
+                f"row IN (SELECT row FROM post_tags WHERE tag IN ({','.join('?' * len(tags))}) "
+                "GROUP BY row HAVING COUNT(*) = ?)"
+            )
+            params.extend(tags + [len(tags)])
+        return clauses, params
+
+    def values(self, field: str) -> Set[Any]:
+        """Distinct non-null values of a top-level metadata field across all posts."""
+        cursor = self._conn().execute("SELECT DISTINCT json_extract(data, ?) FROM posts", (f"$.{field}",))
+        return {value for (value,) in cursor if value is not None}
+
+    def import_json(self, path: Path):
+        """One-off migration from the legacy JSON metadata file (post ID == row)."""
+        with open(path) as f:
+            legacy = json.load(f)
+        self.put_many((post_id, int(post_id), meta) for post_id, meta in legacy.items())
+        logger.info(f"Imported {len(legacy)} metadata entries from {path}")
+
+    def __getitem__(self, post_id: str) -> Dict[str, Any]:
+        row = self._conn().execute("SELECT data FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+        if row is None:
+            raise KeyError(post_id)
+        return json.loads(row[0])
+
+    def __contains__(self, post_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM posts WHERE post_id = ?", (post_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def _tombstone(self, conn: sqlite3.Connection, rows: List[int]):
+        conn.executemany("INSERT OR IGNORE INTO deleted_rows (row) VALUES (?)", [(row,) for row in rows])
+        conn.executemany("DELETE FROM post_tags WHERE row = ?", [(row,) for row in rows])
+        conn.executemany("DELETE FROM posts_text WHERE rowid = ?", [(row,) for row in rows])
+        self._bump(conn, "tombstones")
+
+    @staticmethod
+    def _index_text(conn: sqlite3.Connection, rows: List[int]):
+        """(Re)index the caption and transcript of rows from what posts now holds."""
+        conn.executemany("DELETE FROM posts_text WHERE rowid = ?", [(row,) for row in rows])
+        conn.executemany(
+            "INSERT INTO posts_text (rowid, text, audio_text) "
+            "SELECT row, json_extract(data, '$.text'), json_extract(data, '$.audio_text') FROM posts WHERE row = ?",
+            [(row,) for row in rows]
+        )
+
+    def _backfill_text(self):
+        """Index the text of posts stored before the full-text index existed, once."""
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM counters WHERE name = 'text_indexed'").fetchone():
+            return
+        with conn:
+            # Another worker may be doing the same; the first to take the write lock wins
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM counters WHERE name = 'text_indexed'").fetchone():
+                return
+            conn.execute("DELETE FROM posts_text")
+            conn.execute(
+                "INSERT INTO posts_text (rowid, text, audio_text) "
+                "SELECT row, json_extract(data, '$.text'), json_extract(data, '$.audio_text') FROM posts"
+            )
+            conn.execute("INSERT INTO counters (name, value) VALUES ('text_indexed', 1)")
+        logger.info(f"Indexed the text of {len(self)} posts for full-text search")
+
+    @staticmethod
+    def _put_tags(conn: sqlite3.Connection, row: int, meta: Dict[str, Any]):
+        conn.execute("DELETE FROM post_tags WHERE row = ?", (row,))
+        conn.executemany("INSERT OR IGNORE INTO post_tags (tag, row) VALUES (?, ?)", [(tag, row) for tag in meta.get("tags") or []])
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, name: str):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL mode lets readers run alongside the writer
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,56 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterable
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+class VectorStore:
+    """
+    Full-precision float32 vectors on disk, one fixed-size row per FAISS row.
+
+    Compressed indexes keep only codes in RAM; their top candidates are re-scored
+    against these vectors, which stay in the OS page cache when hot. Rows are
+    written at their offset, so replaying the write-ahead log is idempotent.
+    Writes are fsynced by `sync()`, which the index snapshot calls before the
+    log is truncated.
+    """
+
+    def __init__(self, path: Path, dimension: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.row_bytes = dimension * 4
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return os.fstat(self._fd).st_size // self.row_bytes
+
+    def write(self, first_row: int, vectors: np.ndarray):
+        """Store vectors as rows first_row, first_row + 1, ..."""
+        data = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimension).tobytes()
+        with self._lock:
+            os.pwrite(self._fd, data, first_row * self.row_bytes)
+
+    def read(self, rows: Iterable[int]) -> np.ndarray:
+        """Vectors of the given rows, in order; an (N, dimension) array."""
+        rows = list(rows)
+        out = np.empty((len(rows), self.dimension), dtype=np.float32)
+        for i, row in enumerate(rows):
+            out[i] = np.frombuffer(os.pread(self._fd, self.row_bytes, int(row) * self.row_bytes), dtype=np.float32)
+        return out
+
+    def read_range(self, start: int, count: int) -> np.ndarray:
+        """`count` consecutive rows starting at `start`, in one read."""
+        data = os.pread(self._fd, count * self.row_bytes, start * self.row_bytes)
+        return np.frombuffer(data, dtype=np.float32).reshape(count, self.dimension).copy()
+
+    def sync(self):
+        os.fsync(self._fd)
+
+    def close(self):
+        os.close(self._fd)
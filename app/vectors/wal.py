@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+Record = Tuple[Dict[str, Any], np.ndarray]
+
+class WriteAheadLog:
+    """
+    Append-only log of (record, vector) entries.
+
+    Each entry is framed as `<payload length><crc32><payload>`, where the payload
+    holds a JSON header followed by the raw float32 vector. Appends are fsynced
+    once per batch. Replay stops at the first torn or corrupt entry (a crash
+    mid-write) and truncates the file back to the last good entry.
+    """
+
+    FRAME = struct.Struct("<II")
+    HEADER_LEN = struct.Struct("<I")
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+
+    def append(self, records: List[Record]):
+        """Append a batch of records and fsync once."""
+        buffer = bytearray()
+        for header, vector in records:
+            header_bytes = json.dumps(header).encode("utf-8")
+            payload = (
+                self.HEADER_LEN.pack(len(header_bytes))
+                + header_bytes
+                + np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            )
+            buffer += self.FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        self._file.write(buffer)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def replay(self) -> Iterator[Record]:
+        """Yield every intact record in append order."""
+        good_offset = 0
+        with open(self.path, "rb") as f:
+            while True:
+                frame = f.read(self.FRAME.size)
+                if len(frame) < self.FRAME.size:
+                    break
+                length, checksum = self.FRAME.unpack(frame)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+
+                (header_len,) = self.HEADER_LEN.unpack_from(payload)
+                start = self.HEADER_LEN.size
+                header = json.loads(payload[start:start + header_len])
+                vector = np.frombuffer(payload[start + header_len:], dtype=np.float32)
+                good_offset = f.tell()
+                yield header, vector
+
+        if good_offset < self.path.stat().st_size:
+            logger.warning(f"Discarding torn tail of {self.path} after byte {good_offset}")
+            os.truncate(self.path, good_offset)
+
+    def reset(self):
+        """Drop all records, e.g. once they are covered by a snapshot."""
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def size(self) -> int:
+        """Current log size in bytes."""
+        return self.path.stat().st_size
+
+    def close(self):
+        self._file.close()
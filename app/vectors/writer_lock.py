@@ -0,0 +1,70 @@
+import fcntl
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+class IndexLockedError(RuntimeError):
+    """Raised when another process already owns writes to an index."""
+
+# Lock files this process holds, so several clients in one process can share ownership
+_held: Dict[Path, int] = {}
+_held_lock = threading.Lock()
+
+def acquire_writer_lock(path: Path) -> bool:
+    """
+    Take the exclusive, non-blocking writer lock for an index.
+    Returns True if this process holds it (already or now), False if another process does.
+    The lock is released by the OS when the process exits, so a crashed writer frees it.
+    """
+    path = Path(path).resolve()
+    with _held_lock:
+        if path in _held:
+            return True
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        _held[path] = fd
+    logger.info(f"Process {os.getpid()} owns index writes ({path})")
+    return True
+
+def release_writer_lock(path: Path):
+    path = Path(path).resolve()
+    with _held_lock:
+        fd = _held.pop(path, None)
+    if fd is not None:
+        os.close(fd)  # Closing the descriptor drops the flock
+
+def register_reader(path: Path) -> int:
+    """
+    Mark this client as a reader of an index by holding a shared lock on `path`.
+    Returns the descriptor; closing it (or exiting) unregisters the reader.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    return fd
+
+def readers_present(path: Path) -> bool:
+    """True if any client, in this process or another, holds a reader registration on `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)  # Also drops the probe's exclusive lock if it was taken
+    return False
@@ -1,12 +1,31 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router as api_router
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.routes import router as api_router, services
 from app.core.config import settings
+from app.core.executor import stage_executor
+from app.core.metrics import metrics, server_timing
+
+request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm up this role's models in the background; /health/ready reports when done.
+    # Ingest roles then start the background workers that pick up queued and interrupted jobs.
+    await services.start()
+    yield
+    await services.stop()
+    stage_executor.shutdown()
 
 app = FastAPI(
     title="Social Media Post Classifier",
     description="API for classifying and searching social media posts using CLIP and Whisper",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -18,6 +37,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Time every request and, when asked, report per-stage spans in a Server-Timing header."""
+    started = time.perf_counter()
+    with metrics.collect_request_timings() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    request_seconds.observe(
+        elapsed,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    if settings.TIMING_HEADERS or request.headers.get("x-timing") == "1":
+        response.headers["Server-Timing"] = ", ".join(filter(None, [server_timing(timings), f"total;dur={elapsed * 1000:.1f}"]))
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """The process is up and serving HTTP, even while models load."""
+    return {"status": "alive"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """200 once this role's models are loaded and warmed up, else 503 with the loading state."""
+    status = services.status()
+    return JSONResponse(status_code=200 if status["state"] == "ready" else 503, content=status)
+
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
@@ -0,0 +1,514 @@
+"""
+Offline benchmark covering every pipeline stage: CLIP (per inference backend), frame extraction, Whisper,
+FAISS add/search and the HTTP routes end to end, at several corpus sizes, plus
+cold start of a fresh server process per service role.
+
+Runs on CPU with no network: synthetic posts are generated on the fly and, when
+pretrained weights are not cached locally, models fall back to random weights
+(recorded in the results, since Whisper decoding time depends on its weights).
+
+    python scripts/benchmark.py --scale small --output results.json
+    python scripts/benchmark.py --baseline results.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from synthetic_data import generate_captions, generate_images, generate_queries, generate_video, random_embeddings  # noqa: E402
+
+SCALES = {
+    "small": {"images": 32, "videos": 2, "video_seconds": 10, "queries": 100, "corpus_sizes": [1_000, 10_000]},
+    "medium": {"images": 128, "videos": 4, "video_seconds": 30, "queries": 500, "corpus_sizes": [10_000, 100_000]},
+    "large": {"images": 512, "videos": 8, "video_seconds": 60, "queries": 2_000, "corpus_sizes": [100_000, 1_000_000]},
+}
+BATCH = 32  # Items per batched encode / queries per batched search
+# Fields compared against the baseline, and whether higher values are better.
+# A metric can flip "value" by carrying "lower_is_better": True.
+COMPARED_FIELDS = {"p50_ms": False, "throughput_per_s": True, "value": True}
+
+# Timing helpers
+
+def summarize(latencies: List[float], items: Optional[int] = None, wall: Optional[float] = None) -> Dict[str, float]:
+    """Latency percentiles in ms, plus items/s over the wall time of the run."""
+    ms = np.asarray(latencies) * 1000
+    wall = wall if wall is not None else float(np.sum(latencies))
+    items = items if items is not None else len(latencies)
+    return {
+        "n": len(latencies),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "throughput_per_s": round(items / wall, 3) if wall else 0.0
+    }
+
+def time_calls(fn: Callable, inputs: List[Any]) -> List[float]:
+    latencies = []
+    for item in inputs:
+        started = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+async def time_async_calls(fn: Callable, inputs: List[Any]) -> List[float]:
+    latencies = []
+    for item in inputs:
+        started = time.perf_counter()
+        await fn(item)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def batches(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# Environment
+
+def configure_environment(workdir: Path, weights: str) -> Dict[str, str]:
+    """Point all on-disk state at `workdir`, force CPU and pick model weights. Must run before importing app."""
+    os.environ.update({
+        "USE_MPS": "false",
+        "SERVICE_ROLE": "all",
+        "FAISS_INDEX_PATH": str(workdir / "index" / "faiss_index"),
+        "TEMP_DIR": str(workdir / "temp"),
+        "JOB_QUEUE_PATH": str(workdir / "jobs.db"),
+        "JOB_DIR": str(workdir / "jobs"),
+        "CONTENT_CACHE_PATH": str(workdir / "content_cache.db"),
+        "HF_HUB_OFFLINE": "1"
+    })
+    from app.core.config import settings
+
+    resolved = {"clip": "pretrained", "whisper": "pretrained"}
+    if weights == "random" or (weights == "auto" and not clip_weights_cached(settings)):
+        os.environ["CLIP_MODEL_PRETRAINED"] = ""
+        settings.CLIP_MODEL_PRETRAINED = ""
+        resolved["clip"] = "random"
+    whisper_cache = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "whisper"
+    if weights == "random" or (weights == "auto" and not (whisper_cache / f"{settings.WHISPER_MODEL_SIZE}.pt").exists()):
+        use_random_whisper()
+        resolved["whisper"] = "random"
+    return resolved
+
+def clip_weights_cached(settings) -> bool:
+    import open_clip
+    try:
+        open_clip.create_model_and_transforms(settings.CLIP_MODEL_NAME, pretrained=settings.CLIP_MODEL_PRETRAINED)
+        return True
+    except Exception:
+        return False
+
+def use_random_whisper():
+    """Make whisper.load_model build a randomly initialized model of the requested size."""
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+    shapes = {"tiny": (384, 6, 4), "base": (512, 8, 6), "small": (768, 12, 12), "medium": (1024, 16, 24)}
+
+    def load_model(name, device=None, **kwargs):
+        state, heads, layers = shapes[name.split(".")[0]]
+        return Whisper(ModelDimensions(
+            n_mels=80, n_audio_ctx=1500, n_audio_state=state, n_audio_head=heads, n_audio_layer=layers,
+            n_vocab=51865 if not name.endswith(".en") else 51864, n_text_ctx=448,
+            n_text_state=state, n_text_head=heads, n_text_layer=layers
+        )).to(device or "cpu")
+
+    whisper.load_model = load_model
+
+def run_metadata(args, scale: Dict[str, Any], weights: Dict[str, str]) -> Dict[str, Any]:
+    import torch
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "config": scale,
+        "weights": weights
+    }
+
+# Benchmarks
+
+async def bench_clip(routes, images, queries) -> Dict[str, Any]:
+    from app.utils.helpers import load_image_from_path
+    clip = routes.services.clip
+    pil_images = [load_image_from_path(path) for path in images]
+    results = {}
+
+    results["clip.encode_text.single"] = summarize(time_calls(lambda q: clip.encode_texts([q]), queries))
+    text_batches = batches(queries, BATCH)
+    results[f"clip.encode_text.batch{BATCH}"] = summarize(
+        time_calls(clip.encode_texts, text_batches), items=len(queries)
+    )
+    results["clip.encode_image.single"] = summarize(time_calls(lambda i: clip.encode_images([i]), pil_images))
+    results[f"clip.encode_image.batch{BATCH}"] = summarize(
+        time_calls(clip.encode_images, batches(pil_images, BATCH)), items=len(pil_images)
+    )
+
+    # Concurrent single-query requests, coalesced by the inference scheduler when enabled
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(time_async_calls(clip.generate_text_embeddings, [[q]]) for q in queries))
+    results["clip.generate_text_embedding.concurrent"] = summarize(
+        [latency for (latency,) in latencies], wall=time.perf_counter() - started
+    )
+    clip.text_cache.clear()
+    return results
+
+def bench_clip_backends(routes, images, queries, names: List[str]) -> Dict[str, Any]:
+    """Encoder latency per CLIP backend, plus embedding and ranking agreement with fp32."""
+    import torch
+    from app.services.clip_backends import EagerBackend, check_accuracy, create_backend
+    from app.utils.helpers import load_image_from_path
+    clip = routes.services.clip
+    tensors = clip.preprocess_images([load_image_from_path(path) for path in images])
+    image_batches = [torch.stack(batch) for batch in batches(tensors, BATCH)]
+    query_tokens = [clip.tokenizer([q]) for q in queries]
+    # Accuracy on at most one batch of images and 256 queries keeps the check's memory bounded
+    check_tokens, check_images = clip.tokenizer(queries[:256]), image_batches[0]
+    reference = EagerBackend(clip.model, clip.device)
+    results = {}
+    for name in names:
+        try:
+            backend = create_backend(name, clip.model, clip.device, query_tokens[0], check_images[:2])
+        except (ImportError, ValueError) as e:
+            print(f"Skipping CLIP backend {name}: {e}")
+            continue
+        results[f"clip_backend.{name}.encode_text.single"] = summarize(time_calls(backend.encode_text, query_tokens))
+        results[f"clip_backend.{name}.encode_image.batch{BATCH}"] = summarize(
+            time_calls(backend.encode_image, image_batches), items=len(tensors)
+        )
+        accuracy = check_accuracy(reference, backend, check_tokens, check_images)
+        results[f"clip_backend.{name}.accuracy"] = {"value": accuracy["recall_at_k"], **accuracy}
+    return results
+
+async def bench_video(routes, videos, video_seconds) -> Dict[str, Any]:
+    """Fixed vs adaptive frame sampling: decode time, frames kept, CLIP time and how close the video embeddings stay."""
+    from app.core.config import settings
+    video_service, clip = routes.services.video, routes.services.clip
+    # A single-shot clip stands in for static talking-head videos
+    static = generate_video(videos[0].parent / "static.mp4", seconds=video_seconds, scenes=1, audio=False, seed=99)
+    clips = videos + [static]
+    results, embeddings = {}, {}
+    try:
+        for mode in ("fixed", "adaptive"):
+            video_service.sampling = mode
+            frames = []
+
+            async def extract(path):
+                frames.append(await video_service.extract_frames(path))
+
+            latencies = await time_async_calls(extract, clips)
+            kept = [len(video_frames) for video_frames in frames]
+            results[f"video.extract_frames[{mode}]"] = summarize(latencies)
+            results[f"video.extract_frames.realtime_factor[{mode}]"] = {
+                "value": round(video_seconds * len(clips) / sum(latencies), 3)
+            }
+            results[f"video.frames_per_video[{mode}]"] = {
+                "value": round(float(np.mean(kept)), 2), "static_video": kept[-1], "max": max(kept),
+                "lower_is_better": True
+            }
+
+            means = []
+
+            async def encode(video_frames):
+                means.append((await clip.encode_images_async(video_frames)).mean(axis=0))
+
+            results[f"video.encode_frames[{mode}]"] = summarize(
+                await time_async_calls(encode, [video_frames for video_frames in frames if video_frames]),
+                items=sum(kept)
+            )
+            embeddings[mode] = np.stack(means)
+    finally:
+        video_service.sampling = settings.FRAME_SAMPLING
+
+    # Cosine between each video's mean frame embedding under both modes
+    fixed, adaptive = (embeddings[mode] / np.linalg.norm(embeddings[mode], axis=1, keepdims=True) for mode in embeddings)
+    similarity = (fixed * adaptive).sum(axis=1)
+    results["video.adaptive_embedding_cosine"] = {
+        "value": round(float(similarity.mean()), 4), "min": round(float(similarity.min()), 4)
+    }
+    return results
+
+async def bench_whisper(routes, videos, video_seconds) -> Dict[str, Any]:
+    latencies = await time_async_calls(routes.services.whisper.transcribe, videos)
+    return {
+        "whisper.transcribe": summarize(latencies),
+        "whisper.transcribe.realtime_factor": {"value": round(video_seconds * len(videos) / sum(latencies), 3)}
+    }
+
+async def bench_faiss(workdir: Path, corpus_sizes: List[int], n_queries: int) -> Dict[str, Any]:
+    from app.vectors.faiss_client import FAISSClient
+    client = FAISSClient(workdir / "faiss_bench" / "faiss_index")
+    queries = random_embeddings(n_queries, seed=1)
+    # Keyword queries, plus a few exact hashtags and handles
+    text_queries = generate_queries(n_queries, seed=2)
+    text_queries[::5] = [f"@user{i}" if i % 2 else f"#sunset{i}" for i in range(len(text_queries[::5]))]
+    results = {}
+    for size in corpus_sizes:
+        # Grow the corpus in bulk batches up to this size
+        vectors = random_embeddings(size - client.index.ntotal, seed=size)
+        captions = generate_captions(len(vectors), seed=size)
+        started = time.perf_counter()
+        latencies = await time_async_calls(
+            lambda start: client.add_posts(
+                list(vectors[start:start + 1000]),
+                [{"has_image": True, "text": text} for text in captions[start:start + 1000]]
+            ),
+            list(range(0, len(vectors), 1000))
+        )
+        results[f"faiss.add_posts[{size}]"] = summarize(latencies, items=len(vectors), wall=time.perf_counter() - started)
+
+        results[f"faiss.search[{size}]"] = summarize(
+            await time_async_calls(lambda q: client.search(q[None, :], 10), list(queries))
+        )
+        results[f"faiss.search.filtered[{size}]"] = summarize(
+            await time_async_calls(lambda q: client.search(q[None, :], 10, {"has_image": True}), list(queries))
+        )
+        # BM25 over captions, the keyword half of hybrid search
+        results[f"faiss.lexical_search[{size}]"] = summarize(
+            await time_async_calls(lambda q: client.lexical_search(q, 10), text_queries)
+        )
+        query_batches = [queries[i:i + BATCH] for i in range(0, n_queries, BATCH)]
+        results[f"faiss.search_batch{BATCH}[{size}]"] = summarize(
+            await time_async_calls(
+                lambda batch: client.search_batch(batch, [10] * len(batch), [None] * len(batch)), query_batches
+            ),
+            items=n_queries
+        )
+
+        # Single inserts pay for a log append + fsync each
+        singles = random_embeddings(min(100, n_queries), seed=size + 1)
+        results[f"faiss.add_post[{size}]"] = summarize(
+            await time_async_calls(lambda v: client.add_post(v[None, :], {"has_image": True}), list(singles))
+        )
+    client.snapshot()
+    return results
+
+async def fill_index(client, vectors: np.ndarray):
+    for start in range(0, len(vectors), 1000):
+        chunk = vectors[start:start + 1000]
+        await client.add_posts(list(chunk), [{"has_image": True}] * len(chunk))
+
+def bench_routes(routes, app, images, videos, queries, corpus_sizes) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+    results = {}
+    with TestClient(app) as client:
+        while client.get("/health/ready").status_code != 200:
+            time.sleep(0.1)
+        for size in corpus_sizes:
+            missing = size - routes.services.faiss.index.ntotal
+            if missing > 0:
+                asyncio.run(fill_index(routes.services.faiss, random_embeddings(missing, seed=size + 2)))
+
+            def search(query):
+                response = client.get("/api/search", params={"query": query, "limit": 10})
+                response.raise_for_status()
+
+            results[f"api.search[{size}]"] = summarize(time_calls(search, [f"{q} {size}" for q in queries]))
+            # Same queries again are served from the query and result caches until the index changes
+            results[f"api.search.cached[{size}]"] = summarize(time_calls(search, [f"{q} {size}" for q in queries]))
+
+            def search_hybrid(query):
+                response = client.get("/api/search", params={"query": query, "limit": 10, "mode": "hybrid"})
+                response.raise_for_status()
+
+            results[f"api.search.hybrid[{size}]"] = summarize(time_calls(search_hybrid, [f"{q} hybrid {size}" for q in queries]))
+
+            def search_batch(batch):
+                response = client.post("/api/search/batch", json={"queries": [{"query": q, "limit": 10} for q in batch]})
+                response.raise_for_status()
+
+            results[f"api.search_batch{BATCH}[{size}]"] = summarize(
+                time_calls(search_batch, batches([f"{q} batch {size}" for q in queries], BATCH)), items=len(queries)
+            )
+
+            def classify_image(path):
+                with open(path, "rb") as f:
+                    payload = f.read()
+                response = client.post(
+                    "/api/classify",
+                    files=[("images", (path.name, io.BytesIO(payload), "image/jpeg"))],
+                    data={"text": f"benchmark post {path.stem} {size}"}
+                )
+                response.raise_for_status()
+
+            # Fresh images per corpus size so the content cache does not short-circuit inference
+            results[f"api.classify.image[{size}]"] = summarize(
+                time_calls(classify_image, generate_images(images[0].parent / f"api_{size}", len(images), seed=size))
+            )
+
+        def classify_video(path):
+            with open(path, "rb") as f:
+                response = client.post("/api/classify", files=[("videos", (path.name, f, "video/mp4"))])
+            response.raise_for_status()
+
+        results["api.classify.video"] = summarize(time_calls(classify_video, videos))
+    return results
+
+def bench_startup(weights: Dict[str, str], roles: List[str], runs: int = 3) -> Dict[str, Any]:
+    """Cold start of a fresh process per role: app import, then lifespan until ready (load + warm-up)."""
+    command = [sys.executable, str(Path(__file__).resolve()), "--startup-probe"]
+    if weights["whisper"] == "random":
+        command.append("--random-whisper")
+    results = {}
+    for role in roles:
+        probes = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = subprocess.run(
+                command, env={**os.environ, "SERVICE_ROLE": role}, capture_output=True, text=True, check=True
+            ).stdout
+            probe = json.loads(output.strip().splitlines()[-1])
+            probe["process"] = time.perf_counter() - started
+            probes.append(probe)
+        for phase in ("import", "ready", "process"):
+            results[f"startup.{role}.{phase}"] = summarize([probe[phase] for probe in probes])
+    return results
+
+def startup_probe(random_whisper: bool):
+    """Child side of bench_startup: print import and time-to-ready in seconds as one JSON line."""
+    if random_whisper:
+        use_random_whisper()
+    started = time.perf_counter()
+    from main import app
+    from app.api.routes import services
+    imported = time.perf_counter() - started
+
+    async def start():
+        async with app.router.lifespan_context(app):
+            await services.wait_ready()
+            if services.state != "ready":
+                raise RuntimeError(f"Startup failed: {services.error}")
+            return time.perf_counter() - started
+
+    ready = asyncio.run(start())
+    print(json.dumps({"import": imported, "ready": ready}))
+
+# Baseline comparison
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print current vs baseline per metric; return the metrics that regressed beyond `tolerance`."""
+    if baseline["meta"].get("weights") != results["meta"].get("weights"):
+        print("Warning: baseline was measured with different model weights; comparisons may not be meaningful")
+    regressions = []
+    print(f"{'metric':<52}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, current in sorted(results["results"].items()):
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        for field, higher_is_better in COMPARED_FIELDS.items():
+            if field not in current or not previous.get(field):
+                continue
+            if field == "value" and current.get("lower_is_better"):
+                higher_is_better = False
+            change = current[field] / previous[field] - 1
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(f"{name + ' ' + field:<52}{previous[field]:>12.3f}{current[field]:>12.3f}{change:>+9.1%}{flag}")
+            if worse:
+                regressions.append(f"{name} {field}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of every pipeline stage")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--images", type=int, help="Override the number of synthetic images")
+    parser.add_argument("--videos", type=int, help="Override the number of synthetic videos")
+    parser.add_argument("--video-seconds", type=int, help="Override synthetic video length")
+    parser.add_argument("--queries", type=int, help="Override the number of queries")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", help="Override the index sizes to search at")
+    parser.add_argument("--stages", nargs="+", default=["startup", "clip", "clip_backends", "video", "whisper", "faiss", "api"],
+                        help="Subset of startup, clip, clip_backends, video, whisper, faiss, api")
+    parser.add_argument("--clip-backends", nargs="+", default=["eager", "int8", "torchscript", "onnx"],
+                        help="CLIP backends compared by the clip_backends stage")
+    parser.add_argument("--startup-roles", nargs="+", default=["search", "all"],
+                        help="Service roles whose cold start is measured")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--random-whisper", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--weights", choices=["auto", "pretrained", "random"], default="auto",
+                        help="auto uses cached pretrained weights and falls back to random ones")
+    parser.add_argument("--workdir", type=str, help="Where to put synthetic data and indexes (default: a temp dir)")
+    parser.add_argument("--output", type=str, default="benchmark_results.json")
+    parser.add_argument("--baseline", type=str, help="Results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative change that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if any metric regressed")
+    args = parser.parse_args()
+    if args.startup_probe:
+        # Environment was configured by the parent benchmark process
+        startup_probe(args.random_whisper)
+        return
+
+    scale = dict(SCALES[args.scale])
+    for key in ("images", "videos", "video_seconds", "queries", "corpus_sizes"):
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    scale["corpus_sizes"] = sorted(scale["corpus_sizes"])
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="benchmark-"))
+    weights = configure_environment(workdir, args.weights)
+    from app.api import routes
+    from main import app
+
+    print(f"Generating synthetic data in {workdir}")
+    images = generate_images(workdir / "images", scale["images"])
+    videos = [
+        generate_video(workdir / "videos" / f"video_{i:03d}.mp4", seconds=scale["video_seconds"], seed=i)
+        for i in range(scale["videos"])
+    ]
+    queries = generate_queries(scale["queries"])
+
+    results: Dict[str, Any] = {}
+    if "startup" in args.stages:
+        print(f"Benchmarking cold start ({', '.join(args.startup_roles)})")
+        results.update(bench_startup(weights, args.startup_roles))
+    if "clip" in args.stages:
+        print("Benchmarking CLIP")
+        results.update(asyncio.run(bench_clip(routes, images, queries)))
+    if "clip_backends" in args.stages:
+        print(f"Benchmarking CLIP backends ({', '.join(args.clip_backends)})")
+        results.update(bench_clip_backends(routes, images, queries, args.clip_backends))
+    if "video" in args.stages:
+        print("Benchmarking frame extraction")
+        results.update(asyncio.run(bench_video(routes, videos, scale["video_seconds"])))
+    if "whisper" in args.stages:
+        print("Benchmarking transcription")
+        results.update(asyncio.run(bench_whisper(routes, videos, scale["video_seconds"])))
+    if "faiss" in args.stages:
+        print("Benchmarking FAISS")
+        results.update(asyncio.run(bench_faiss(workdir, scale["corpus_sizes"], scale["queries"])))
+    if "api" in args.stages:
+        print("Benchmarking routes end to end")
+        results.update(bench_routes(routes, app, images, videos, queries, scale["corpus_sizes"]))
+
+    report = {"meta": run_metadata(args, scale, weights), "results": results}
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"Wrote {len(results)} metrics to {args.output}")
+
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
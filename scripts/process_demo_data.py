@@ -1,59 +1,23 @@
 import asyncio
 import argparse
 from pathlib import Path
+from app.services.bulk_indexer import BulkIndexer
 from app.services.clip_service import CLIPService
+from app.services.tagging_service import TaggingService
 from app.services.whisper_service import WhisperService
 from app.services.video_service import VideoService
 from app.vectors.faiss_client import FAISSClient
-from app.utils.helpers import load_image_from_upload
-from fastapi import UploadFile
-import json
-
-async def process_post(
-    image_path: Path = None,
-    video_path: Path = None,
-    text: str = None,
-    clip_service: CLIPService = None,
-    whisper_service: WhisperService = None,
-    video_service: VideoService = None,
-    faiss_client: FAISSClient = None
-):
-    """Process a single post and add it to the index."""
-    # Process video if provided
-    video_frames = []
-    audio_text = None
-    if video_path:
-        with open(video_path, "rb") as f:
-            video_file = UploadFile(filename=video_path.name, file=f)
-            video_frames = await video_service.extract_frames(video_file)
-            audio_text = await whisper_service.transcribe(video_file)
-
-    # Process image if provided
-    image = None
-    if image_path:
-        with open(image_path, "rb") as f:
-            image = UploadFile(filename=image_path.name, file=f)
-
-    # Generate embeddings
-    embeddings = await clip_service.generate_embeddings(
-        image=image,
-        video_frames=video_frames,
-        text=text or audio_text
-    )
-
-    # Store in FAISS
-    post_id = await faiss_client.add_post(embeddings, {
-        "text": text,
-        "audio_text": audio_text,
-        "has_image": bool(image),
-        "has_video": bool(video_path)
-    })
-
-    return post_id
 
 async def main():
     parser = argparse.ArgumentParser(description="Process demo data for social media post classifier")
-    parser.add_argument("--data-dir", type=str, required=True, help="Directory containing demo data")
+    parser.add_argument("--data-dir", type=str, required=True, help="Directory containing demo data (one sub-directory per post)")
+    parser.add_argument("--decode-workers", type=int, default=4, help="Threads reading images and decoding videos")
+    parser.add_argument("--transcribe-workers", type=int, default=1, help="Videos transcribed at once (each uses WHISPER_WORKERS replicas)")
+    parser.add_argument("--queue-size", type=int, default=32, help="Posts buffered between stages")
+    parser.add_argument("--index-batch-size", type=int, default=256, help="Posts per index insert")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress reports")
+    parser.add_argument("--no-transcribe", action="store_true", help="Skip audio transcription")
+    parser.add_argument("--no-tags", action="store_true", help="Skip zero-shot tagging")
     args = parser.parse_args()
 
     data_dir = Path(args.data_dir)
@@ -62,43 +26,25 @@ async def main():
 
     # Initialize services
     clip_service = CLIPService()
-    whisper_service = WhisperService()
-    video_service = VideoService()
-    faiss_client = FAISSClient()
-
-    # Process all posts in the data directory
-    for post_dir in data_dir.iterdir():
-        if not post_dir.is_dir():
-            continue
-
-        print(f"Processing post in {post_dir}")
-        
-        # Load post metadata
-        metadata_path = post_dir / "metadata.json"
-        if metadata_path.exists():
-            with open(metadata_path) as f:
-                metadata = json.load(f)
-        else:
-            metadata = {}
-
-        # Process post
-        image_path = next(post_dir.glob("*.jpg"), None)
-        video_path = next(post_dir.glob("*.mp4"), None)
-        text = metadata.get("text")
+    indexer = BulkIndexer(
+        clip_service=clip_service,
+        whisper_service=None if args.no_transcribe else WhisperService(),
+        video_service=VideoService(),
+        faiss_client=FAISSClient(),
+        decode_workers=args.decode_workers,
+        transcribe_workers=args.transcribe_workers,
+        queue_size=args.queue_size,
+        index_batch_size=args.index_batch_size,
+        report_interval=args.report_interval,
+        tagging_service=None if args.no_tags else TaggingService(clip_service)
+    )
 
-        try:
-            post_id = await process_post(
-                image_path=image_path,
-                video_path=video_path,
-                text=text,
-                clip_service=clip_service,
-                whisper_service=whisper_service,
-                video_service=video_service,
-                faiss_client=faiss_client
-            )
-            print(f"Successfully processed post {post_id}")
-        except Exception as e:
-            print(f"Error processing post in {post_dir}: {e}")
+    # Process all posts in the data directory; rerunning resumes where an interrupted run stopped
+    summary = await indexer.run(data_dir)
+    print(f"Indexed {summary['indexed']} posts in {summary['seconds']:.1f}s "
+          f"({summary['already_indexed']} already indexed, {summary['failed']} failed)")
+    for source, stage, error in indexer.failures:
+        print(f"Error processing post in {data_dir / source} ({stage}): {error}")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""Synthetic posts for offline benchmarks: images, videos with audio tracks, captions and queries."""
+import subprocess
+import wave
+from pathlib import Path
+from typing import List
+import cv2
+import numpy as np
+from PIL import Image
+
+SAMPLE_RATE = 16000
+QUERY_WORDS = [
+    "sunset", "beach", "dog", "cat", "city", "night", "food", "pizza", "mountain", "hike",
+    "concert", "music", "friends", "party", "coffee", "morning", "snow", "forest", "car", "travel",
+    "wedding", "football", "art", "street", "rain", "flowers", "ocean", "selfie", "birthday", "gym"
+]
+
+def generate_images(directory: Path, count: int, size: int = 512, seed: int = 0) -> List[Path]:
+    """Random colored shapes on a gradient, saved as JPEGs."""
+    rng = np.random.default_rng(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    yy, xx = np.mgrid[0:size, 0:size]
+    for i in range(count):
+        base = rng.integers(0, 256, 3)
+        image = (base + (xx[..., None] * rng.uniform(-0.3, 0.3, 3))).clip(0, 255).astype(np.uint8)
+        for _ in range(rng.integers(3, 8)):
+            center = tuple(int(c) for c in rng.integers(0, size, 2))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.circle(image, center, int(rng.integers(size // 16, size // 4)), color, -1)
+        path = directory / f"image_{i:05d}.jpg"
+        Image.fromarray(image).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def speech_like_audio(seconds: float, seed: int = 0, speech_ratio: float = 0.6) -> np.ndarray:
+    """Voiced bursts (harmonic, amplitude-modulated) separated by near-silence."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0, 0.001, n).astype(np.float32)
+    position = 0
+    while position < n:
+        burst = int(rng.uniform(0.5, 3.0) * SAMPLE_RATE)
+        pause = int(burst * (1 - speech_ratio) / speech_ratio)
+        end = min(n, position + burst)
+        t = np.arange(end - position) / SAMPLE_RATE
+        pitch = rng.uniform(100, 250)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+        audio[position:end] += (0.2 * voiced * envelope).astype(np.float32)
+        position = end + pause
+    return audio
+
+def generate_video(
+    path: Path,
+    seconds: float = 10.0,
+    fps: int = 30,
+    size: int = 320,
+    scenes: int = 4,
+    audio: bool = True,
+    seed: int = 0
+) -> Path:
+    """
+    An H.264 MP4 made of `scenes` visually distinct shots with slow motion inside each,
+    muxed with a speech-like AAC track. Requires ffmpeg on PATH (Whisper needs it anyway).
+    """
+    rng = np.random.default_rng(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n_frames = int(seconds * fps)
+    scene_starts = np.sort(rng.choice(np.arange(1, n_frames), scenes - 1, replace=False)) if scenes > 1 else []
+    backgrounds = rng.integers(0, 256, (scenes, 3))
+    yy, xx = np.mgrid[0:size, 0:size]
+
+    raw_video = path.with_suffix(".raw.mp4")
+    writer = cv2.VideoWriter(str(raw_video), cv2.VideoWriter_fourcc(*"mp4v"), fps, (size, size))
+    try:
+        for i in range(n_frames):
+            scene = int(np.searchsorted(scene_starts, i, side="right"))
+            # A moving stripe keeps consecutive frames slightly different within a shot
+            frame = np.empty((size, size, 3), np.uint8)
+            frame[:] = backgrounds[scene]
+            stripe = ((xx + yy + 2 * i) // (size // 8)) % 2 == 0
+            frame[stripe] = 255 - backgrounds[scene]
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-i", str(raw_video)]
+    wav_path = path.with_suffix(".wav")
+    if audio:
+        samples = (speech_like_audio(seconds, seed).clip(-1, 1) * 32767).astype(np.int16)
+        with wave.open(str(wav_path), "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(samples.tobytes())
+        command += ["-i", str(wav_path), "-c:a", "aac"]
+    command += ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", str(path)]
+    try:
+        subprocess.run(command, check=True)
+    finally:
+        raw_video.unlink(missing_ok=True)
+        wav_path.unlink(missing_ok=True)
+    return path
+
+def generate_queries(count: int, seed: int = 0) -> List[str]:
+    """Short keyword queries of one to four words."""
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(QUERY_WORDS, rng.integers(1, 5), replace=False)) for _ in range(count)]
+
+def generate_captions(count: int, seed: int = 0) -> List[str]:
+    """
+    Captions mixing query words with filler, so keyword matches are spread across the corpus.
+    About one in ten also carries a rare hashtag or handle, the kind of term exact-match search is for.
+    """
+    rng = np.random.default_rng(seed)
+    filler = ["the", "with", "and", "today", "best", "so", "my", "at", "great", "day"]
+    captions = []
+    for i in range(count):
+        words = list(rng.choice(QUERY_WORDS, rng.integers(1, 4), replace=False)) + list(rng.choice(filler, 3))
+        rng.shuffle(words)
+        if rng.random() < 0.1:
+            words.append(f"#{rng.choice(QUERY_WORDS)}{i % 997}" if rng.random() < 0.5 else f"@user{i % 1009}")
+        captions.append(" ".join(words))
+    return captions
+
+def random_embeddings(count: int, dim: int = 512, seed: int = 0) -> np.ndarray:
+    """Unit-norm float32 vectors standing in for post embeddings."""
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
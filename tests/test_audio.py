@@ -0,0 +1,31 @@
+import numpy as np
+from app.utils.audio import SAMPLE_RATE, chunk_segments, join_spans, speech_segments
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+def test_speech_segments_skip_silence_and_bridge_short_pauses():
+    """Long silences split regions, short pauses do not."""
+    audio = np.concatenate([silence(2), tone(1), silence(0.2), tone(1), silence(3), tone(0.5), silence(1)])
+
+    segments = speech_segments(audio, threshold_db=-45, padding_ms=0)
+
+    assert len(segments) == 2
+    (first_start, first_end), (second_start, second_end) = segments
+    assert abs(first_start / SAMPLE_RATE - 2.0) < 0.05
+    assert abs(first_end / SAMPLE_RATE - 4.2) < 0.05
+    assert abs((second_end - second_start) / SAMPLE_RATE - 0.5) < 0.05
+
+def test_chunk_segments_packs_and_splits():
+    """Segments share a chunk without the silence between them, and long ones are split at the limit."""
+    chunks = chunk_segments([(0, 10), (15, 25), (40, 105), (200, 205)], max_samples=30)
+
+    assert chunks == [[(0, 10), (15, 25)], [(40, 70)], [(70, 100)], [(100, 105), (200, 205)]]
+    assert all(sum(end - start for start, end in chunk) <= 30 for chunk in chunks)
+
+    audio = np.arange(30, dtype=np.float32)
+    assert join_spans(audio, chunks[0]).tolist() == list(range(10)) + list(range(15, 25))
@@ -0,0 +1,96 @@
+import json
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from app.services.bulk_indexer import BulkIndexer
+from app.vectors.faiss_client import FAISSClient
+
+DIM = 512
+
+class FakeCLIP:
+    """Deterministic stand-in for CLIPService's batch encoding methods."""
+
+    def __init__(self):
+        self.image_batches = []
+
+    def preprocess_images(self, images):
+        return [np.asarray(image, dtype=np.float32).mean() for image in images]
+
+    def encode_image_tensors(self, tensors):
+        self.image_batches.append(len(tensors))
+        time.sleep(0.01)  # Like a real forward pass, long enough for decoded posts to queue up
+        return np.stack([np.full(DIM, t, dtype=np.float32) for t in tensors])
+
+    def encode_texts(self, texts):
+        return np.stack([np.full(DIM, -len(t), dtype=np.float32) for t in texts])
+
+class FakeVideo:
+    def read_frames(self, path):
+        raise ValueError("no videos in this test")
+
+def make_posts(root, count, broken=()):
+    for i in range(count):
+        post_dir = root / f"post{i:03d}"
+        post_dir.mkdir(parents=True)
+        (post_dir / "metadata.json").write_text(json.dumps({"text": f"post {i}", "tags": ["demo"]}))
+        if i in broken:
+            (post_dir / "image.jpg").write_bytes(b"not an image")
+        elif i % 2:
+            Image.new("RGB", (8, 8), (i, i, i)).save(post_dir / "image.jpg")
+
+@pytest.mark.asyncio
+async def test_bulk_index_batches_and_resumes(tmp_path):
+    data_dir = tmp_path / "posts"
+    make_posts(data_dir, 20, broken={7})
+    clip = FakeCLIP()
+
+    def indexer():
+        return BulkIndexer(clip, None, FakeVideo(), FAISSClient(tmp_path / "index"),
+                           decode_workers=3, queue_size=4, index_batch_size=8)
+
+    first = indexer()
+    summary = await first.run(data_dir)
+    assert summary["indexed"] == 19 and summary["failed"] == 1
+    assert [source for source, _, _ in first.failures] == ["post007"]
+    assert max(clip.image_batches) > 1  # Images from several posts share an encoder pass
+
+    # Saved once at the end: nothing left in the log, everything in the snapshot
+    client = FAISSClient(tmp_path / "index")
+    assert client.index.ntotal == 19 and client.wal.size() == 0
+    assert client.metadata.values("source") == {f"post{i:03d}" for i in range(20) if i != 7}
+
+    # A rerun only picks up what is missing
+    (data_dir / "post007" / "image.jpg").unlink()
+    second = indexer()
+    summary = await second.run(data_dir)
+    assert summary["already_indexed"] == 19 and summary["indexed"] == 1
+    assert FAISSClient(tmp_path / "index").index.ntotal == 20
+
+class FakeWhisper:
+    def load_audio(self, path):
+        return np.zeros(0 if "silent" in path.name else 4, dtype=np.float32)
+
+    def transcribe_audio(self, audio):
+        return f"speech {len(audio)}" if len(audio) else ""
+
+class FramesVideo:
+    def read_frames(self, path):
+        return [Image.new("RGB", (8, 8), (9, 9, 9))]
+
+@pytest.mark.asyncio
+async def test_bad_metadata_fails_only_its_post_and_every_video_is_transcribed(tmp_path):
+    data_dir = tmp_path / "posts"
+    make_posts(data_dir, 3)
+    (data_dir / "post001" / "metadata.json").write_text(json.dumps({"text": "bad", "created_at": 123}))
+    for name in ("a.mp4", "b_silent.mp4", "c.mp4"):
+        (data_dir / "post002" / name).write_bytes(b"")
+
+    indexer = BulkIndexer(FakeCLIP(), FakeWhisper(), FramesVideo(), FAISSClient(tmp_path / "index"))
+    summary = await indexer.run(data_dir)
+    assert summary["indexed"] == 2 and summary["failed"] == 1
+    assert [(source, stage) for source, stage, _ in indexer.failures] == [("post001", "decode")]
+
+    client = FAISSClient(tmp_path / "index")
+    audio_texts = {m["source"]: m["audio_text"] for _, m in client.metadata.get_by_rows(range(2)).values()}
+    assert audio_texts == {"post000": None, "post002": "speech 4 speech 4"}
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from app.services.search_service import SearchService
+from app.utils.cache import LRUCache
+from app.vectors.faiss_client import FAISSClient
+
+def test_lru_cache_evicts_by_count_and_bytes():
+    """The least recently used entries go first when either bound is exceeded."""
+    cache = LRUCache(max_items=3, max_bytes=100, size_of=len)
+    cache.put("a", "x" * 40)
+    cache.put("b", "x" * 40)
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", "x" * 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 80
+
+def test_lru_cache_expires_entries(monkeypatch):
+    """Entries older than the TTL count as misses."""
+    now = [100.0]
+    monkeypatch.setattr("app.utils.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(max_items=10, ttl=5)
+    cache.put("q", 1)
+    now[0] += 6
+
+    assert cache.get("q") is None
+    assert cache.stats()["misses"] == 1
+
+class FakeCLIPService:
+    def __init__(self):
+        self.text_cache = LRUCache(max_items=10)
+        self.encoded = []
+
+    async def generate_text_embeddings(self, texts):
+        self.encoded.extend(texts)
+        return np.ones((len(texts), 512), dtype=np.float32)
+
+@pytest.mark.asyncio
+async def test_result_cache_is_invalidated_by_inserts(tmp_path):
+    """Repeated searches hit the cache until the index generation changes."""
+    faiss_client = FAISSClient(index_path=tmp_path / "faiss_index")
+    clip_service = FakeCLIPService()
+    search_service = SearchService(clip_service, faiss_client)
+
+    assert await search_service.search("Sunset ", 5) == []
+    assert await search_service.search("sunset", 5) == []
+    assert clip_service.encoded == ["Sunset "]
+
+    await faiss_client.add_post(np.ones(512, dtype=np.float32) / np.sqrt(512), {"text": "sunset"})
+    results = await search_service.search("sunset", 5)
+
+    assert [r["id"] for r in results] == ["0"]
+    assert search_service.stats()["search_results"]["hits"] == 1
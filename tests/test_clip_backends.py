@@ -0,0 +1,33 @@
+import pytest
+import torch
+from app.services.clip_backends import EagerBackend, check_accuracy, create_backend
+
+class TinyCLIP(torch.nn.Module):
+    """Two Linear towers with open_clip's encode_text/encode_image interface."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.embed = torch.nn.Embedding(100, 32)
+        self.text = torch.nn.Sequential(torch.nn.Linear(32, 64), torch.nn.GELU(), torch.nn.Linear(64, 16))
+        self.image = torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(3 * 8 * 8, 64), torch.nn.GELU(), torch.nn.Linear(64, 16))
+
+    def encode_text(self, tokens):
+        return self.text(self.embed(tokens).mean(dim=1))
+
+    def encode_image(self, images):
+        return self.image(images)
+
+@pytest.mark.parametrize("name", ["int8", "torchscript"])
+def test_backend_matches_fp32_reference(name):
+    model = TinyCLIP().eval()
+    tokens = torch.randint(0, 100, (12, 5))
+    images = torch.randn(8, 3, 8, 8)
+    backend = create_backend(name, model, "cpu", tokens[:2], images[:2])
+
+    assert backend.encode_text(tokens).shape == (12, 16)  # Any batch size, not just the example's
+    accuracy = check_accuracy(EagerBackend(model, "cpu"), backend, tokens, images, k=3)
+    assert accuracy["min_cosine"] > 0.99
+    assert accuracy["recall_at_k"] > 0.8
+    with pytest.raises(ValueError):
+        create_backend("tensorrt", model, "cpu", tokens, images)
@@ -0,0 +1,43 @@
+import pytest
+from app.core.config import settings
+from app.services import clip_service
+from app.services.container import ServiceContainer
+
+class FakeCLIP:
+    def __init__(self):
+        self.warmed_up = False
+
+    def encode_texts(self, texts):
+        self.warmed_up = True
+
+class BrokenCLIP:
+    def __init__(self):
+        raise RuntimeError("weights not found")
+
+@pytest.mark.asyncio
+async def test_search_role_loads_and_warms_only_what_it_serves(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FAISS_INDEX_PATH", tmp_path / "faiss_index")
+    monkeypatch.setattr(clip_service, "CLIPService", FakeCLIP)
+    services = ServiceContainer("search")
+    assert services.status()["loaded"] == []  # Nothing is created until started or used
+
+    await services.start()
+    await services.wait_ready()
+    assert services.state == "ready"
+    assert services.status()["loaded"] == ["clip", "faiss", "search"]
+    assert services.clip.warmed_up
+    assert services.serves("search") and not services.serves("ingest")
+    await services.stop()
+
+@pytest.mark.asyncio
+async def test_failed_load_is_reported_not_raised(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FAISS_INDEX_PATH", tmp_path / "faiss_index")
+    monkeypatch.setattr(clip_service, "CLIPService", BrokenCLIP)
+    services = ServiceContainer("search")
+
+    await services.start()
+    await services.wait_ready()
+    assert services.state == "failed"
+    assert services.error == "weights not found"
+    with pytest.raises(ValueError):
+        ServiceContainer("gpu")
@@ -0,0 +1,19 @@
+import json
+import numpy as np
+import pytest
+from app.utils.helpers import EMBEDDING_FORMATS, decode_embedding, encode_embedding
+
+def test_formats_round_trip_and_shrink_the_payload():
+    vector = np.random.default_rng(0).standard_normal((1, 512)).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    sizes = {}
+    for embedding_format in EMBEDDING_FORMATS:
+        encoded = encode_embedding(vector, embedding_format)
+        sizes[embedding_format] = len(json.dumps(encoded))
+        decoded = decode_embedding(json.loads(json.dumps(encoded)), embedding_format)
+        tolerance = 1e-3 if embedding_format == "float16" else 0
+        np.testing.assert_allclose(decoded, vector.ravel(), atol=tolerance)
+
+    assert sizes["float16"] < sizes["npy"] < sizes["json"] / 3
+    with pytest.raises(ValueError):
+        encode_embedding(vector, "msgpack")
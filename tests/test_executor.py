@@ -0,0 +1,22 @@
+import asyncio
+import threading
+import pytest
+from app.core.executor import StageExecutor, StageSaturatedError
+
+@pytest.mark.asyncio
+async def test_saturated_stage_rejects_new_work():
+    """Calls beyond workers + queue limit fail fast instead of queueing."""
+    executor = StageExecutor(workers={"whisper": 1}, queue_limits={"whisper": 1})
+    release = threading.Event()
+
+    running = [asyncio.ensure_future(executor.run("whisper", release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(StageSaturatedError):
+        await executor.run("whisper", lambda: None)
+
+    release.set()
+    await asyncio.gather(*running)
+    assert await executor.run("whisper", lambda: "ok") == "ok"
+    assert executor.stats()["whisper"]["in_flight"] == 0
+    executor.shutdown()
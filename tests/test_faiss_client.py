@@ -0,0 +1,240 @@
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from pydantic import ValidationError
+from app.core.config import settings
+from app.models.schemas import SearchFilters
+from app.vectors.faiss_client import FAISSClient
+from app.vectors.writer_lock import IndexLockedError, acquire_writer_lock, release_writer_lock
+
+def random_embedding(seed: int) -> np.ndarray:
+    vec = np.random.default_rng(seed).random(512).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+@pytest.mark.asyncio
+async def test_inserts_survive_restart_via_log_replay(tmp_path):
+    """Posts added since the last snapshot are recovered from the write-ahead log."""
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    post_ids = [await client.add_post(random_embedding(i), {"text": f"post {i}"}) for i in range(3)]
+    client.wal.close()
+
+    reopened = FAISSClient(index_path=tmp_path / "faiss_index")
+
+    assert reopened.index.ntotal == 3
+    assert reopened.metadata[post_ids[2]] == {"text": "post 2"}
+    results = await reopened.search(random_embedding(1), limit=1)
+    assert results[0]["id"] == post_ids[1]
+
+@pytest.mark.asyncio
+async def test_snapshot_truncates_log_and_torn_tail_is_ignored(tmp_path):
+    """A snapshot empties the log, and a partially written record is dropped on replay."""
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    await client.add_posts([random_embedding(i) for i in range(2)], [{"text": "a"}, {"text": "b"}])
+    client.snapshot()
+    assert client.wal.size() == 0
+
+    await client.add_post(random_embedding(2), {"text": "c"})
+    client.wal.close()
+    with open(client.wal.path, "ab") as f:
+        f.write(b"\x10\x00\x00")  # crash in the middle of the next append
+
+    reopened = FAISSClient(index_path=tmp_path / "faiss_index")
+
+    assert reopened.index.ntotal == 3
+    assert len(reopened.metadata) == 3
+    assert "2" in reopened.metadata
+
+@pytest.mark.asyncio
+async def test_filters_restrict_search_to_matching_posts(tmp_path):
+    """Filtered searches only visit matching rows and still fill the limit."""
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    await client.add_posts(
+        [random_embedding(i) for i in range(20)],
+        [
+            {"has_image": i % 2 == 0, "has_video": False, "tags": ["beach"] if i % 5 == 0 else [],
+             "created_at": f"2024-01-{i + 1:02d}T00:00:00+00:00"}
+            for i in range(20)
+        ]
+    )
+
+    images = await client.search(random_embedding(3), limit=5, filters={"has_image": True})
+    assert len(images) == 5
+    assert all(r["metadata"]["has_image"] for r in images)
+
+    tagged = await client.search(random_embedding(3), limit=10, filters={"tags": ["beach"], "has_image": True})
+    assert sorted(r["id"] for r in tagged) == ["0", "10"]
+
+    recent = await client.search(random_embedding(3), limit=10, filters={"created_after": "2024-01-18"})
+    assert sorted(r["id"] for r in recent) == ["17", "18", "19"]
+
+    assert await client.search(random_embedding(3), limit=5, filters={"has_video": True}) == []
+
+def test_date_filters_are_parsed_and_normalized_to_utc():
+    filters = SearchFilters(created_after="2024-01-18T02:00:00+02:00", created_before="2024-01-20")
+    assert filters.model_dump(exclude_none=True) == {
+        "created_after": "2024-01-18T00:00:00+00:00",
+        "created_before": "2024-01-20T00:00:00+00:00"
+    }
+    with pytest.raises(ValidationError):
+        SearchFilters(created_after="' OR 1=1 --")
+
+@pytest.mark.asyncio
+async def test_flat_index_is_rebuilt_into_configured_type(tmp_path, monkeypatch):
+    """Once there is enough data to train on, the index is migrated in the background."""
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "FAISS_NLIST", 4)
+    monkeypatch.setattr(settings, "FAISS_NPROBE", 4)
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    assert client.index_status()["type"] == "flat"
+
+    await client.add_posts([random_embedding(i) for i in range(200)], [{"text": str(i)} for i in range(200)])
+    client._migration.join(timeout=30)
+
+    status = client.index_status()
+    assert status["type"] == "ivf_flat"
+    assert status["migration"]["state"] == "done"
+    assert status["migration"]["recall_at_k"] == pytest.approx(1.0)
+    results = await client.search(random_embedding(7), limit=1)
+    assert results[0]["id"] == "7"
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-4)
+
+@pytest.mark.asyncio
+async def test_rebuild_below_min_recall_keeps_flat_index(tmp_path, monkeypatch):
+    """A rebuild that would lose recall is rejected, and not retried on the next insert."""
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "FAISS_NLIST", 4)
+    monkeypatch.setattr(settings, "FAISS_MIN_RECALL", 1.01)
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+
+    await client.add_posts([random_embedding(i) for i in range(200)], [{"text": str(i)} for i in range(200)])
+    client._migration.join(timeout=30)
+
+    status = client.index_status()
+    assert status["type"] == "flat"
+    assert status["migration"]["state"] == "rejected"
+    assert status["migration"]["recall_at_k"] <= 1.0
+    migration = client._migration
+    await client.add_post(random_embedding(200), {"text": "200"})
+    assert client._migration is migration
+
+@pytest.mark.asyncio
+async def test_batch_search_returns_results_in_input_order(tmp_path):
+    """Each query gets its own limit and filters, and results keep input order."""
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    await client.add_posts(
+        [random_embedding(i) for i in range(10)],
+        [{"has_image": i < 5} for i in range(10)]
+    )
+    queries = np.vstack([random_embedding(8), random_embedding(2), random_embedding(7)])
+
+    results = await client.search_batch(queries, [1, 3, 2], [None, {"has_image": True}, {"has_image": False}])
+
+    assert [len(r) for r in results] == [1, 3, 2]
+    assert results[0][0]["id"] == "8"
+    assert results[1][0]["id"] == "2"
+    assert all(r["metadata"]["has_image"] for r in results[1])
+    assert results[2][0]["id"] == "7"
+
+@pytest.mark.asyncio
+async def test_compressed_index_reranks_with_exact_vectors(tmp_path, monkeypatch):
+    """fp16 codes pick the candidates; scores and order come from the stored float32 vectors."""
+    monkeypatch.setattr(settings, "FAISS_INDEX_TYPE", "sq_fp16")
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    vectors = [random_embedding(i) for i in range(50)]
+    await client.add_posts(vectors, [{"text": str(i)} for i in range(50)])
+    client.snapshot()
+
+    reopened = FAISSClient(index_path=tmp_path / "faiss_index")
+    status = reopened.index_status()
+    assert status["type"] == "sq_fp16" and status["bytes_per_vector"] == 512 * 2
+
+    query = random_embedding(100)
+    results = await reopened.search(query, limit=5)
+    exact = np.vstack(vectors) @ query
+    assert [int(r["id"]) for r in results] == list(np.argsort(-exact)[:5])
+    assert results[0]["score"] == pytest.approx(float(exact.max()), abs=1e-6)
+
+@pytest.mark.asyncio
+async def test_deleted_and_updated_posts_keep_ids_and_survive_restart(tmp_path, monkeypatch):
+    """Deletes vanish from search at once, updates keep the post ID, and neither is undone by log replay."""
+    monkeypatch.setattr(settings, "FAISS_COMPACT_THRESHOLD", 1.0)
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    post_ids = await client.add_posts([random_embedding(i) for i in range(5)], [{"text": str(i)} for i in range(5)])
+
+    assert await client.delete_posts(["1", "missing"]) == ["1"]
+    results = await client.search(random_embedding(1), limit=4)
+    assert len(results) == 4 and "1" not in [r["id"] for r in results]
+
+    assert await client.update_post("2", random_embedding(9), {"text": "2 again"}) == "2"
+    results = await client.search(random_embedding(9), limit=1)
+    assert results[0]["id"] == "2" and results[0]["score"] == pytest.approx(1.0, abs=1e-4)
+    with pytest.raises(KeyError):
+        await client.update_post("1", random_embedding(1), {})
+    client.wal.close()
+
+    reopened = FAISSClient(index_path=tmp_path / "faiss_index")
+    assert "1" not in reopened.metadata and reopened.metadata["2"] == {"text": "2 again"}
+    assert [r["id"] for r in await reopened.search(random_embedding(2), limit=10)].count("2") == 1
+    assert await reopened.add_post(random_embedding(10), {}) not in post_ids  # IDs are never reused
+
+@pytest.mark.asyncio
+async def test_tombstones_past_threshold_are_compacted(tmp_path, monkeypatch):
+    """Once enough posts are deleted, the index is rebuilt without them and keeps its post IDs."""
+    monkeypatch.setattr(settings, "FAISS_COMPACT_THRESHOLD", 0.3)
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    await client.add_posts([random_embedding(i) for i in range(10)], [{"text": str(i)} for i in range(10)])
+
+    await client.delete_posts(["0", "1"])
+    assert client._migration is None  # 20% deleted, below the threshold
+    await client.delete_posts(["2"])
+    client._migration.join(timeout=30)
+
+    status = client.index_status()
+    assert status["ntotal"] == 7 and status["deleted"] == 0
+    assert status["migration"]["dropped"] == 3
+    results = await client.search(random_embedding(8), limit=1)
+    assert results[0]["id"] == "8" and results[0]["metadata"] == {"text": "8"}
+
+    reopened = FAISSClient(index_path=tmp_path / "faiss_index")
+    assert reopened.index.ntotal == 7 and reopened.index_status()["deleted"] == 0
+
+@pytest.mark.asyncio
+async def test_read_only_clients_follow_published_snapshots(tmp_path):
+    """Readers map the writer's snapshots, swap to new ones, and cannot write."""
+    writer = FAISSClient(index_path=tmp_path / "faiss_index")
+    await writer.add_posts([random_embedding(i) for i in range(3)], [{"text": str(i)} for i in range(3)])
+    # Nobody reads snapshots yet, so inserts are left to the log
+    assert not writer.publish(max_age=0) and not writer.index_path.exists()
+
+    reader = FAISSClient(index_path=tmp_path / "faiss_index", read_only=True)
+    assert reader.index.ntotal == 0
+    assert writer.publish(max_age=0)
+    assert reader.reload() and reader.index.ntotal == 3 and not reader.reload()
+
+    await writer.add_post(random_embedding(3), {"text": "3"})
+    assert not writer.publish(max_age=3600)  # Too soon since the last snapshot
+    assert writer.publish(max_age=0)
+    assert reader.reload() and reader.index.ntotal == 4
+    results = await reader.search(random_embedding(3), limit=1)
+    assert results[0]["metadata"] == {"text": "3"}
+
+    # In-place metadata rewrites (re-tags) invalidate the reader's result caches
+    generation = reader.generation
+    writer.update_metadata({3: ("3", {"text": "3", "tags": ["cats"]})})
+    assert not reader.reload() and reader.generation > generation
+
+    with pytest.raises(IndexLockedError):
+        await reader.add_post(random_embedding(4), {})
+    assert reader.promote()  # This process already holds the writer lock
+
+def test_writer_lock_excludes_other_processes(tmp_path):
+    lock_path = tmp_path / "faiss_index.lock"
+    assert acquire_writer_lock(lock_path)
+    other = subprocess.run(
+        [sys.executable, "-c", f"from app.vectors.writer_lock import acquire_writer_lock as a; print(a({str(lock_path)!r}))"],
+        capture_output=True, text=True, cwd=Path(__file__).resolve().parent.parent
+    )
+    assert other.stdout.strip() == "False"
+    release_writer_lock(lock_path)
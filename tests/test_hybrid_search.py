@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.search_service import SearchService, reciprocal_rank_fusion
+from app.vectors.faiss_client import FAISSClient
+
+def random_embedding(seed: int) -> np.ndarray:
+    vec = np.random.default_rng(seed).random(512).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+class FakeCLIPService:
+    async def generate_text_embedding(self, text):
+        return random_embedding(0)
+
+    async def generate_text_embeddings(self, texts):
+        return np.stack([random_embedding(0) for _ in texts])
+
+POSTS = [
+    {"text": "Golden hour at the pier #sunsetlovers", "has_image": True, "has_video": False},
+    {"text": "New video from @surfcam_daily", "audio_text": "waves are huge today", "has_image": False, "has_video": True},
+    {"text": "sunset over the bay", "has_image": True, "has_video": False},
+    {"text": "lunch", "has_image": True, "has_video": False}
+]
+
+@pytest.mark.asyncio
+async def test_lexical_search_matches_exact_terms_and_follows_changes(tmp_path, monkeypatch):
+    """Hashtags, handles and transcript words match exactly; filters, updates and deletes apply."""
+    monkeypatch.setattr(settings, "FAISS_COMPACT_THRESHOLD", 1.0)
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    await client.add_posts([random_embedding(i) for i in range(len(POSTS))], POSTS)
+
+    assert [r["id"] for r in await client.lexical_search("#sunsetlovers")] == ["0"]
+    assert [r["id"] for r in await client.lexical_search("@surfcam_daily")] == ["1"]
+    assert [r["id"] for r in await client.lexical_search("huge waves")] == ["1"]
+    assert [r["id"] for r in await client.lexical_search("sunset bay")] == ["2"]
+    assert await client.lexical_search("sunset", filters={"has_video": True}) == []
+    assert await client.lexical_search('" OR *') == []
+
+    await client.update_post("2", random_embedding(2), {"text": "dinner", "has_image": True})
+    await client.delete_posts(["0"])
+    assert await client.lexical_search("sunset OR #sunsetlovers") == []
+    assert [r["id"] for r in await client.lexical_search("dinner")] == ["2"]
+    client.wal.close()
+
+    reopened = FAISSClient(index_path=tmp_path / "faiss_index")
+    assert sorted(r["id"] for r in await reopened.lexical_search("dinner waves")) == ["1", "2"]
+
+def test_rank_fusion_favours_posts_found_by_both_searches():
+    vector = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.8}, {"id": "c", "score": 0.7}]
+    lexical = [{"id": "c", "score": 12.0}, {"id": "d", "score": 3.0}]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    assert [r["id"] for r in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["score"] == pytest.approx(1 / 63 + 1 / 61)
+
+@pytest.mark.asyncio
+async def test_hybrid_mode_returns_keyword_matches_the_embedding_misses(tmp_path):
+    client = FAISSClient(index_path=tmp_path / "faiss_index")
+    await client.add_posts([random_embedding(i) for i in range(len(POSTS))], POSTS)
+    search = SearchService(FakeCLIPService(), client)
+
+    vector = await search.search("@surfcam_daily", 1)
+    hybrid = await search.search("@surfcam_daily", 1, mode="hybrid")
+    assert [r["id"] for r in vector] == ["0"]  # the fake query embedding is post 0's
+    assert [r["id"] for r in hybrid] == ["1"]
+    with pytest.raises(ValueError):
+        await search.search("x", 1, mode="fuzzy")
@@ -0,0 +1,46 @@
+import asyncio
+import numpy as np
+import pytest
+from app.services.inference_scheduler import InferenceScheduler
+
+def fake_encoder(calls):
+    def encode(items):
+        calls.append(list(items))
+        return np.array([[float(item)] for item in items])
+    return encode
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_a_batch():
+    """Concurrent submissions are coalesced and each caller gets its own rows."""
+    calls = []
+    scheduler = InferenceScheduler({"text": fake_encoder(calls)}, max_batch_size=8, max_wait_ms=50)
+
+    results = await asyncio.gather(*(scheduler.submit("text", [i]) for i in range(5)))
+
+    assert [r.tolist() for r in results] == [[[float(i)]] for i in range(5)]
+    assert len(calls) == 1
+    stats = scheduler.stats()["text"]
+    assert stats["batches"] == 1
+    assert stats["items"] == 5
+    assert stats["queue_depth"] == 0
+
+@pytest.mark.asyncio
+async def test_batch_is_bounded_by_max_batch_size():
+    """A batch closes once it reaches max_batch_size items."""
+    calls = []
+    scheduler = InferenceScheduler({"image": fake_encoder(calls)}, max_batch_size=4, max_wait_ms=50)
+
+    results = await asyncio.gather(*(scheduler.submit("image", [i, i]) for i in range(4)))
+
+    assert [r[:, 0].tolist() for r in results] == [[float(i)] * 2 for i in range(4)]
+    assert [len(c) for c in calls] == [4, 4]
+
+@pytest.mark.asyncio
+async def test_encoder_errors_propagate_to_callers():
+    """A failing forward pass fails every request in the batch."""
+    def broken(items):
+        raise RuntimeError("boom")
+    scheduler = InferenceScheduler({"text": broken}, max_batch_size=8, max_wait_ms=10)
+
+    with pytest.raises(RuntimeError):
+        await scheduler.submit("text", ["a"])
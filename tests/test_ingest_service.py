@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from PIL import Image
+from app.services.ingest_service import IngestService
+from app.vectors.content_cache import ContentCache
+from app.vectors.faiss_client import FAISSClient
+
+DIM = 512
+
+class FakeCLIP:
+    """Seeds a random vector from each input so different content lands far apart."""
+
+    def __init__(self):
+        self.images_encoded = 0
+        self.texts_encoded = 0
+
+    async def encode_images_async(self, images):
+        self.images_encoded += len(images)
+        return np.stack([
+            np.random.default_rng(sum(image.getpixel((0, 0)))).standard_normal(DIM).astype(np.float32)
+            for image in images
+        ])
+
+    async def generate_text_embedding(self, text):
+        self.texts_encoded += 1
+        return np.random.default_rng(len(text)).standard_normal((1, DIM)).astype(np.float32)
+
+def save_image(path, color):
+    Image.new("RGB", (8, 8), color).save(path)
+    return path
+
+@pytest.mark.asyncio
+async def test_reupload_skips_inference_and_returns_existing_post(tmp_path):
+    clip = FakeCLIP()
+    service = IngestService(
+        clip, None, None, FAISSClient(tmp_path / "index"), ContentCache(tmp_path / "content.db")
+    )
+    service.duplicate_threshold = 0.98
+
+    first = await service.ingest([save_image(tmp_path / "a.png", (10, 20, 30))], [], "sunset")
+    assert not first.duplicate
+
+    # Same bytes under another name: served from the content cache, matched in the index
+    repost = await service.ingest([save_image(tmp_path / "b.png", (10, 20, 30))], [], "sunset")
+    assert repost.duplicate and repost.post_id == first.post_id
+    assert clip.images_encoded == 1 and clip.texts_encoded == 1
+    assert service.faiss_client.index.ntotal == 1
+
+    other = await service.ingest([save_image(tmp_path / "c.png", (200, 0, 0))], [], "sunset")
+    assert not other.duplicate and other.post_id != first.post_id
+    assert service.faiss_client.index.ntotal == 2
+    assert service.content_cache.stats()["entries"] == 3
+
+    # Disabled threshold always adds
+    service.duplicate_threshold = 1.01
+    again = await service.ingest([tmp_path / "a.png"], [], "sunset")
+    assert not again.duplicate and service.faiss_client.index.ntotal == 3
+
+@pytest.mark.asyncio
+async def test_legacy_l2_index_is_migrated_and_scored_as_similarity(tmp_path):
+    """An index saved as IndexFlatL2 with a JSON store is rebuilt as inner product, not mistaken for one."""
+    import json
+    import faiss
+    vectors = np.random.default_rng(0).standard_normal((3, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    legacy = faiss.IndexFlatL2(DIM)
+    legacy.add(vectors)
+    faiss.write_index(legacy, str(tmp_path / "index"))
+    (tmp_path / "index.json").write_text(json.dumps({str(i): {"text": f"post {i}"} for i in range(3)}))
+
+    client = FAISSClient(tmp_path / "index")
+    client._migration.join(timeout=30)
+    assert client.index_status()["metric"] == "inner_product"
+    assert client.migration_status["state"] == "done"
+
+    service = IngestService(FakeCLIP(), None, None, client, ContentCache(tmp_path / "content.db"))
+    service.duplicate_threshold = 0.98
+    unrelated = await service.ingest([], [], "an unrelated caption")
+    assert not unrelated.duplicate and client.index.ntotal == 4
+    assert (await client.search(vectors[1], limit=1))[0]["score"] == pytest.approx(1.0, abs=1e-4)
+
+def test_content_cache_entries_are_keyed_by_model_signature(tmp_path, monkeypatch):
+    """Embeddings cached under one CLIP model or sampling setup are not served under another."""
+    from app.core.config import settings
+    vector = np.ones(DIM, dtype=np.float32)
+    ContentCache(tmp_path / "content.db", IngestService.content_signatures()).put("video", "abc", vector, 3)
+    assert ContentCache(tmp_path / "content.db", IngestService.content_signatures()).get("video", "abc")["frames"] == 3
+
+    monkeypatch.setattr(settings, "FRAME_SAMPLING", "fixed")
+    assert ContentCache(tmp_path / "content.db", IngestService.content_signatures()).get("video", "abc") is None
+    monkeypatch.setattr(settings, "CLIP_MODEL_PRETRAINED", "another")
+    signed = ContentCache(tmp_path / "content.db", IngestService.content_signatures())
+    assert signed.get("image", "abc") is None and len(signed) == 1
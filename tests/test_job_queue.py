@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from app.services.job_queue import JobQueue, JobWorkerPool
+
+def test_claim_retry_and_recover(tmp_path):
+    """Failed jobs are requeued with a delay; running jobs survive a restart."""
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue({"text": "hello"})
+
+    job = queue.claim()
+    assert job["job_id"] == job_id and job["status"] == "running" and job["attempts"] == 1
+    assert queue.claim() is None
+
+    queue.fail(job_id, "boom", retry_in=60)
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim() is None  # Not due yet
+
+    queue.fail(job_id, "boom", retry_in=0)
+    assert queue.claim()["attempts"] == 2
+
+    # Simulate a crash while running
+    reopened = JobQueue(tmp_path / "jobs.db")
+    assert reopened.recover() == 1
+    assert reopened.claim()["attempts"] == 3
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_jobs_to_completion(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    files_dir = tmp_path / "upload"
+    files_dir.mkdir()
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload["text"])
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+        return {"post_id": "0"}
+
+    pool = JobWorkerPool(queue, handler, workers=1)
+    pool.retry_backoff = 0
+    pool.poll_interval = 0.01
+    job_id = queue.enqueue({"text": "hello", "files_dir": str(files_dir)})
+    await pool.start()
+    for _ in range(200):
+        if queue.get(job_id)["status"] == "succeeded":
+            break
+        await asyncio.sleep(0.01)
+    await pool.stop()
+
+    job = queue.get(job_id)
+    assert job["status"] == "succeeded" and job["attempts"] == 2
+    assert job["result"] == {"post_id": "0"}
+    assert not files_dir.exists()
+
+@pytest.mark.asyncio
+async def test_worker_survives_queue_errors(tmp_path):
+    """A locked database while claiming is logged and retried, not fatal to the worker."""
+    import sqlite3
+    queue = JobQueue(tmp_path / "jobs.db")
+    claim, failures = queue.claim, []
+
+    def flaky_claim():
+        if not failures:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+
+    queue.claim = flaky_claim
+
+    async def handler(payload):
+        return {"post_id": "0"}
+
+    pool = JobWorkerPool(queue, handler, workers=1)
+    pool.poll_interval = 0.01
+    job_id = queue.enqueue({"text": "hello"})
+    await pool.start()
+    for _ in range(200):
+        if queue.get(job_id)["status"] == "succeeded":
+            break
+        await asyncio.sleep(0.01)
+    await pool.stop()
+    assert failures and queue.get(job_id)["status"] == "succeeded"
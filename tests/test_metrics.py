@@ -0,0 +1,41 @@
+import time
+import pytest
+from app.core.executor import StageExecutor
+from app.core.metrics import MetricsRegistry, server_timing
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    frames = registry.histogram("frames", "Frames per video", buckets=(10, 100))
+    frames.observe(5)
+    frames.observe(50)
+    registry.counter("requests_total", "Requests", ("route",)).inc(route='/a"b')
+    registry.gauge("index_vectors", "Vectors", lambda: 42)
+
+    text = registry.render()
+    assert 'frames_bucket{le="10.0"} 1.0' in text
+    assert 'frames_bucket{le="100.0"} 2.0' in text
+    assert 'frames_bucket{le="+Inf"} 2.0' in text
+    assert "frames_sum 55.0" in text and "frames_count 2.0" in text
+    assert 'requests_total{route="/a\\"b"} 1.0' in text
+    assert "# TYPE index_vectors gauge\nindex_vectors 42.0" in text
+
+@pytest.mark.asyncio
+async def test_spans_in_stage_calls_are_attributed_to_the_request():
+    registry = MetricsRegistry()
+    executor = StageExecutor(workers={"clip": 1}, queue_limits={"clip": 1})
+
+    def encode():
+        with registry.span("clip_encode_image"):
+            time.sleep(0.01)
+
+    with registry.collect_request_timings() as timings:
+        with registry.span("upload_read"):
+            pass
+        await executor.run("clip", encode)
+    # Outside a request, spans only feed the histogram
+    await executor.run("clip", encode)
+    executor.shutdown()
+
+    assert [stage for stage, _ in timings] == ["upload_read", "clip_encode_image"]
+    assert 'pipeline_stage_duration_seconds_count{stage="clip_encode_image"} 2.0' in registry.render()
+    assert server_timing([("a", 0.001), ("a", 0.002), ("b", 0.5)]) == "a;dur=3.0, b;dur=500.0"
@@ -0,0 +1,90 @@
+import asyncio
+import numpy as np
+import pytest
+from app.services.tagging_service import TaggingService
+from app.vectors.faiss_client import FAISSClient
+
+DIM = 512
+
+def label_vector(label):
+    """A fixed unit vector per label, shared by all of its prompts."""
+    vector = np.random.default_rng(sum(map(ord, label))).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class FakeCLIP:
+    """Encodes a prompt as its label's vector; the label is the prompt's last word."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode_texts(self, texts):
+        self.encoded.extend(texts)
+        return np.stack([label_vector(text.rstrip(".").split()[-1]) for text in texts])
+
+@pytest.fixture
+def tagger_factory(tmp_path):
+    (tmp_path / "labels.txt").write_text("# topics\ndogs\ncats\nfood\n")
+    def make(clip):
+        return TaggingService(clip, tmp_path / "labels.txt", tmp_path / "labels.npz")
+    return make
+
+def test_labels_are_encoded_once_and_scored_in_one_product(tagger_factory):
+    clip = FakeCLIP()
+    tagger = tagger_factory(clip)
+    assert tagger.labels == ["dogs", "cats", "food"]
+    assert len(clip.encoded) == 3 * len(tagger.templates)
+
+    posts = np.stack([label_vector("cats"), label_vector("food")])
+    assert [list(tags) for tags in tagger.tag_many(posts)] == [["cats"], ["food"]]
+
+    # A restart reads the cache, and adding labels encodes only the new ones
+    clip = FakeCLIP()
+    tagger = tagger_factory(clip)
+    assert clip.encoded == []
+    assert tagger.add_labels(["cats", "birds"]) == ["birds"]
+    assert len(clip.encoded) == len(tagger.templates)
+    assert list(tagger.tag(label_vector("birds"))) == ["birds"]
+    assert tagger_factory(FakeCLIP()).labels == ["dogs", "cats", "food", "birds"]
+
+@pytest.mark.asyncio
+async def test_retag_replaces_predicted_tags_and_keeps_imported_ones(tmp_path, tagger_factory):
+    tagger = tagger_factory(FakeCLIP())
+    client = FAISSClient(tmp_path / "index")
+    await client.add_posts(
+        [label_vector("dogs"), label_vector("food")],
+        [TaggingService.apply({"tags": ["demo"]}, {"cats": 0.5}), {"tags": []}]
+    )
+
+    summary = tagger.retag(client)
+    assert summary["changed"] == 2
+    assert client.metadata["0"]["tags"] == ["demo", "dogs"]
+    assert client.metadata["1"]["tags"] == ["food"]
+    assert client.metadata.rows_matching({"tags": ["dogs"]}).tolist() == [0]
+    assert tagger.retag(client)["changed"] == 0
+
+@pytest.mark.asyncio
+async def test_retag_runs_as_a_queued_job(tmp_path, tagger_factory):
+    from app.models.schemas import JobStatus
+    from app.services.ingest_service import IngestService
+    from app.services.job_queue import JobQueue, JobWorkerPool
+    from app.vectors.content_cache import ContentCache
+    client = FAISSClient(tmp_path / "index")
+    await client.add_posts([label_vector("cats")], [{"tags": []}])
+    ingest = IngestService(
+        FakeCLIP(), None, None, client, ContentCache(tmp_path / "content.db"), tagging_service=tagger_factory(FakeCLIP())
+    )
+    queue = JobQueue(tmp_path / "jobs.db")
+    job_id = queue.enqueue({"kind": "retag"})
+    pool = JobWorkerPool(queue, ingest.run_job, workers=1)
+    await pool.start()
+    try:
+        for _ in range(100):
+            if queue.get(job_id)["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await pool.stop()
+
+    job = queue.get(job_id)
+    assert JobStatus(**{k: job[k] for k in ("job_id", "status", "attempts", "error", "result")}).result["changed"] == 1
+    assert client.metadata["0"]["tags"] == ["cats"]
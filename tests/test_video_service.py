@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.video_service import VideoService
+
+def write_video(path, scene_colors, seconds_per_scene=4, fps=10, size=64):
+    """Solid-colour scenes with a moving stripe, so frames within a scene are similar but not identical."""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (size, size))
+    for color in scene_colors:
+        for i in range(seconds_per_scene * fps):
+            frame = np.full((size, size, 3), color, np.uint8)
+            frame[:, (2 * i) % size:(2 * i) % size + 8] = 255 - np.array(color, np.uint8)
+            writer.write(frame)
+    writer.release()
+    return path
+
+@pytest.fixture
+def video(tmp_path):
+    return write_video(tmp_path / "scenes.mp4", [(200, 30, 30), (30, 200, 30), (30, 30, 200)])
+
+def test_adaptive_sampling_keeps_one_frame_per_scene(video, monkeypatch):
+    monkeypatch.setattr(settings, "FRAME_SAMPLING", "fixed")
+    assert len(VideoService().read_frames(video)) == 12
+
+    monkeypatch.setattr(settings, "FRAME_SAMPLING", "adaptive")
+    frames = VideoService().read_frames(video)
+    assert len(frames) == 3
+    # Each kept frame is the start of a different scene, in order
+    assert [int(np.argmax(np.asarray(frame).mean(axis=(0, 1)))) for frame in frames] == [2, 1, 0]
+
+def test_frame_budget_is_spread_across_scenes(video, monkeypatch):
+    monkeypatch.setattr(settings, "FRAME_BUDGET", 2)
+    frames = VideoService().read_frames(video)
+    assert [int(np.argmax(np.asarray(frame).mean(axis=(0, 1)))) for frame in frames] == [2, 0]
+    assert VideoService.spread(list(range(10)), 4) == [0, 3, 6, 9]